@@ -0,0 +1,197 @@
+"""Offline download benchmarks against the local cda.pl stand-in.
+
+For every scenario a flat folder of N videos is served by tests/fake_cda.py
+and the benchmark measures the folder crawl time, the end-to-end download
+throughput, the time to first byte and, with --memory, the peak Python
+memory of the crawl and of the whole download. With several --videos
+counts, --memory also prints the memory added by every extra video,
+which should stay flat as folders grow.
+
+    python benchmarks/bench_download.py --videos 1 10 100 1000
+    python benchmarks/bench_download.py --videos 10000 --size 16K --memory
+    python benchmarks/bench_download.py --latency 0.05 --bandwidth 2M
+    python benchmarks/bench_download.py --size 1M --drop-after 200K
+
+Videos that fail, and an error that stops a download, are reported in
+the summary; the exit code is 1 if any scenario hit an error.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from asyncio import Semaphore
+from pathlib import Path
+from typing import Any
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "tests"))
+
+from fake_cda import FakeCda, FakeFolder, make_videos
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.folder import Folder
+from cda_dl.metrics import build_report
+from cda_dl.ui import UI
+
+UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(value: str) -> int:
+    """Parse sizes like '512', '64K' or '2M'."""
+    unit = value[-1:].upper()
+    if unit in UNITS:
+        return int(float(value[:-1]) * UNITS[unit])
+    return int(value)
+
+
+async def crawl(cda: FakeCda, url: str) -> int:
+    async with cda.session() as session:
+        folder = Folder(url, session, UI())
+        return len(await folder.get_videos_from_folder())
+
+
+async def download(
+    cda: FakeCda,
+    url: str,
+    directory: Path,
+    threads: int,
+    download_state: DownloadState,
+) -> None:
+    download_options = DownloadOptions(directory=directory, nthreads=threads)
+    download_options.semaphore = Semaphore(threads)
+    async with cda.session() as session:
+        await Folder(url, session, UI()).download_folder(
+            download_options, download_state
+        )
+
+
+async def run_scenario(
+    args: argparse.Namespace, nvideos: int
+) -> dict[str, Any]:
+    folder = FakeFolder("bench", 1, "Bench", make_videos(nvideos, args.size))
+    cda = FakeCda(
+        folders=[folder],
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        rate_limit_every=args.rate_limit_every,
+        drop_after=args.drop_after,
+        drops=args.drops,
+    )
+    result: dict[str, Any] = {"videos": nvideos}
+    async with cda:
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        assert await crawl(cda, folder.url) == nvideos
+        result["crawl_seconds"] = time.perf_counter() - start
+        if args.memory:
+            result["crawl_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+
+        state = DownloadState()
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            try:
+                await download(
+                    cda, folder.url, Path(directory), args.threads, state
+                )
+            except Exception as e:
+                # The videos done so far are still reported.
+                result["error"] = f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - start
+        if args.memory:
+            result["download_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        report = build_report(state)
+        result.update(
+            download_seconds=elapsed,
+            completed=state.completed,
+            failed=state.failed,
+            dropped=sum(cda.drops.values()),
+            bytes=report["bytes"],
+            throughput=report["bytes"] / elapsed,
+            ttfb_p50=report["phases"]["ttfb"].get("p50"),
+            ttfb_p90=report["phases"]["ttfb"].get("p90"),
+            requests=dict(cda.requests),
+        )
+    return result
+
+
+def print_result(result: dict[str, Any]) -> None:
+    line = (
+        f"{result['videos']:>6} videos  crawl {result['crawl_seconds']:7.2f}s"
+        f"  download {result['download_seconds']:7.2f}s"
+        f"  {result['throughput'] / UNITS['M']:8.2f} MiB/s"
+    )
+    if result["ttfb_p50"] is not None:
+        line += f"  ttfb p50 {result['ttfb_p50'] * 1000:6.1f}ms"
+    if "download_peak_bytes" in result:
+        peak = result["download_peak_bytes"]
+        line += (
+            f"  peak {peak / UNITS['M']:7.1f} MiB"
+            f" ({peak / result['videos']:.0f} B/video)"
+        )
+    if result["dropped"]:
+        line += f"  dropped {result['dropped']}"
+    if result["failed"]:
+        line += f"  failed {result['failed']}"
+    if "error" in result:
+        line += f"  error {result['error']}"
+    print(line)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--videos", type=int, nargs="+", default=[1, 10, 100, 1000]
+    )
+    parser.add_argument(
+        "--size",
+        type=parse_size,
+        default=parse_size("64K"),
+        help="size of the best quality of every video",
+    )
+    parser.add_argument("-t", "--threads", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument(
+        "--bandwidth", type=parse_size, help="bytes per second per stream"
+    )
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument(
+        "--drop-after",
+        type=parse_size,
+        help="close media connections after that many bytes",
+    )
+    parser.add_argument(
+        "--drops", type=int, default=1, help="drops per file at most"
+    )
+    parser.add_argument("--memory", action="store_true")
+    parser.add_argument("--json", metavar="FILE", help="write results to FILE")
+    args = parser.parse_args()
+
+    results = []
+    for nvideos in args.videos:
+        result = asyncio.run(run_scenario(args, nvideos))
+        print_result(result)
+        results.append(result)
+    if args.memory and len(results) > 1:
+        first, last = results[0], results[-1]
+        extra = last["videos"] - first["videos"]
+        for key in ("crawl_peak_bytes", "download_peak_bytes"):
+            per_video = (last[key] - first[key]) / extra
+            print(f"{key[:-6]}: {per_video:.0f} B per extra video")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any("error" in result for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
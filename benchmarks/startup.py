@@ -0,0 +1,59 @@
+"""Measure how long it takes to start the CLI.
+
+Runs `cda-dl --help` and `cda-dl --version` in fresh interpreters and
+reports min/median wall time. With --budget it exits non-zero if the
+median exceeds the budget, so it can guard against import regressions.
+
+    python benchmarks/startup.py -n 20 --budget 150
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(argv: list[str], runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "cda_dl.main", *argv],
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=10)
+    parser.add_argument(
+        "--budget", type=float, help="maximum median startup time in ms"
+    )
+    args = parser.parse_args()
+
+    measure(["--version"], 1)  # warm up the filesystem cache
+    worst = 0.0
+    for argv in (["--help"], ["--version"]):
+        timings = measure(argv, args.runs)
+        median = statistics.median(timings)
+        worst = max(worst, median)
+        print(
+            f"cda-dl {' '.join(argv):<10} min {min(timings):7.1f} ms"
+            f"  median {median:7.1f} ms"
+        )
+    if args.budget is not None and worst > args.budget:
+        print(f"startup budget of {args.budget} ms exceeded", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
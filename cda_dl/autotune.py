@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from types import TracebackType
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds between two decisions of the ConcurrencyTuner.
+TUNE_INTERVAL = 10.0
+# Relative change of the throughput that counts as a change at all.
+TOLERANCE = 0.05
+
+
+class AdaptiveSemaphore:
+    """Semaphore whose limit can be changed while it is in use. Lowering
+    the limit does not stop the holders, new acquirers wait until fewer
+    than 'limit' hold it."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self) -> None:
+        async with self.condition:
+            self.waiting += 1
+            try:
+                await self.condition.wait_for(lambda: self.active < self.limit)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    async def set_limit(self, limit: int) -> None:
+        async with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+
+class ConcurrencyTuner:
+    """Tune the number of concurrent downloads of '-t auto' by hill
+    climbing on the bytes per second downloaded by all of them.
+
+    Every 'interval' seconds the limit moves one step in the current
+    direction. The direction is kept while the throughput grows and
+    turned around when it does not. Rate limiting (HTTP 429) halves the
+    limit and failed downloads lower it by one, whatever the throughput.
+    The limit only grows while downloads wait for it."""
+
+    def __init__(
+        self,
+        semaphore: AdaptiveSemaphore,
+        minimum: int = 1,
+        maximum: int = 16,
+        interval: float = TUNE_INTERVAL,
+    ) -> None:
+        self.semaphore = semaphore
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = interval
+        self.direction = 1
+        self.throughput: float | None = None
+        self.bytes = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.saturated = False
+
+    async def run(self) -> None:
+        """Tune the limit until cancelled."""
+        last = time.perf_counter()
+        while True:
+            await self.sleep()
+            now = time.perf_counter()
+            throughput = self.bytes / (now - last)
+            errors, rate_limited = self.errors, self.rate_limited
+            self.bytes = self.errors = self.rate_limited = 0
+            last = now
+            limit = self.decide(throughput, errors, rate_limited)
+            await self.semaphore.set_limit(limit)
+
+    async def sleep(self) -> None:
+        """Wait for the interval, noting if downloads had to wait for the
+        semaphore meanwhile."""
+        self.saturated = False
+        deadline = time.perf_counter() + self.interval
+        while (left := deadline - time.perf_counter()) > 0:
+            self.saturated |= self.semaphore.waiting > 0
+            await asyncio.sleep(min(left, 0.5))
+
+    def decide(self, throughput: float, errors: int, rate_limited: int) -> int:
+        """Get the next limit and log the decision."""
+        limit = self.semaphore.limit
+        previous, self.throughput = self.throughput, throughput
+        if rate_limited:
+            new_limit = limit // 2
+            self.direction = -1
+            reason = f"odpowiedzi 429: {rate_limited}"
+        elif errors:
+            new_limit = limit - 1
+            self.direction = -1
+            reason = f"błędy: {errors}"
+        else:
+            if previous is not None and throughput <= previous * (
+                1 + TOLERANCE
+            ):
+                self.direction = -self.direction
+            if self.direction > 0 and not self.saturated:
+                new_limit = limit
+                reason = "nikt nie czeka na wątek"
+            else:
+                new_limit = limit + self.direction
+                reason = (
+                    "przepustowość rośnie"
+                    if previous is None or throughput > previous
+                    else "przepustowość nie rośnie"
+                )
+        new_limit = max(self.minimum, min(self.maximum, new_limit))
+        LOGGER.info(
+            f"Wątki: {limit} → {new_limit}"
+            f" ({throughput / 1024**2:.2f} MiB/s, {reason})."
+        )
+        return new_limit
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+from typing import Any, AsyncIterator, Callable, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+# How much of the batch file is read at once.
+READ_SIZE = 1024**2
+
+
+async def read_urls(path: str) -> AsyncIterator[str]:
+    """Read the urls of a batch file, or of stdin for '-', one per line;
+    empty lines and lines starting with '#' are skipped. A read returns
+    what a pipe holds so far, so the urls that another program writes
+    are yielded as they come."""
+    if path == "-":
+        fd = sys.stdin.fileno()
+    else:
+        # Opening a FIFO waits for a writer.
+        fd = await asyncio.to_thread(os.open, path, os.O_RDONLY)
+    rest = b""
+    try:
+        while True:
+            data = await asyncio.to_thread(os.read, fd, READ_SIZE)
+            lines = (rest + data).split(b"\n")
+            rest = lines.pop() if data else b""
+            for line in lines:
+                url = line.decode(errors="replace").strip()
+                if url and not url.startswith("#"):
+                    yield url
+            if not data:
+                return
+    finally:
+        if path != "-":
+            os.close(fd)
+
+
+class UrlFilter:
+    """Drop the repeated urls of the input. The urls are compared as
+    given by classify_url(), so Video urls by the video id."""
+
+    def __init__(self) -> None:
+        self.seen: set[str] = set()
+        self.repeated = 0
+
+    def add(self, url: str) -> bool:
+        """Remember the url; return False if it was added before."""
+        key = url.rstrip("/")
+        if key in self.seen:
+            self.repeated += 1
+            return False
+        self.seen.add(key)
+        return True
+
+
+async def run_bounded(
+    items: AsyncIterator[T],
+    worker: Callable[[T], Coroutine[Any, Any, None]],
+    size: int,
+) -> None:
+    """Run the worker on every item, at most 'size' at a time. The next
+    item is taken only when a worker is free, so the items are never all
+    held at once."""
+    pending: set[asyncio.Task[None]] = set()
+    try:
+        while True:
+            if len(pending) >= size:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    task.result()
+            try:
+                item = await anext(items)
+            except StopAsyncIteration:
+                break
+            pending.add(asyncio.create_task(worker(item)))
+        await asyncio.gather(*pending)
+    finally:
+        for task in pending:
+            task.cancel()
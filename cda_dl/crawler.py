@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+from pathlib import PurePosixPath
+from typing import Any, TextIO
+
+import aiohttp
+
+from cda_dl.error import GeoBlockedError, HTTPError, ParserError
+from cda_dl.folder import Folder, ListedVideo, get_listed_videos
+from cda_dl.ui import UI
+from cda_dl.utils import get_video_match
+from cda_dl.video import Video
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Crawler:
+    """Crawl folder trees without downloading anything and write every
+    video found as one JSON line, as soon as its folder page is read:
+        {"id", "url", "title", "folder", "duration"}
+    With 'qualities' the Video page of every video is fetched as well and
+    the record gets the available "qualities".
+
+    Folder pages and Video pages are fetched by at most 'concurrency'
+    requests at a time, independent of the number of download threads.
+    Subfolders are crawled concurrently with their parents."""
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        stream: TextIO,
+        concurrency: int = 8,
+        qualities: bool = False,
+    ) -> None:
+        self.session = session
+        self.stream = stream
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.qualities = qualities
+        self.ui = UI()
+        self.count = 0
+
+    def emit(self, record: dict[str, Any]) -> None:
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+        self.count += 1
+
+    async def crawl_folder(
+        self, url: str, parent: PurePosixPath = PurePosixPath()
+    ) -> None:
+        folder = Folder(url, self.session, self.ui)
+        try:
+            async with self.semaphore:
+                folder.soup = await folder.get_soup()
+                title = await folder.get_folder_title()
+                subfolders = await folder.get_subfolders()
+                entries = get_listed_videos(folder.soup, folder.url)
+                del folder.soup
+        except (ParserError, HTTPError) as e:
+            LOGGER.warning(e)
+            return
+        path = parent / title
+        tasks = [
+            asyncio.create_task(self.crawl_folder(subfolder.url, path))
+            for subfolder in subfolders
+        ]
+        while entries:
+            for entry in entries:
+                if self.qualities:
+                    tasks.append(
+                        asyncio.create_task(self.add_video(entry, path))
+                    )
+                else:
+                    self.emit(self.get_record(entry, path))
+            folder.url = folder.get_next_page_url()
+            async with self.semaphore:
+                try:
+                    entries = await folder.get_videos_from_current_page()
+                except HTTPError:
+                    break
+        await asyncio.gather(*tasks)
+
+    async def crawl_video(self, url: str) -> None:
+        await self.add_video(ListedVideo(url, "", None), PurePosixPath())
+
+    def get_record(
+        self, entry: ListedVideo, path: PurePosixPath
+    ) -> dict[str, Any]:
+        match = get_video_match(entry.url)
+        return {
+            "id": match.group(1) if match else None,
+            "url": entry.url,
+            "title": entry.title,
+            "folder": str(path) if path.parts else "",
+            "duration": entry.duration,
+        }
+
+    async def add_video(self, entry: ListedVideo, path: PurePosixPath) -> None:
+        record = self.get_record(entry, path)
+        if self.qualities or not entry.title:
+            video = Video(entry.url, self.session, self.ui)
+            try:
+                async with self.semaphore:
+                    await video.probe()
+            except (ParserError, HTTPError, GeoBlockedError) as e:
+                record["error"] = str(e)
+            else:
+                record["title"] = record["title"] or video.title
+                if self.qualities:
+                    record["qualities"] = list(video.resolutions)
+        self.emit(record)
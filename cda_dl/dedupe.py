@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+
+from cda_dl.metrics import DelayedWriter
+
+LOGGER = logging.getLogger(__name__)
+
+LINK_MODES = ("hardlink", "reflink", "symlink")
+# ioctl that clones the extents of a file on Btrfs, XFS and the like.
+FICLONE = 0x40049409
+
+
+def reflink(source: Path, target: Path) -> None:
+    """Clone the file without copying its data where the filesystem can,
+    otherwise copy it."""
+    try:
+        import fcntl
+
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except (ImportError, OSError):
+        shutil.copyfile(source, target)
+
+
+class DedupeIndex:
+    """Index of the downloaded files by video id and requested resolution.
+
+    The first Video to claim a key downloads the file; the Videos that
+    claim it later, also while the first download is still running, get
+    the path of that copy and link to it instead of downloading again.
+    With 'path' the index is kept in a JSON file across runs, written
+    every few seconds and on close()."""
+
+    def __init__(self, mode: str = "hardlink", path: Path | None = None):
+        self.mode = mode
+        self.path = path
+        self.entries: dict[str, dict[str, str | int]] = {}
+        self.in_flight: dict[str, asyncio.Future[None]] = {}
+        self.changed = False
+        self.writer = DelayedWriter(self.take_changed)
+        if path is not None:
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                pass
+            except (ValueError, OSError) as e:
+                LOGGER.debug(f"Pomijam uszkodzony plik {path}: {e}")
+
+    def get(self, key: str) -> Path | None:
+        """Get the copy of the key if it is still on disk, unchanged."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        path = Path(str(entry["path"]))
+        try:
+            if path.stat().st_size == entry["size"]:
+                return path
+        except OSError:
+            pass
+        del self.entries[key]
+        self.save()
+        return None
+
+    def save(self) -> None:
+        if self.path is not None:
+            self.changed = True
+            self.writer.touch()
+
+    def take_changed(self) -> dict[Path, dict[str, dict[str, str | int]]]:
+        if self.path is None or not self.changed:
+            return {}
+        self.changed = False
+        return {self.path: dict(self.entries)}
+
+    async def close(self) -> None:
+        await self.writer.close()
+
+    async def claim(self, key: str) -> Path | None:
+        """Get the copy to link to, waiting for a download of the key that
+        is in flight. Return None if the caller has to download the file
+        itself; it must then call release()."""
+        while True:
+            path = self.get(key)
+            if path is not None:
+                return path
+            future = self.in_flight.get(key)
+            if future is None:
+                loop = asyncio.get_running_loop()
+                self.in_flight[key] = loop.create_future()
+                return None
+            await asyncio.shield(future)
+
+    def release(self, key: str, path: Path | None) -> None:
+        """Record the downloaded copy, or None if the download failed, and
+        wake up the Videos waiting for it."""
+        if path is not None:
+            self.entries[key] = {
+                "path": str(path),
+                "size": path.stat().st_size,
+            }
+            self.save()
+        future = self.in_flight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def link(self, source: Path, target: Path) -> None:
+        """Make 'target' a copy of 'source' as set by the mode. Hardlinks
+        across filesystems fall back to symlinks."""
+        target.unlink(missing_ok=True)
+        if self.mode == "reflink":
+            reflink(source, target)
+            return
+        if self.mode == "hardlink":
+            try:
+                os.link(source, target)
+                return
+            except OSError as e:
+                LOGGER.debug(f"Nie można utworzyć twardego linku: {e}")
+        target.symlink_to(os.path.relpath(source, target.parent))
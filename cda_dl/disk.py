@@ -0,0 +1,87 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Any
+
+from cda_dl.error import DiskSpaceError
+
+LOGGER = logging.getLogger(__name__)
+
+# Allocate the blocks without changing the size of the file, so the size
+# of a .part file keeps telling how much of it is downloaded.
+FALLOC_FL_KEEP_SIZE = 1
+
+_fallocate: Any = None
+
+
+def preallocate(fd: int, size: int) -> bool:
+    """Reserve 'size' bytes on disk for the file, so parallel downloads do
+    not interleave their extents. Only done on Linux; posix_fallocate
+    would grow the file and break resuming. Return True on success."""
+    global _fallocate
+    if not sys.platform.startswith("linux") or size <= 0:
+        return False
+    if _fallocate is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        _fallocate = libc.fallocate
+        _fallocate.argtypes = [
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_int64,
+            ctypes.c_int64,
+        ]
+    if _fallocate(fd, FALLOC_FL_KEEP_SIZE, 0, size) == 0:
+        return True
+    LOGGER.debug(
+        f"fallocate nie powiódł się: {os.strerror(ctypes.get_errno())}"
+    )
+    return False
+
+
+class FreeSpaceGate:
+    """Admit downloads only while their filesystem has room for them.
+
+    Every admitted download reserves its remaining size on the filesystem
+    of its directory until it is preallocated or finished. A download that
+    does not fit next to the reservations and 'margin' bytes waits for
+    other downloads on the filesystem to finish; if none are running it
+    cannot ever fit and DiskSpaceError is raised."""
+
+    def __init__(self, margin: int = 0) -> None:
+        self.margin = margin
+        self.reserved: dict[int, int] = {}
+        self.condition = asyncio.Condition()
+
+    def fits(self, device: int, directory: Path, size: int) -> bool:
+        free = shutil.disk_usage(directory).free
+        return free - self.reserved.get(device, 0) - self.margin >= size
+
+    def try_reserve(self, directory: Path, size: int) -> int | None:
+        """Reserve the space if it is free now. Return the device to
+        release it on, or None."""
+        device = directory.stat().st_dev
+        if not self.fits(device, directory, size):
+            return None
+        self.reserved[device] = self.reserved.get(device, 0) + size
+        return device
+
+    async def reserve(self, directory: Path, size: int) -> int:
+        async with self.condition:
+            while (device := self.try_reserve(directory, size)) is None:
+                if not self.reserved.get(directory.stat().st_dev):
+                    raise DiskSpaceError(
+                        f"Za mało miejsca w {directory} na {size} B."
+                        " Pomijam ..."
+                    )
+                await self.condition.wait()
+            return device
+
+    async def release(self, device: int, size: int) -> None:
+        async with self.condition:
+            self.reserved[device] -= size
+            self.condition.notify_all()
@@ -1,9 +1,25 @@
+from __future__ import annotations
+
 import asyncio
+import copy
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from cda_dl.autotune import AdaptiveSemaphore, ConcurrencyTuner
+    from cda_dl.dedupe import DedupeIndex
+    from cda_dl.disk import FreeSpaceGate
+    from cda_dl.journal import Journal
+    from cda_dl.link_cache import LinkCache
+    from cda_dl.manifest import Manifests
+    from cda_dl.quality import QualityPolicy
+    from cda_dl.resolver import LinkResolver
+    from cda_dl.sink import Target
+    from cda_dl.snapshot import FolderSnapshots
 
 
 class DownloadOptions:
-    semaphore: asyncio.Semaphore
+    semaphore: asyncio.Semaphore | AdaptiveSemaphore
 
     def __init__(
         self,
@@ -18,3 +34,29 @@ class DownloadOptions:
         self.overwrite = overwrite
         self.nthreads = nthreads
         self.quiet = quiet
+        # The download slots of the run, shared by all Videos; the
+        # Downloader checks the number of threads and sets its own.
+        self.semaphore = asyncio.Semaphore(max(nthreads, 1))
+        self.link_resolver: LinkResolver | None = None
+        self.link_cache: LinkCache | None = None
+        self.journal: Journal | None = None
+        self.snapshots: FolderSnapshots | None = None
+        self.dedupe: DedupeIndex | None = None
+        self.disk: FreeSpaceGate | None = None
+        self.manifests: Manifests | None = None
+        self.tuner: ConcurrencyTuner | None = None
+        # Streams slower than 'min_speed' bytes per second for
+        # 'slow_grace' seconds are restarted with a new link.
+        self.min_speed = 0
+        self.slow_grace = 30.0
+        # One of cda_dl.order.ORDERS.
+        self.order = "input"
+        self.quality: QualityPolicy | None = None
+        # Where the files go instead of the directory; None writes files.
+        self.target: Target | None = None
+
+    def with_directory(self, directory: Path) -> DownloadOptions:
+        """Get a copy of the options that downloads to the directory."""
+        download_options = copy.copy(self)
+        download_options.directory = directory
+        return download_options
@@ -1,5 +1,18 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from cda_dl.metrics import VideoMetrics
+
+
 class DownloadState:
     def __init__(self) -> None:
         self.completed = 0
         self.skipped = 0
+        self.linked = 0
         self.failed = 0
+        self.started = time.time()
+        self.finished: float | None = None
+        self.videos: list[VideoMetrics] = []
@@ -1,75 +1,256 @@
 import argparse
 import asyncio
+import json
 import logging
 import sys
+import time
 from getpass import getpass
 from os import path
 from pathlib import Path
+from typing import AsyncIterator, TextIO
 
 import aiohttp
-from rich.console import Console
-from rich.live import Live
-from rich.logging import RichHandler
-from rich.table import Table
 
+from cda_dl.autotune import AdaptiveSemaphore, ConcurrencyTuner
+from cda_dl.batch import UrlFilter, read_urls, run_bounded
+from cda_dl.crawler import Crawler
+from cda_dl.dedupe import DedupeIndex
+from cda_dl.disk import FreeSpaceGate
 from cda_dl.download_options import DownloadOptions
 from cda_dl.download_state import DownloadState
 from cda_dl.error import (
     CaptchaError,
     FlagError,
+    GeoBlockedError,
     HTTPError,
     LoginError,
     ParserError,
     ResolutionError,
 )
 from cda_dl.folder import Folder
-from cda_dl.ui import RichUI
-from cda_dl.utils import clear, get_random_agent, is_folder, is_video
+from cda_dl.jobqueue import JobQueue
+from cda_dl.journal import JobPlan, Journal
+from cda_dl.link_cache import LinkCache
+from cda_dl.manifest import Manifests, verify_tree
+from cda_dl.metrics import build_report, write_json_report, write_prometheus
+from cda_dl.mp4 import check_tree
+from cda_dl.order import order_jobs
+from cda_dl.quality import QualityPolicy
+from cda_dl.resolver import LinkResolver
+from cda_dl.sink import PipeTarget, get_target
+from cda_dl.snapshot import FolderSnapshots
+from cda_dl.ui import UI, JsonlUI, RichUI
+from cda_dl.utils import (
+    classify_url,
+    get_random_agent,
+    is_folder,
+    is_video,
+)
 from cda_dl.video import Video
+from cda_dl.watch import Watcher
+from cda_dl.worker import QueueWorker, get_queue_job
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(message)s",
-    handlers=[RichHandler(show_time=False)],
-)
 LOGGER = logging.getLogger(__name__)
 
+# The number of concurrent downloads '-t auto' starts with.
+DEFAULT_THREADS = 3
+# How many urls of the batch file go to the job queue at once.
+QUEUE_BATCH = 1000
+
+
+def setup_logging(output: str) -> None:
+    """Route log records through Rich, or as plain lines to stderr in the
+    'jsonl' output mode. Done on the first Downloader instead of at import
+    time, so importing cda_dl stays cheap."""
+    if output == "jsonl":
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(levelname)s: %(message)s",
+            stream=sys.stderr,
+        )
+        return
+    from rich.logging import RichHandler
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[RichHandler(show_time=False)],
+    )
+
+
+def get_path(arg: str | None) -> Path | None:
+    """Expand an optional path argument given by the user."""
+    if arg is None:
+        return None
+    return Path(path.abspath(path.expanduser(path.expandvars(arg))))
+
 
 class Downloader:
     urls: list[str]
     login: str | None
     password: str | None
     list_resolutions: bool
+    list_only: bool
+    output: str
+    probed: dict[str, Video]
+    crawl_threads: int
     download_options: DownloadOptions
     download_state: DownloadState
-    ui: RichUI
+    ui: UI
+    events_file: TextIO | None
     video_urls: list[str]
     folder_urls: list[str]
+    plan: JobPlan | None
+    report_path: Path | None
+    metrics_path: Path | None
+    profile_path: Path | None
+    watch: float | None
+    stdout_sink: bool
+    batch_file: str | None
+    url_filter: UrlFilter
+    queue_path: Path | None
+    lease: float
 
     def __init__(self, args: argparse.Namespace) -> None:
+        # In the --list-only mode stdout carries the listing only, with
+        # '--sink -' the video.
+        self.stdout_sink = args.sink == "-"
+        setup_logging(
+            "jsonl" if args.list_only or self.stdout_sink else args.output
+        )
         self.urls = [url.strip() for url in args.urls]
+        self.batch_file = args.batch_file
+        self.url_filter = UrlFilter()
+        self.queue_path = get_path(args.queue)
+        self.lease = args.lease
+        self.plan = None
+        resume_path = get_path(args.resume_job)
+        if resume_path is not None:
+            self.plan = Journal.load(resume_path)
+            if not self.urls:
+                self.urls = self.plan.urls
         self.login, self.password = args.login, None
         if self.login is not None:
             self.password = getpass(f"Podaj hasło dla {self.login}: ")
         self.list_resolutions = args.list_resolutions
+        self.list_only = args.list_only
+        self.output = args.output
+        self.probed: dict[str, Video] = {}
+        self.crawl_threads = args.crawl_threads
+        self.autotune = args.nthreads == "auto"
+        self.thread_bounds = (args.min_threads, args.max_threads)
         self.download_options = DownloadOptions(
             Path(
                 path.abspath(path.expanduser(path.expandvars(args.directory)))
             ),
             args.resolution,
             args.overwrite,
-            args.nthreads,
+            args.max_threads if self.autotune else args.nthreads,
             args.quiet,
         )
+        if self.plan is not None and self.plan.directory is not None:
+            self.download_options.directory = self.plan.directory
+        if args.dedupe is not None or args.dedupe_index is not None:
+            self.download_options.dedupe = DedupeIndex(
+                args.dedupe or "hardlink", get_path(args.dedupe_index)
+            )
+        try:
+            self.download_options.target = get_target(args.sink)
+        except FlagError as e:
+            LOGGER.error(e)
+            sys.exit(1)
+        self.download_options.disk = FreeSpaceGate(args.min_free)
+        self.download_options.min_speed = args.min_speed
+        self.download_options.slow_grace = args.slow_grace
+        self.download_options.order = args.order
+        if args.budget is not None or args.deadline is not None:
+            self.download_options.quality = QualityPolicy(
+                args.budget, args.deadline
+            )
+        if args.verify:
+            self.verify_and_exit()
+        if args.checksum is not None:
+            self.download_options.manifests = Manifests(args.checksum)
+        if args.link_ttl > 0:
+            self.download_options.link_cache = LinkCache(args.link_ttl)
+        self.watch = args.watch
+        if args.sync or self.watch is not None:
+            self.download_options.snapshots = FolderSnapshots()
+        journal_path = resume_path or get_path(args.journal)
+        if journal_path is not None:
+            self.download_options.journal = Journal(journal_path)
+        self.report_path = get_path(args.report)
+        self.metrics_path = get_path(args.metrics)
+        self.profile_path = get_path(args.profile)
+        self.stall_threshold = args.stall_threshold / 1000
         self.download_state = DownloadState()
-        self.ui = RichUI(Table.grid(expand=True))
-        asyncio.run(self.main())
+        self.events_file = None
+        self.ui = self.get_ui(args)
+        try:
+            self.run()
+        finally:
+            if self.events_file is not None:
+                self.events_file.close()
+            if self.download_options.journal is not None:
+                self.download_options.journal.close()
+        self.write_reports()
+
+    def verify_and_exit(self) -> None:
+        """Verify the checksums and the MP4 structure of the downloaded
+        files and exit."""
+        directory = self.download_options.directory
+        nthreads = self.download_options.nthreads
+        result = verify_tree(directory, nthreads)
+        for bad_path, reason in result.bad:
+            LOGGER.error(f"{bad_path}: {reason}")
+        LOGGER.info(
+            f"Sprawdzono {result.ok + len(result.bad)} plików, pominięto"
+            f" {result.unchanged} niezmienionych, błędnych:"
+            f" {len(result.bad)}."
+        )
+        broken = check_tree(directory, nthreads)
+        for bad_path, reason in broken:
+            LOGGER.error(f"{bad_path}: {reason}")
+        LOGGER.info(f"Uszkodzonych plików MP4: {len(broken)}.")
+        sys.exit(1 if result.bad or broken else 0)
+
+    def run(self) -> None:
+        if self.profile_path is None:
+            asyncio.run(self.main())
+            return
+        from cda_dl.profiling import Profiler
+
+        Profiler(self.profile_path, self.stall_threshold).run(self.main())
+
+    def get_ui(self, args: argparse.Namespace) -> UI:
+        """Get the UI for the output mode chosen by the user."""
+        if args.list_only:
+            return UI()
+        if args.output == "jsonl":
+            stream = sys.stderr if self.stdout_sink else sys.stdout
+            if args.output_file is not None:
+                self.events_file = stream = open(
+                    args.output_file, "a", encoding="utf-8"
+                )
+            return JsonlUI(stream)
+        if self.stdout_sink:
+            return UI()
+        from rich.table import Table
+
+        return RichUI(Table.grid(expand=True))
 
     async def main(self) -> None:
         async with aiohttp.ClientSession() as session:
+            self.download_options.link_resolver = LinkResolver(session)
+            if self.batch_file is not None and not self.streams_batch():
+                self.urls += [url async for url in read_urls(self.batch_file)]
+                self.batch_file = None
             try:
                 if self.login is not None and self.password is not None:
                     await self.perform_login(session)
+                if self.list_only:
+                    await self.crawl(session)
+                    return
                 if self.list_resolutions:
                     await self.list_resolutions_and_exit(session)
                 await self.check_valid_resolution(session)
@@ -77,22 +258,52 @@ class Downloader:
             except (FlagError, ResolutionError, LoginError, CaptchaError) as e:
                 LOGGER.error(e)
             else:
-                self.video_urls, self.folder_urls = self.get_urls()
-                with Live(self.ui.table, refresh_per_second=10):
-                    if len(self.folder_urls) > 0:
-                        await self.download_folders(session)
-                    if len(self.video_urls) > 0:
-                        await self.download_videos(session)
-                clear()
-                console = Console()
-                console.print(
-                    "| [green bold]Pobrane Pliki:"
-                    f" {self.download_state.completed}[/] - [yellow"
-                    f" bold]Pominięte Pliki: {self.download_state.skipped}[/]"
-                    " - [red bold]Nieudane Pliki:"
-                    f" {self.download_state.failed}[/] |\n"
-                )
-                console.print("Skończono pobieranie. Enjoy :)")
+                videos: list[tuple[str, Path]] = []
+                folders: list[tuple[str, Path]] = []
+                if self.queue_path is None:
+                    videos, folders = self.get_jobs()
+                tuner = self.download_options.tuner
+                tuning = None
+                if tuner is not None:
+                    tuning = asyncio.create_task(tuner.run())
+                try:
+                    with self.ui.live():
+                        if self.queue_path is not None:
+                            await self.download_queue(session)
+                        if len(folders) > 0:
+                            await self.download_folders(session, folders)
+                        if len(videos) > 0:
+                            await self.download_videos(session, videos)
+                        if (
+                            self.batch_file is not None
+                            and self.queue_path is None
+                        ):
+                            await self.download_batch(session)
+                        if self.watch is not None and len(folders) > 0:
+                            await self.watch_folders(session, folders)
+                finally:
+                    if tuning is not None:
+                        tuning.cancel()
+                    if self.download_options.target is not None:
+                        await self.download_options.target.close()
+                    if self.download_options.manifests is not None:
+                        await self.download_options.manifests.close()
+                    if self.download_options.dedupe is not None:
+                        await self.download_options.dedupe.close()
+                    if self.download_options.link_cache is not None:
+                        await self.download_options.link_cache.close()
+                self.ui.print_summary(self.download_state)
+
+    def write_reports(self) -> None:
+        """Write the JSON run report and the Prometheus metrics."""
+        if self.report_path is None and self.metrics_path is None:
+            return
+        self.download_state.finished = time.time()
+        report = build_report(self.download_state)
+        if self.report_path is not None:
+            write_json_report(report, self.report_path)
+        if self.metrics_path is not None:
+            write_prometheus(report, self.metrics_path)
 
     async def perform_login(self, session: aiohttp.ClientSession) -> None:
         """Log in to the session object."""
@@ -115,13 +326,33 @@ class Downloader:
                 "Nie udało się zalogować z powodu błędnego loginu lub hasła."
             )
 
+    async def probe_videos(
+        self, session: aiohttp.ClientSession, urls: list[str]
+    ) -> dict[str, Video | Exception]:
+        """Fetch the Video pages of all urls concurrently, at most
+        --crawl-threads at a time."""
+        semaphore = asyncio.Semaphore(max(self.crawl_threads, 1))
+
+        async def probe(url: str) -> Video | Exception:
+            video = Video(url, session, self.ui)
+            try:
+                async with semaphore:
+                    await video.probe()
+            except (ParserError, HTTPError, GeoBlockedError) as e:
+                return e
+            return video
+
+        results = await asyncio.gather(*(probe(url) for url in urls))
+        return dict(zip(urls, results))
+
     async def list_resolutions_and_exit(
         self, session: aiohttp.ClientSession
     ) -> None:
-        """List available resolutions for a video and exit."""
+        """List available resolutions for all videos and exit."""
+        video_urls = []
         for url in self.urls:
             if is_video(url):
-                await Video(url, session, self.ui).list_resolutions()
+                video_urls.append(url)
             elif is_folder(url):
                 LOGGER.warning(
                     f"Opcja -R jest dostępna tylko dla filmów. {url} jest"
@@ -129,7 +360,33 @@ class Downloader:
                 )
             else:
                 LOGGER.warning(f"Nie rozpoznano adresu url: {url}")
-            sys.exit()
+        probed = await self.probe_videos(session, video_urls)
+        if self.output == "jsonl":
+            for url, video in probed.items():
+                record = (
+                    {"url": url, "error": str(video)}
+                    if isinstance(video, Exception)
+                    else {
+                        "url": url,
+                        "title": video.title,
+                        "qualities": list(video.resolutions),
+                    }
+                )
+                print(json.dumps(record, ensure_ascii=False))
+        elif probed:
+            from rich.console import Console
+            from rich.table import Table
+
+            table = Table("URL", "Tytuł", "Dostępne rozdzielczości")
+            for url, video in probed.items():
+                if isinstance(video, Exception):
+                    table.add_row(url, f"[red]{video}[/red]", "")
+                else:
+                    table.add_row(
+                        url, video.title, ", ".join(video.resolutions)
+                    )
+            Console().print(table)
+        sys.exit()
 
     def changed_resolution(self) -> bool:
         """Check if resolution was changed by the user."""
@@ -138,23 +395,58 @@ class Downloader:
     async def check_valid_resolution(
         self, session: aiohttp.ClientSession
     ) -> None:
-        """Check if the resolution provided by the user is valid."""
+        """Check if the resolution provided by the user is valid. The
+        probed Videos are kept for the download, so their pages are not
+        fetched again."""
+        if not self.changed_resolution():
+            return
+        if self.download_options.quality is not None:
+            # The quality policy falls back to another resolution.
+            return
+        # The Videos are probed with the normalized urls they are
+        # downloaded, journaled and reported with; errors name the urls
+        # as given.
+        urls: dict[str, str] = {}
         for url in self.urls:
-            if self.changed_resolution():
-                if is_video(url):
-                    await Video(url, session, self.ui).check_resolution(
-                        self.download_options
-                    )
-                elif is_folder(url):
-                    raise FlagError(
-                        f"Opcja -r jest dostępna tylko dla filmów. {url} jest"
-                        " folderem!"
-                    )
-                else:
-                    raise FlagError(f"Nie rozpoznano adresu url: {url}")
+            classified = classify_url(url)
+            if is_folder(url):
+                raise FlagError(
+                    f"Opcja -r jest dostępna tylko dla filmów. {url} jest"
+                    " folderem!"
+                )
+            elif not is_video(url) or classified is None:
+                raise FlagError(f"Nie rozpoznano adresu url: {url}")
+            urls.setdefault(classified[1], url)
+        probed = await self.probe_videos(session, list(urls))
+        for url, video in probed.items():
+            # Videos that failed to load are left to the download, which
+            # reports them with the rest.
+            if isinstance(video, Video):
+                video.check_resolution(self.download_options, urls[url])
+                self.probed[url] = video
 
     def set_threads(self) -> None:
         """Set number of threads for download."""
+        if isinstance(self.download_options.target, PipeTarget):
+            # A pipe takes one file at a time; others would only hold
+            # their streams open while waiting.
+            self.autotune = False
+            self.download_options.nthreads = 1
+        if self.autotune:
+            minimum, maximum = self.thread_bounds
+            if not 0 < minimum <= maximum:
+                raise FlagError(
+                    "Opcje --min-threads i --max-threads muszą spełniać"
+                    f" 0 < min <= max. Podano: {minimum} i {maximum}."
+                )
+            semaphore = AdaptiveSemaphore(
+                max(minimum, min(DEFAULT_THREADS, maximum))
+            )
+            self.download_options.semaphore = semaphore
+            self.download_options.tuner = ConcurrencyTuner(
+                semaphore, minimum, maximum
+            )
+            return
         if self.download_options.nthreads <= 0:
             raise FlagError(
                 "Opcja -t musi być większa od 0. Podano:"
@@ -165,44 +457,268 @@ class Downloader:
         )
 
     def get_urls(self) -> tuple[list[str], list[str]]:
-        """Split urls into two lists: video_urls and folder_urls."""
+        """Split urls into two lists: video_urls and folder_urls. Video
+        urls are normalized, and repeated urls left out."""
         video_urls: list[str] = []
         folder_urls: list[str] = []
         for url in self.urls:
-            if is_video(url):
-                video_urls.append(url)
-            elif is_folder(url):
-                folder_urls.append(url)
-            else:
-                LOGGER.warning(f"Nie rozpoznano adresu url: {url}")
-                self.download_state.failed += 1
+            classified = self.classify_url(url)
+            if classified is None:
+                continue
+            kind, url = classified
+            (video_urls if kind == "video" else folder_urls).append(url)
         return video_urls, folder_urls
 
-    async def download_folders(self, session: aiohttp.ClientSession) -> None:
+    def classify_url(self, url: str) -> tuple[str, str] | None:
+        """Classify a url of the input. Return None for an unknown url,
+        which counts as failed, and for a repeated one."""
+        classified = classify_url(url)
+        if classified is None:
+            LOGGER.warning(f"Nie rozpoznano adresu url: {url}")
+            self.download_state.failed += 1
+            return None
+        if not self.url_filter.add(classified[1]):
+            return None
+        return classified
+
+    def streams_batch(self) -> bool:
+        """Check if the batch file can be downloaded while it is read.
+        Listing, ordering by duration and sharing a quality budget need
+        all the urls up front."""
+        return not (
+            self.list_only
+            or self.list_resolutions
+            or self.download_options.order != "input"
+            or self.download_options.quality is not None
+        )
+
+    def get_jobs(
+        self,
+    ) -> tuple[list[tuple[str, Path]], list[tuple[str, Path]]]:
+        """Get the videos and folders to download, with the directories to
+        download them to. A resumed job continues with what its journal
+        has not finished yet; a new job is recorded in the journal.
+
+        The videos are counted in the quality policy right away, as they
+        are downloaded after the folders; the videos of a folder are only
+        counted once the folder is listed."""
+        if self.plan is not None:
+            videos = self.plan.pending_videos
+            folders = self.plan.pending_folders
+            LOGGER.info(
+                f"Wznawiam zadanie: {len(videos)} filmów i {len(folders)}"
+                " folderów do pobrania."
+            )
+        else:
+            self.video_urls, self.folder_urls = self.get_urls()
+            directory = self.download_options.directory
+            journal = self.download_options.journal
+            if journal is not None:
+                journal.job(self.urls, directory)
+                for url in self.video_urls:
+                    journal.video(url, directory)
+            videos = [(url, directory) for url in self.video_urls]
+            folders = [(url, directory) for url in self.folder_urls]
+        if self.download_options.quality is not None:
+            self.download_options.quality.queue(len(videos))
+        return videos, folders
+
+    async def crawl(self, session: aiohttp.ClientSession) -> None:
+        """Write the videos of all urls to stdout without downloading."""
+        if self.crawl_threads <= 0:
+            raise FlagError(
+                "Opcja --crawl-threads musi być większa od 0. Podano:"
+                f" {self.crawl_threads}."
+            )
+        crawler = Crawler(
+            session, sys.stdout, self.crawl_threads, self.list_resolutions
+        )
+        video_urls, folder_urls = self.get_urls()
+        await asyncio.gather(
+            *(crawler.crawl_folder(url) for url in folder_urls),
+            *(crawler.crawl_video(url) for url in video_urls),
+        )
+        LOGGER.info(f"Znaleziono {crawler.count} filmów.")
+
+    async def download_folders(
+        self, session: aiohttp.ClientSession, folders: list[tuple[str, Path]]
+    ) -> None:
         self.ui.set_progress_bar_folder("bold yellow")
         self.ui.add_row_folder("green")
-        for folder_url in self.folder_urls:
-            try:
-                await Folder(folder_url, session, self.ui).download_folder(
-                    self.download_options, self.download_state
-                )
-            except (ParserError, HTTPError) as e:
-                LOGGER.warning(e)
-                self.download_state.failed += 1
+        jobs = [
+            (Folder(folder_url, session, self.ui), directory)
+            for folder_url, directory in folders
+        ]
+        journal = self.download_options.journal
+        if journal is not None:
+            for folder, directory in jobs:
+                journal.root_folder(folder.url, directory)
+        for folder, directory in jobs:
+            await self.download_folder(folder, directory)
 
-    async def download_videos(self, session: aiohttp.ClientSession) -> None:
+    async def download_folder(self, folder: Folder, directory: Path) -> None:
+        try:
+            await folder.download_folder(
+                self.download_options.with_directory(directory),
+                self.download_state,
+            )
+        except (ParserError, HTTPError) as e:
+            LOGGER.warning(e)
+            self.download_state.failed += 1
+
+    async def download_videos(
+        self, session: aiohttp.ClientSession, videos: list[tuple[str, Path]]
+    ) -> None:
         if self.ui.progbar_video is None:
             self.ui.set_progress_bar_video("bold blue")
             self.ui.add_row_video("green")
 
-        async def wrapper(video_url: str) -> None:
-            async with self.download_options.semaphore:
-                await Video(video_url, session, self.ui).download_video(
-                    self.download_options, self.download_state
-                )
+        order = self.download_options.order
+        if order != "input":
+            # The durations come from the Video pages, which the downloads
+            # need anyway.
+            urls = [url for url, _ in videos if url not in self.probed]
+            for url, video in (await self.probe_videos(session, urls)).items():
+                if isinstance(video, Video):
+                    self.probed[url] = video
+
+            def duration(job: tuple[str, Path]) -> int | None:
+                video = self.probed.get(job[0])
+                return None if video is None else video.duration
+
+            videos = order_jobs(videos, duration, order)
 
         tasks = [
-            asyncio.create_task(wrapper(video_url))
-            for video_url in self.video_urls
+            asyncio.create_task(
+                self.download_video(session, video_url, directory)
+            )
+            for video_url, directory in videos
         ]
         await asyncio.gather(*tasks)
+
+    async def download_video(
+        self, session: aiohttp.ClientSession, video_url: str, directory: Path
+    ) -> None:
+        self.ui.video_queued(video_url)
+        video = self.probed.pop(video_url, None)
+        if video is None:
+            video = Video(video_url, session, self.ui)
+        resolved = None
+        if self.plan is not None:
+            resolved = self.plan.resolved.get(video_url)
+        if resolved is not None:
+            # The title finds a finished file without the Video page.
+            video.listed_title = video.listed_title or resolved["title"]
+            video.journaled_resolution = resolved["resolution"]
+        await video.download_video(
+            self.download_options.with_directory(directory),
+            self.download_state,
+        )
+
+    async def download_batch(self, session: aiohttp.ClientSession) -> None:
+        """Download the urls of the batch file while it is read, at most
+        -t at a time, so a list of any length, or a pipe that another
+        program keeps writing to, starts downloading right away."""
+        assert self.batch_file is not None
+        if self.ui.progbar_video is None:
+            self.ui.set_progress_bar_video("bold blue")
+            self.ui.add_row_video("green")
+        directory = self.download_options.directory
+        journal = self.download_options.journal
+        # Folders are downloaded one at a time, like from the arguments;
+        # each downloads its videos in parallel.
+        folder_lock = asyncio.Lock()
+
+        async def jobs() -> AsyncIterator[tuple[str, str]]:
+            assert self.batch_file is not None
+            async for url in read_urls(self.batch_file):
+                classified = self.classify_url(url)
+                if classified is not None:
+                    yield classified
+
+        async def download(job: tuple[str, str]) -> None:
+            kind, url = job
+            if kind == "video":
+                if journal is not None:
+                    journal.video(url, directory)
+                await self.download_video(session, url, directory)
+                return
+            folder = Folder(url, session, self.ui)
+            if journal is not None:
+                journal.root_folder(folder.url, directory)
+            async with folder_lock:
+                if self.ui.progbar_folder is None:
+                    self.ui.set_progress_bar_folder("bold yellow")
+                    self.ui.add_row_folder("green")
+                await self.download_folder(folder, directory)
+
+        await run_bounded(jobs(), download, self.download_options.nthreads)
+        if self.url_filter.repeated:
+            LOGGER.info(
+                f"Pominięto {self.url_filter.repeated} powtórzonych adresów."
+            )
+
+    async def download_queue(self, session: aiohttp.ClientSession) -> None:
+        """Add the urls of the input to the job queue shared with other
+        workers, and download its jobs until none is left."""
+        assert self.queue_path is not None
+        queue = await asyncio.to_thread(JobQueue, self.queue_path, self.lease)
+        try:
+            added = await self.enqueue(queue)
+            if added:
+                LOGGER.info(f"Dodano {added} zadań do kolejki.")
+            if self.ui.progbar_video is None:
+                self.ui.set_progress_bar_video("bold blue")
+                self.ui.add_row_video("green")
+            await QueueWorker(
+                queue,
+                session,
+                self.ui,
+                self.download_options,
+                self.download_state,
+            ).run()
+        finally:
+            queue.close()
+
+    async def enqueue(self, queue: JobQueue) -> int:
+        """Add the urls of the arguments and of the batch file to the
+        queue, a few at a time. Return how many jobs were new."""
+
+        async def urls() -> AsyncIterator[str]:
+            for url in self.urls:
+                yield url
+            if self.batch_file is not None:
+                async for url in read_urls(self.batch_file):
+                    yield url
+
+        added = 0
+        jobs = []
+        async for url in urls():
+            classified = self.classify_url(url)
+            job = None if classified is None else get_queue_job(classified[1])
+            if job is not None:
+                jobs.append(job)
+            if len(jobs) >= QUEUE_BATCH:
+                added += await asyncio.to_thread(queue.add, jobs)
+                jobs = []
+        if jobs:
+            added += await asyncio.to_thread(queue.add, jobs)
+        return added
+
+    async def watch_folders(
+        self, session: aiohttp.ClientSession, folders: list[tuple[str, Path]]
+    ) -> None:
+        """Download new videos from the synced folders until interrupted."""
+        assert self.watch is not None
+        watcher = Watcher(
+            session,
+            self.ui,
+            self.download_options,
+            self.download_state,
+            self.watch,
+        )
+        for folder_url, directory in folders:
+            watcher.add_tree(
+                Folder(folder_url, session, self.ui).url, directory
+            )
+        await watcher.run()
@@ -28,6 +28,20 @@ class HTTPError(Exception):
         return self.message
 
 
+class DiskSpaceError(Exception):
+    pass
+
+
+class BrokenFileError(Exception):
+    def __init__(self, message: str, truncated: bool = False):
+        super().__init__(message)
+        self.truncated = truncated
+
+
+class SlowStreamError(Exception):
+    pass
+
+
 class LoginError(Exception):
     pass
 
@@ -2,26 +2,38 @@ from __future__ import annotations
 
 import asyncio
 from pathlib import Path
+from typing import Any, Iterator
+from urllib.parse import urljoin
 
 import aiohttp
 from bs4 import BeautifulSoup
+from bs4.element import Tag
 
 from cda_dl.download_options import DownloadOptions
 from cda_dl.download_state import DownloadState
 from cda_dl.error import HTTPError, ParserError
-from cda_dl.ui import RichUI
-from cda_dl.utils import get_folder_match, get_request, get_safe_title
+from cda_dl.journal import DONE_STATES
+from cda_dl.order import order_jobs
+from cda_dl.profiling import timed
+from cda_dl.snapshot import get_fingerprint
+from cda_dl.ui import UI
+from cda_dl.utils import (
+    get_folder_match,
+    get_request,
+    get_safe_title,
+    parse_duration,
+)
 from cda_dl.video import Video
 
 
 class Folder:
     title: str
-    videos: list[Video]
+    videos: list[ListedVideo]
     folders: list[Folder]
     soup: BeautifulSoup
 
     def __init__(
-        self, url: str, session: aiohttp.ClientSession, ui: RichUI
+        self, url: str, session: aiohttp.ClientSession, ui: UI
     ) -> None:
         self.url = url
         self.url = self.get_adjusted_url()
@@ -40,16 +52,49 @@ class Folder:
         match = get_folder_match(self.url)
         return self.url if match and match.group(2) else self.url + "1/"
 
+    @timed
     async def download_folder(
         self, download_options: DownloadOptions, download_state: DownloadState
     ) -> None:
         """Recursively download all videos and subfolders of the folder."""
-        self.soup = await self.get_soup()
-        self.title = await self.get_folder_title()
+        url = self.url
+        parent = download_options.directory
+        snapshot = None
+        if download_options.snapshots is not None:
+            snapshot = download_options.snapshots.get(parent, url)
+            pages = await self.sync_pages(snapshot)
+        else:
+            self.soup = await self.get_soup()
+            self.title = await self.get_folder_title()
+            self.folders = await self.get_subfolders()
+            del self.soup
+        download_options = download_options.with_directory(
+            Path(parent, self.title)
+        )
         await self.make_directory(download_options)
-        self.folders = await self.get_subfolders()
-        self.videos = await self.get_videos_from_folder()
-        assert self.ui.progbar_folder
+        if download_options.snapshots is not None:
+            done = set(snapshot["done"]) if snapshot else set()
+            if download_options.overwrite:
+                done.clear()
+            self.folders = [
+                Folder(folder_url, self.session, self.ui)
+                for folder_url in pages[0]["folders"]
+            ]
+            self.videos = [
+                get_snapshot_video(entry)
+                for page in pages
+                for entry in page["videos"]
+                if entry[0] not in done
+            ]
+        else:
+            self.videos = await self.get_videos_from_folder()
+        if download_options.journal is not None:
+            download_options.journal.folder(
+                url,
+                download_options.directory,
+                [video.url for video in self.videos],
+                [folder.url for folder in self.folders],
+            )
         self.ui.add_task_folder(
             self.title, len(self.folders) + len(self.videos)
         )
@@ -57,6 +102,20 @@ class Folder:
             await self.download_videos_from_folder(
                 download_options, download_state
             )
+        if download_options.snapshots is not None:
+            listed = {
+                video_url for page in pages for video_url, *_ in page["videos"]
+            }
+            done = {
+                video.url
+                for video in self.videos
+                if video.state in DONE_STATES
+            }
+            if snapshot is not None and not download_options.overwrite:
+                done.update(listed.intersection(snapshot["done"]))
+            download_options.snapshots.put(
+                parent, url, {"pages": pages, "done": sorted(done)}
+            )
         if len(self.folders) > 0:
             await self.download_subfolders(download_options, download_state)
         self.ui.remove_task_folder()
@@ -67,9 +126,9 @@ class Folder:
         """Download all subfolders of the folder."""
         for folder in self.folders:
             await folder.download_folder(download_options, download_state)
-            assert self.ui.progbar_folder
             self.ui.update_task_folder(1)
 
+    @timed
     async def get_soup(self) -> BeautifulSoup:
         response = await get_request(self.url, self.session, self.headers)
         text = await response.text()
@@ -78,9 +137,6 @@ class Folder:
 
     async def make_directory(self, download_options: DownloadOptions) -> None:
         """Make directory for the folder."""
-        download_options.directory = Path(
-            download_options.directory, self.title
-        )
         download_options.directory.mkdir(parents=True, exist_ok=True)
 
     async def get_folder_title(self) -> str:
@@ -96,6 +152,7 @@ class Folder:
         title = title_wrapper.find("a", href=True).text
         return get_safe_title(title)
 
+    @timed
     async def get_subfolders(self) -> list[Folder]:
         """Get subfolders of the folder."""
         folders_soup = self.soup.find_all(
@@ -108,6 +165,7 @@ class Folder:
         ]
         return folders
 
+    @timed
     async def download_videos_from_folder(
         self, download_options: DownloadOptions, download_state: DownloadState
     ) -> None:
@@ -116,18 +174,120 @@ class Folder:
             self.ui.set_progress_bar_video("bold blue")
             self.ui.add_row_video("green")
 
-        async def wrapper(video: Video) -> None:
-            async with download_options.semaphore:
+        async def worker(entries: Iterator[ListedVideo]) -> None:
+            for entry in entries:
+                video = Video(
+                    entry.url,
+                    self.session,
+                    self.ui,
+                    entry.title,
+                    entry.duration,
+                )
                 await video.download_video(download_options, download_state)
-                assert self.ui.progbar_folder
+                entry.state = video.metrics.status
                 self.ui.update_task_folder(1)
 
-        tasks = [asyncio.create_task(wrapper(video)) for video in self.videos]
-        await asyncio.gather(*tasks)
+        # The Videos are created by a few workers only when their turn
+        # comes, so a huge folder is held as small ListedVideo records.
+        for entry in self.videos:
+            self.ui.video_queued(entry.url)
+        if download_options.quality is not None:
+            download_options.quality.queue(len(self.videos))
+        entries = iter(
+            order_jobs(
+                self.videos,
+                lambda entry: entry.duration,
+                download_options.order,
+            )
+        )
+        nworkers = min(download_options.nthreads, len(self.videos))
+        await asyncio.gather(*(worker(entries) for _ in range(nworkers)))
+
+    @timed
+    async def sync_pages(
+        self, snapshot: dict[str, Any] | None
+    ) -> list[dict[str, Any]]:
+        """Get the listing of every page of the folder, reusing the
+        snapshot of the last sync where possible.
+
+        New uploads show up on the first page or after the last one, so
+        when the first page, the last page and the page after it did not
+        change, the rest of the snapshot is still valid and a folder of
+        any size costs three requests. Otherwise all pages are read again.
+        """
+        old_pages: list[dict[str, Any]] = snapshot["pages"] if snapshot else []
+        fetched: dict[int, dict[str, Any] | None] = {}
+
+        async def page(number: int) -> dict[str, Any] | None:
+            if number not in fetched:
+                old = (
+                    old_pages[number - 1] if number <= len(old_pages) else None
+                )
+                fetched[number] = await self.get_page(number, old)
+            return fetched[number]
+
+        first = await page(1)
+        assert first is not None
+        self.title = first["title"]
+        if old_pages and first["hash"] == old_pages[0]["hash"]:
+            last = await page(len(old_pages))
+            if (
+                last is not None
+                and last["hash"] == old_pages[-1]["hash"]
+                and await page(len(old_pages) + 1) is None
+            ):
+                return [first] + old_pages[1:]
+        pages: list[dict[str, Any]] = []
+        number = 1
+        while (current := await page(number)) is not None:
+            pages.append(current)
+            number += 1
+        return pages
+
+    @timed
+    async def get_page(
+        self, number: int, old: dict[str, Any] | None
+    ) -> dict[str, Any] | None:
+        """Get the listing of a page of the folder, or None after the last
+        page. A page that the server reports as not modified since the old
+        listing is not downloaded again."""
+        match = get_folder_match(self.url)
+        assert match
+        headers = dict(self.headers)
+        if old is not None and old.get("etag"):
+            headers["If-None-Match"] = old["etag"]
+        try:
+            response = await get_request(
+                f"{match.group(1)}/{number}/", self.session, headers
+            )
+        except HTTPError as e:
+            if number > 1 and e.status_code == 404:
+                return None
+            raise
+        if response.status == 304 and old is not None:
+            return old
+        soup = BeautifulSoup(await response.text(), "html.parser")
+        page: dict[str, Any] = {
+            "etag": response.headers.get("ETag"),
+            "videos": [
+                [entry.url, entry.title, entry.duration]
+                for entry in get_listed_videos(soup, self.url)
+            ],
+        }
+        if number == 1:
+            self.soup = soup
+            page["title"] = await self.get_folder_title()
+            page["folders"] = [
+                folder.url for folder in await self.get_subfolders()
+            ]
+            del self.soup
+        page["hash"] = get_fingerprint(page)
+        return page
 
-    async def get_videos_from_folder(self) -> list[Video]:
+    @timed
+    async def get_videos_from_folder(self) -> list[ListedVideo]:
         """Get all videos from the folder."""
-        all_videos: list[Video] = []
+        all_videos: list[ListedVideo] = []
         while True:
             try:
                 videos = await self.get_videos_from_current_page()
@@ -137,23 +297,13 @@ class Folder:
             self.url = self.get_next_page_url()
         return all_videos
 
-    async def get_videos_from_current_page(self) -> list[Video]:
+    @timed
+    async def get_videos_from_current_page(self) -> list[ListedVideo]:
         """Get all videos from the current page."""
         response = await get_request(self.url, self.session, self.headers)
         text = await response.text()
         page_soup = BeautifulSoup(text, "html.parser")
-        videos_soup = page_soup.find_all(
-            "a", href=True, class_="thumbnail-link"
-        )
-        videos = [
-            Video(
-                "https://www.cda.pl" + video["href"],
-                self.session,
-                self.ui,
-            )
-            for video in videos_soup
-        ]
-        return videos
+        return get_listed_videos(page_soup, self.url)
 
     def get_next_page_url(self) -> str:
         """Get next page of the folder."""
@@ -162,3 +312,56 @@ class Folder:
         page_number = int(match.group(2))
         stripped_url = match.group(1)
         return stripped_url + "/" + str(page_number + 1) + "/"
+
+
+class ListedVideo:
+    """A video as listed on a folder page, and its final state once it
+    was downloaded."""
+
+    __slots__ = ("url", "title", "duration", "state")
+
+    def __init__(self, url: str, title: str, duration: int | None) -> None:
+        self.url = url
+        self.title = title
+        self.duration = duration
+        self.state: str | None = None
+
+
+def get_snapshot_video(entry: list[Any]) -> ListedVideo:
+    """Make a ListedVideo of a snapshot entry: [url, title, duration], or
+    [url, title] in the snapshots of older versions."""
+    url, title, *rest = entry
+    return ListedVideo(url, title, rest[0] if rest else None)
+
+
+def get_listed_videos(soup: BeautifulSoup, url: str) -> list[ListedVideo]:
+    """Get the videos of a folder page with the title and the duration
+    shown next to their thumbnails."""
+    videos = []
+    for link in soup.find_all("a", href=True, class_="thumbnail-link"):
+        duration = None
+        time_tag = link.find("span", class_=["time-thumb-fold", "timeElem"])
+        if isinstance(time_tag, Tag):
+            duration = parse_duration(time_tag.text)
+        videos.append(
+            ListedVideo(
+                urljoin(url, str(link["href"])),
+                get_listed_title(link),
+                duration,
+            )
+        )
+    return videos
+
+
+def get_listed_title(link: Tag) -> str:
+    """Get the title of a video from its thumbnail link in a folder, or
+    from the title link next to it."""
+    img = link.find("img")
+    if isinstance(img, Tag) and (img.get("alt") or img.get("title")):
+        return str(img.get("alt") or img.get("title"))
+    parent = link.find_parent("div")
+    if parent is not None:
+        title_link = parent.find("a", class_="link-title-visit")
+        if isinstance(title_link, Tag):
+            return title_link.text.strip()
+    return ""
@@ -0,0 +1,223 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+LOGGER = logging.getLogger(__name__)
+
+# How many times a job is leased before it counts as failed; a job whose
+# worker keeps dying is not handed out forever.
+MAX_ATTEMPTS = 3
+LEASE = 60.0
+
+# A job to add: (key, kind, url, directory, title, duration).
+JobRow = tuple[str, str, str, str, str | None, int | None]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    title TEXT,
+    duration INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until);
+"""
+
+
+class Job:
+    """A video or a folder to download, as leased from the JobQueue.
+    'directory' is relative to the target directory of the worker."""
+
+    __slots__ = (
+        "id",
+        "kind",
+        "url",
+        "directory",
+        "title",
+        "duration",
+        "attempts",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        kind: str,
+        url: str,
+        directory: str,
+        title: str | None,
+        duration: int | None,
+        attempts: int,
+    ) -> None:
+        self.id = id
+        self.kind = kind
+        self.url = url
+        self.directory = directory
+        self.title = title
+        self.duration = duration
+        self.attempts = attempts
+
+
+class JobQueue:
+    """Queue of download jobs in a SQLite file, shared by workers in
+    several processes or on several hosts, e.g. over NFS with working
+    locks.
+
+    A worker leases a job for 'lease' seconds and renews the lease with
+    heartbeats while it works on it. The lease of a worker that died
+    runs out and another worker takes the job over. Every job has a
+    unique key, the video id for videos, so a video found in several
+    folders or given twice is downloaded once. Leases use the wall
+    clock, so the clocks of the hosts must be in sync."""
+
+    def __init__(
+        self,
+        path: Path,
+        lease: float = LEASE,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> None:
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:"
+        self.worker += uuid.uuid4().hex[:8]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The calls come from threads, one at a time.
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in a write transaction, which waits for the
+        transactions of other workers."""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def add(self, jobs: Iterable[JobRow]) -> int:
+        """Add jobs; jobs with a key that is in the queue already are left
+        out. Return how many were added."""
+        with self.transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs"
+                " (key, kind, url, directory, title, duration)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                list(jobs),
+            )
+            return connection.total_changes - before
+
+    def claim(self) -> Job | None:
+        """Lease the next pending job, or a job whose lease ran out.
+        Folders come first, so their videos are queued early."""
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET state = 'failed', error = ?"
+                " WHERE state = 'leased' AND lease_until < ?"
+                " AND attempts >= ?",
+                ("Przekroczono liczbę prób.", now, self.max_attempts),
+            )
+            row = connection.execute(
+                "SELECT id, kind, url, directory, title, duration, attempts"
+                " FROM jobs WHERE state = 'pending'"
+                " OR (state = 'leased' AND lease_until < ?)"
+                " ORDER BY kind = 'video', id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET state = 'leased', worker = ?,"
+                " lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (self.worker, now + self.lease, row[0]),
+            )
+        job = Job(*row)
+        job.attempts += 1
+        return job
+
+    def heartbeat(self, ids: Iterable[int]) -> set[int]:
+        """Renew the leases of the jobs; return the ids of the jobs whose
+        leases were lost to another worker."""
+        ids = set(ids)
+        if not ids:
+            return set()
+        placeholders = ", ".join("?" * len(ids))
+        with self.transaction() as connection:
+            connection.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE id IN ({placeholders})"
+                " AND worker = ? AND state = 'leased'",
+                (time.time() + self.lease, *ids, self.worker),
+            )
+            held = {
+                row[0]
+                for row in connection.execute(
+                    f"SELECT id FROM jobs WHERE id IN ({placeholders})"
+                    " AND worker = ? AND state = 'leased'",
+                    (*ids, self.worker),
+                )
+            }
+        return ids - held
+
+    def finish(self, job: Job, state: str, error: str | None = None) -> bool:
+        """Record the final state of a leased job: 'done' or 'failed'.
+        Return False if the lease was lost and the state not recorded."""
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, error = ?, lease_until = NULL"
+                " WHERE id = ? AND worker = ? AND state = 'leased'",
+                (state, error, job.id, self.worker),
+            )
+            return cursor.rowcount == 1
+
+    def retry(self, job: Job, error: str) -> bool:
+        """Give a failed job back to the queue, or fail it for good after
+        'max_attempts' attempts."""
+        if job.attempts >= self.max_attempts:
+            return self.finish(job, "failed", error)
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = 'pending', error = ?,"
+                " lease_until = NULL WHERE id = ? AND worker = ?"
+                " AND state = 'leased'",
+                (error, job.id, self.worker),
+            )
+            return cursor.rowcount == 1
+
+    def counts(self) -> dict[str, int]:
+        """Count the jobs in every state."""
+        with self.lock:
+            return dict(
+                self.connection.execute(
+                    "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+                ).fetchall()
+            )
+
+    def is_finished(self) -> bool:
+        """Check if no job is pending or leased by any worker."""
+        counts = self.counts()
+        return not counts.get("pending") and not counts.get("leased")
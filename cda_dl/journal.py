@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+LOGGER = logging.getLogger(__name__)
+
+# Videos in these states are not downloaded again when a job is resumed.
+DONE_STATES = ("completed", "skipped", "linked")
+
+
+class JobPlan:
+    """State of a job replayed from its journal."""
+
+    def __init__(self) -> None:
+        self.urls: list[str] = []
+        self.directory: Path | None = None
+        # Video url -> target directory, in the order of discovery.
+        self.videos: dict[str, Path] = {}
+        # Crawled folder url -> directory of the folder.
+        self.crawled: dict[str, Path] = {}
+        # Folder url -> directory the folder is created in.
+        self.discovered: dict[str, Path] = {}
+        self.states: dict[str, str] = {}
+        # Video url -> title and resolution the Video was resolved with.
+        self.resolved: dict[str, dict[str, Any]] = {}
+
+    def apply(self, record: dict[str, Any]) -> None:
+        op = record["op"]
+        if op == "job":
+            self.urls = record["urls"]
+            self.directory = Path(record["directory"])
+        elif op == "folder":
+            directory = Path(record["directory"])
+            self.crawled[record["url"]] = directory
+            for url in record["videos"]:
+                self.videos.setdefault(url, directory)
+            for url in record["folders"]:
+                self.discovered.setdefault(url, directory)
+        elif op == "root_folder":
+            self.discovered.setdefault(
+                record["url"], Path(record["directory"])
+            )
+        elif op == "video":
+            self.videos.setdefault(record["url"], Path(record["directory"]))
+        elif op == "resolved":
+            self.resolved[record["url"]] = record
+        elif op == "state":
+            self.states[record["url"]] = record["state"]
+
+    @property
+    def pending_videos(self) -> list[tuple[str, Path]]:
+        """Videos that are not downloaded yet, with their directories."""
+        return [
+            (url, directory)
+            for url, directory in self.videos.items()
+            if self.states.get(url) not in DONE_STATES
+        ]
+
+    @property
+    def pending_folders(self) -> list[tuple[str, Path]]:
+        """Folders that were found but not crawled, with the directories
+        they are created in."""
+        return [
+            (url, directory)
+            for url, directory in self.discovered.items()
+            if url not in self.crawled
+        ]
+
+
+class Journal:
+    """Append-only, write-ahead journal of a download job.
+
+    Every discovered folder and video, the resolved title and quality and
+    every state change is appended as one JSON line before the work it
+    describes goes on. Lines are flushed to the OS right away, so they
+    survive a crash of the process, and synced to disk at most once per
+    'sync_interval' seconds. 'cda-dl --resume-job FILE' replays the
+    journal and continues the job without crawling folders again."""
+
+    def __init__(self, path: Path, sync_interval: float = 1.0) -> None:
+        self.path = path
+        self.sync_interval = sync_interval
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        self.synced = time.monotonic()
+
+    def write(self, op: str, **fields: Any) -> None:
+        record = {"op": op, **fields}
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        if time.monotonic() - self.synced >= self.sync_interval:
+            os.fsync(self.file.fileno())
+            self.synced = time.monotonic()
+
+    def close(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+    def job(self, urls: list[str], directory: Path) -> None:
+        self.write("job", urls=urls, directory=str(directory))
+
+    def root_folder(self, url: str, directory: Path) -> None:
+        self.write("root_folder", url=url, directory=str(directory))
+
+    def folder(
+        self,
+        url: str,
+        directory: Path,
+        videos: list[str],
+        folders: list[str],
+    ) -> None:
+        self.write(
+            "folder",
+            url=url,
+            directory=str(directory),
+            videos=videos,
+            folders=folders,
+        )
+
+    def video(self, url: str, directory: Path) -> None:
+        self.write("video", url=url, directory=str(directory))
+
+    def resolved(self, url: str, title: str, resolution: str) -> None:
+        self.write("resolved", url=url, title=title, resolution=resolution)
+
+    def state(self, url: str, state: str) -> None:
+        self.write("state", url=url, state=state)
+
+    @staticmethod
+    def load(path: Path) -> JobPlan:
+        """Replay the journal. A torn last line, left by a crash in the
+        middle of a write, is ignored."""
+        plan = JobPlan()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    LOGGER.debug(f"Pomijam uszkodzoną linię dziennika: {line}")
+                    continue
+                plan.apply(record)
+        return plan
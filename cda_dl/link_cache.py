@@ -0,0 +1,109 @@
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+from cda_dl.metrics import DelayedWriter
+
+LOGGER = logging.getLogger(__name__)
+
+# Query parameters that carry the expiry time of a signed CDN link.
+EXPIRY_PARAMS = ("e", "expires", "Expires", "exp")
+# Links are not used in the last minute of their life.
+EXPIRY_MARGIN = 60
+MAX_EXPIRY = 30 * 24 * 3600
+
+
+def get_expiry(url: str, ttl: float, now: float) -> float:
+    """Get the expiry time of the link from its signature, or 'ttl'
+    seconds from now if the link does not say."""
+    query = parse_qs(urlparse(url).query)
+    for param in EXPIRY_PARAMS:
+        for value in query.get(param, []):
+            if value.isdigit() and now < int(value) < now + MAX_EXPIRY:
+                return float(value)
+    return now + ttl
+
+
+class LinkCache:
+    """Direct file links resolved by videoGetLink, cached per (video id,
+    requested resolution) in a file next to the .part files of the
+    directory. A resumed or retried download can then go straight to the
+    CDN, without fetching the Video page or calling videoGetLink again.
+    The changed files are written every few seconds and on close()."""
+
+    FILENAME = ".cda-dl-links.json"
+
+    def __init__(self, ttl: float = 3600) -> None:
+        self.ttl = ttl
+        self.directories: dict[Path, dict[str, dict[str, Any]]] = {}
+        self.changed: set[Path] = set()
+        self.writer = DelayedWriter(self.take_changed)
+
+    def load(self, directory: Path) -> dict[str, dict[str, Any]]:
+        if directory not in self.directories:
+            entries: dict[str, dict[str, Any]] = {}
+            path = directory / self.FILENAME
+            try:
+                entries = json.loads(path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                pass
+            except (ValueError, OSError) as e:
+                LOGGER.debug(f"Pomijam uszkodzony plik {path}: {e}")
+            self.directories[directory] = entries
+        return self.directories[directory]
+
+    def save(self, directory: Path) -> None:
+        self.changed.add(directory)
+        self.writer.touch()
+
+    def take_changed(self) -> dict[Path, dict[str, dict[str, Any]] | None]:
+        """Get copies of the changed files; an empty cache is deleted."""
+        files = {
+            directory / self.FILENAME: (
+                dict(self.directories[directory]) or None
+            )
+            for directory in self.changed
+        }
+        self.changed.clear()
+        return files
+
+    async def close(self) -> None:
+        await self.writer.close()
+
+    def get(
+        self, directory: Path, video_id: str, resolution: str
+    ) -> dict[str, Any] | None:
+        """Get the cached link, unless it expires within a minute."""
+        key = f"{video_id}:{resolution}"
+        entry = self.load(directory).get(key)
+        if entry is None:
+            return None
+        if entry["expires"] - EXPIRY_MARGIN < time.time():
+            self.remove(directory, video_id, resolution)
+            return None
+        return entry
+
+    def put(
+        self,
+        directory: Path,
+        video_id: str,
+        resolution: str,
+        url: str,
+        title: str,
+        actual_resolution: str,
+    ) -> None:
+        now = time.time()
+        self.load(directory)[f"{video_id}:{resolution}"] = {
+            "url": url,
+            "title": title,
+            "resolution": actual_resolution,
+            "expires": get_expiry(url, self.ttl, now),
+        }
+        self.save(directory)
+
+    def remove(self, directory: Path, video_id: str, resolution: str) -> None:
+        if self.load(directory).pop(f"{video_id}:{resolution}", None):
+            self.save(directory)
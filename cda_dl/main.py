@@ -5,7 +5,6 @@ from typing import Sequence
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from cda_dl.downloader import Downloader
 from cda_dl.version import __version__
 
 
@@ -21,6 +20,54 @@ class CustomHelpFormatter(argparse.HelpFormatter):
         return ", ".join(action.option_strings) + " " + args_string
 
 
+SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(text: str) -> int:
+    """Parse a size in bytes like '512', '64K', '1.5G' or '2GB'."""
+    value = text.strip().upper().removesuffix("B")
+    try:
+        if value[-1:] in SIZE_UNITS:
+            return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Niepoprawny rozmiar: '{text}'")
+
+
+TIME_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_time(text: str) -> float:
+    """Parse a time in seconds like '90', '90m' or '8h'."""
+    value = text.strip().lower()
+    try:
+        if value[-1:] in TIME_UNITS:
+            return float(value[:-1]) * TIME_UNITS[value[-1]]
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Niepoprawny czas: '{text}'")
+
+
+def parse_threads(text: str) -> int | str:
+    if text == "auto":
+        return text
+    try:
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Niepoprawna liczba wątków: '{text}'"
+        )
+
+
+def parse_sink(text: str) -> str:
+    if text == "-" or (text.startswith(("fifo:", "s3://")) and text[5:]):
+        return text
+    raise argparse.ArgumentTypeError(
+        f"Niepoprawne wyjście: '{text}'; podaj '-', 'fifo:PATH' lub"
+        " 's3://BUCKET/PREFIX'"
+    )
+
+
 def parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
     def fmt(prog: str) -> CustomHelpFormatter:
         return CustomHelpFormatter(prog)
@@ -55,6 +102,18 @@ def parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
         type=str,
         help="Zaloguj się do konta",
     )
+    parser.add_argument(
+        "-a",
+        "--batch-file",
+        metavar="FILE",
+        dest="batch_file",
+        type=str,
+        help=(
+            "Pobierz też adresy z pliku, po jednym w linii, lub ze stdin dla"
+            " '-'; pobieranie rusza w trakcie czytania, a powtórzone filmy"
+            " są pomijane"
+        ),
+    )
     parser.add_argument(
         "-d",
         "--directory",
@@ -64,6 +123,20 @@ def parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
         default=".",
         help="Ustaw docelowy katalog (domyślnie '%(default)s')",
     )
+    parser.add_argument(
+        "--sink",
+        metavar="TARGET",
+        dest="sink",
+        type=parse_sink,
+        help=(
+            "Zamiast do plików w katalogu przesyłaj filmy od razu: '-' na"
+            " stdout lub 'fifo:PATH' do potoku nazwanego (filmy jeden po"
+            " drugim, w jednym wątku), albo 's3://BUCKET/PREFIX' do magazynu"
+            " S3 (klucze w zmiennych"
+            " AWS_ACCESS_KEY_ID i AWS_SECRET_ACCESS_KEY, inny serwer niż"
+            " AWS w AWS_ENDPOINT_URL)"
+        ),
+    )
     parser.add_argument(
         "-R",
         "--resolutions",
@@ -91,22 +164,333 @@ def parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
         "--threads",
         metavar="N",
         dest="nthreads",
-        type=int,
+        type=parse_threads,
         default=3,
-        help="Ustaw liczbę wątków (domyślnie %(default)s)",
+        help=(
+            "Ustaw liczbę wątków lub 'auto', aby dobierać ją w trakcie"
+            " pobierania według przepustowości (domyślnie %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--min-threads",
+        metavar="N",
+        dest="min_threads",
+        type=int,
+        default=1,
+        help="Najmniejsza liczba wątków przy -t auto (domyślnie %(default)s)",
+    )
+    parser.add_argument(
+        "--max-threads",
+        metavar="N",
+        dest="max_threads",
+        type=int,
+        default=16,
+        help="Największa liczba wątków przy -t auto (domyślnie %(default)s)",
+    )
+    parser.add_argument(
+        "--list-only",
+        dest="list_only",
+        action="store_true",
+        help=(
+            "Nie pobieraj; wypisz znalezione filmy jako JSON, po jednym w"
+            " linii (z -R także ich rozdzielczości)"
+        ),
+    )
+    parser.add_argument(
+        "--crawl-threads",
+        metavar="N",
+        dest="crawl_threads",
+        type=int,
+        default=8,
+        help=(
+            "Liczba równoczesnych zapytań o strony folderów i filmów przy"
+            " --list-only (domyślnie %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--dedupe",
+        metavar="MODE",
+        dest="dedupe",
+        choices=("hardlink", "reflink", "symlink"),
+        help=(
+            "Nie pobieraj ponownie tego samego filmu z innego folderu, tylko"
+            " utwórz link do pobranej kopii: 'hardlink', 'reflink' lub"
+            " 'symlink'"
+        ),
+    )
+    parser.add_argument(
+        "--dedupe-index",
+        metavar="FILE",
+        dest="dedupe_index",
+        type=str,
+        help=(
+            "Zapamiętaj pobrane kopie w pliku, aby łączyć je także w kolejnych"
+            " uruchomieniach (domyślnie z --dedupe hardlink)"
+        ),
+    )
+    parser.add_argument(
+        "--checksum",
+        metavar="ALGO",
+        dest="checksum",
+        choices=("sha256", "blake2b", "crc32"),
+        help=(
+            "Licz sumę kontrolną pobieranych plików ('sha256', 'blake2b' lub"
+            " szybsze 'crc32') i zapisuj je w pliku .cda-dl-manifest.json"
+            " w katalogu"
+        ),
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help=(
+            "Nie pobieraj; sprawdź budowę plików MP4 w katalogu docelowym i"
+            " sumy kontrolne z manifestów, pomijając pliki niezmienione od"
+            " zapisu"
+        ),
+    )
+    parser.add_argument(
+        "--budget",
+        metavar="SIZE",
+        dest="budget",
+        type=parse_size,
+        help=(
+            "Dobieraj jakość filmów tak, aby razem zajęły najwyżej SIZE,"
+            " np. 50G; z -r jako najwyższą jakością. Filmy folderu liczą"
+            " się dopiero po jego wylistowaniu, więc wcześniejsze foldery"
+            " mogą zająć większą część SIZE"
+        ),
+    )
+    parser.add_argument(
+        "--deadline",
+        metavar="TIME",
+        dest="deadline",
+        type=parse_time,
+        help=(
+            "Dobieraj jakość filmów według zmierzonej prędkości tak, aby"
+            " pobieranie skończyło się w czasie TIME, np. 90m lub 8h;"
+            " filmy folderów liczą się jak przy --budget"
+        ),
+    )
+    parser.add_argument(
+        "--order",
+        metavar="ORDER",
+        dest="order",
+        choices=("input", "shortest", "longest", "interleave"),
+        default="input",
+        help=(
+            "Kolejność pobierania filmów według długości: 'input' (jak"
+            " podano), 'shortest' (najwięcej gotowych filmów od razu),"
+            " 'longest' (najkrótszy czas całości) lub 'interleave'"
+            " (domyślnie %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--min-speed",
+        metavar="SIZE",
+        dest="min_speed",
+        type=parse_size,
+        default="0",
+        help=(
+            "Wznów z nowym linkiem strumień wolniejszy niż SIZE na sekundę,"
+            " np. 100K; 0 wyłącza (domyślnie %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--slow-grace",
+        metavar="SECONDS",
+        dest="slow_grace",
+        type=float,
+        default=30,
+        help=(
+            "Jak długo strumień może być wolniejszy niż --min-speed"
+            " (domyślnie %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--min-free",
+        metavar="SIZE",
+        dest="min_free",
+        type=parse_size,
+        default="0",
+        help=(
+            "Ile miejsca zostawić wolnego na dysku, np. 500M lub 2G;"
+            " pobieranie filmu, który się nie zmieści, czeka na zakończenie"
+            " innych"
+            " (domyślnie %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--link-ttl",
+        metavar="SECONDS",
+        dest="link_ttl",
+        type=int,
+        default=3600,
+        help=(
+            "Jak długo przechowywać linki do plików, jeśli link nie podaje"
+            " czasu ważności; 0 wyłącza pamięć linków (domyślnie %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--output",
+        metavar="MODE",
+        dest="output",
+        choices=("rich", "jsonl"),
+        default="rich",
+        help=(
+            "Format wyjścia: 'rich' (interfejs w terminalu) lub 'jsonl'"
+            " (zdarzenia JSON, po jednym w linii) (domyślnie '%(default)s')"
+        ),
+    )
+    parser.add_argument(
+        "--output-file",
+        metavar="FILE",
+        dest="output_file",
+        type=str,
+        help="Zapisuj zdarzenia trybu 'jsonl' do pliku zamiast na stdout",
+    )
+    parser.add_argument(
+        "--report",
+        metavar="FILE",
+        dest="report",
+        type=str,
+        help="Zapisz raport z pobierania (czasy etapów, bajty) do pliku JSON",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        dest="metrics",
+        type=str,
+        help="Zapisz metryki w formacie Prometheus textfile do pliku",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        dest="profile",
+        type=str,
+        help=(
+            "Zapisz profil CPU, czasy etapów i zablokowania pętli zdarzeń do"
+            " katalogu"
+        ),
+    )
+    parser.add_argument(
+        "--stall-threshold",
+        metavar="MS",
+        dest="stall_threshold",
+        type=float,
+        default=100,
+        help=(
+            "Zgłaszaj zablokowania pętli zdarzeń dłuższe niż MS milisekund"
+            " (z --profile, domyślnie %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help=(
+            "Synchronizuj foldery przyrostowo: zapamiętaj ich zawartość i przy"
+            " kolejnym uruchomieniu pobierz tylko nowe filmy"
+        ),
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="SECONDS",
+        dest="watch",
+        type=float,
+        help=(
+            "Po pobraniu obserwuj foldery i pobieraj nowe filmy, sprawdzając"
+            " je co SECONDS sekund (rzadziej, gdy folder się nie zmienia);"
+            " włącza --sync"
+        ),
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        dest="journal",
+        type=str,
+        help=(
+            "Zapisuj postęp zadania do dziennika, z którego można je wznowić"
+            " opcją --resume-job"
+        ),
+    )
+    parser.add_argument(
+        "--resume-job",
+        metavar="FILE",
+        dest="resume_job",
+        type=str,
+        help=(
+            "Wznów zadanie z dziennika: pobierz brakujące filmy bez ponownego"
+            " przeglądania folderów"
+        ),
+    )
+    parser.add_argument(
+        "--queue",
+        metavar="FILE",
+        dest="queue",
+        type=str,
+        help=(
+            "Pracuj jako jeden z wielu procesów lub hostów ze wspólną kolejką"
+            " zadań w pliku SQLite (np. na NFS): podane adresy trafiają do"
+            " kolejki, foldery rozbijane są na filmy, a każdy film pobiera"
+            " tylko jeden proces; katalogi są względne wobec -d"
+        ),
+    )
+    parser.add_argument(
+        "--lease",
+        metavar="SECONDS",
+        dest="lease",
+        type=parse_time,
+        default=60.0,
+        help=(
+            "Czas dzierżawy zadania z --queue, odnawianej w trakcie pracy;"
+            " zadanie procesu, który padł, przejmuje inny po jej upływie"
+            " (domyślnie %(default)s)"
+        ),
     )
     parser.add_argument(
         "urls",
         metavar="URL",
         type=str,
-        nargs="+",
+        nargs="*",
         help="URL(y) do filmu(ów)/folder(ów) do pobrania",
     )
-    return parser.parse_args(argv)
+    args = parser.parse_args(argv)
+    if (
+        not args.urls
+        and args.batch_file is None
+        and args.resume_job is None
+        and args.queue is None
+        and not args.verify
+    ):
+        parser.error("podaj URL, -a FILE, --queue FILE lub --resume-job FILE")
+    if args.queue is not None and (
+        args.resume_job is not None
+        or args.journal is not None
+        or args.watch is not None
+        or args.sync
+        or args.list_only
+        or args.list_resolutions
+    ):
+        parser.error(
+            "--queue nie działa z --journal, --resume-job, --sync, --watch,"
+            " --list-only i -R"
+        )
+    if args.lease <= 0:
+        parser.error("--lease musi być większe od 0")
+    if args.sink is not None and (
+        args.dedupe is not None
+        or args.dedupe_index is not None
+        or args.checksum is not None
+    ):
+        parser.error("--sink nie działa z --dedupe i --checksum")
+    return args
 
 
 def main(argv: Sequence[str] | None = None) -> int:
     args = parse_args(argv)
+    # Imported lazily, so that '--help' or '--version' do not pay for
+    # aiohttp, bs4 and rich.
+    from cda_dl.downloader import Downloader
+
     Downloader(args)
     return 0
 
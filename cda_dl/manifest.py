@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Protocol
+
+from cda_dl.metrics import DelayedWriter
+
+LOGGER = logging.getLogger(__name__)
+
+HASH_ALGORITHMS = ("sha256", "blake2b", "crc32")
+BLOCK_SIZE = 1024 * 1024
+
+
+class Hasher(Protocol):
+    def update(self, data: bytes, /) -> None:
+        """Feed the data to the hash."""
+
+    def hexdigest(self) -> str:
+        """Get the hash of the data so far as a hex string."""
+
+
+class Crc32:
+    """CRC-32 with the interface of hashlib, for when speed matters more
+    than collision resistance."""
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def update(self, data: bytes, /) -> None:
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+
+def new_hasher(algorithm: str) -> Hasher:
+    if algorithm == "crc32":
+        return Crc32()
+    return hashlib.new(algorithm)
+
+
+def hash_file(path: Path, algorithm: str) -> str:
+    """Hash the whole file. hashlib and zlib release the GIL on large
+    blocks, so files can be hashed in parallel threads."""
+    hasher = new_hasher(algorithm)
+    with open(path, "rb") as f:
+        while block := f.read(BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class Manifests:
+    """Checksums of the downloaded files, computed while streaming and
+    kept in a manifest file in every directory:
+        {filename: {"algorithm", "hash", "size", "mtime_ns"}, ...}
+    The size and mtime tell if the file changed since it was hashed. The
+    changed manifests are written every few seconds and on close(), so a
+    tree of many files is not rewritten after every one."""
+
+    FILENAME = ".cda-dl-manifest.json"
+
+    def __init__(self, algorithm: str = "sha256") -> None:
+        self.algorithm = algorithm
+        self.directories: dict[Path, dict[str, dict[str, Any]]] = {}
+        self.changed: set[Path] = set()
+        self.writer = DelayedWriter(self.take_changed, indent=1)
+
+    def load(self, directory: Path) -> dict[str, dict[str, Any]]:
+        if directory not in self.directories:
+            entries: dict[str, dict[str, Any]] = {}
+            path = directory / self.FILENAME
+            try:
+                entries = json.loads(path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                pass
+            except (ValueError, OSError) as e:
+                LOGGER.debug(f"Pomijam uszkodzony plik {path}: {e}")
+            self.directories[directory] = entries
+        return self.directories[directory]
+
+    def take_changed(self) -> dict[Path, dict[str, dict[str, Any]]]:
+        files = {
+            directory / self.FILENAME: dict(self.load(directory))
+            for directory in self.changed
+        }
+        self.changed.clear()
+        return files
+
+    async def close(self) -> None:
+        await self.writer.close()
+
+    def get(self, path: Path) -> dict[str, Any] | None:
+        return self.load(path.parent).get(path.name)
+
+    def put(self, path: Path, algorithm: str, digest: str) -> None:
+        stat = path.stat()
+        self.load(path.parent)[path.name] = {
+            "algorithm": algorithm,
+            "hash": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        self.changed.add(path.parent)
+        self.writer.touch()
+
+
+def is_unchanged(path: Path, entry: dict[str, Any]) -> bool:
+    try:
+        stat = path.stat()
+    except OSError:
+        return False
+    return bool(
+        stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+    )
+
+
+class VerifyResult:
+    def __init__(self) -> None:
+        self.ok = 0
+        self.unchanged = 0
+        self.bad: list[tuple[Path, str]] = []
+
+
+def verify_tree(directory: Path, nthreads: int = 4) -> VerifyResult:
+    """Check the files in all manifests under the directory. Files with
+    the size and mtime from the manifest are not read again; the others
+    are hashed in a pool of threads and compared with the manifest."""
+    result = VerifyResult()
+    manifests = Manifests()
+    jobs: list[tuple[Path, dict[str, Any]]] = []
+    for manifest_path in sorted(directory.rglob(Manifests.FILENAME)):
+        for name, entry in manifests.load(manifest_path.parent).items():
+            path = manifest_path.parent / name
+            if is_unchanged(path, entry):
+                result.unchanged += 1
+            elif not path.exists():
+                result.bad.append((path, "brak pliku"))
+            else:
+                jobs.append((path, entry))
+
+    def check(job: tuple[Path, dict[str, Any]]) -> str | OSError:
+        try:
+            return hash_file(job[0], job[1]["algorithm"])
+        except OSError as e:
+            return e
+
+    with ThreadPoolExecutor(max(nthreads, 1)) as pool:
+        for (path, entry), digest in zip(jobs, pool.map(check, jobs)):
+            if isinstance(digest, OSError):
+                result.bad.append((path, str(digest)))
+            elif digest != entry["hash"]:
+                result.bad.append((path, "niezgodna suma kontrolna"))
+            else:
+                # Only the mtime moved; remember it, so the file is not
+                # read again next time.
+                result.ok += 1
+                manifests.put(path, entry["algorithm"], digest)
+    manifests.writer.flush()
+    return result
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterator
+
+if TYPE_CHECKING:
+    from cda_dl.download_state import DownloadState
+
+LOGGER = logging.getLogger(__name__)
+
+# Phases timed for every Video, in the order they happen.
+PHASES = (
+    "page_fetch",
+    "parse",
+    "rpc",
+    "ttfb",
+    "stream",
+    "disk_write",
+    "upload",
+    "hash",
+)
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Metrics of the Video handled by the current task. Every Video is
+# downloaded in its own task, so retries deep inside utils can be
+# attributed to it without passing the metrics object around.
+CURRENT_METRICS: ContextVar[VideoMetrics | None] = ContextVar(
+    "CURRENT_METRICS", default=None
+)
+
+
+class VideoMetrics:
+    __slots__ = (
+        "url",
+        "title",
+        "resolution",
+        "status",
+        "reason",
+        "phases",
+        "bytes",
+        "retries",
+        "rate_limited",
+        "slow_restarts",
+    )
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.title: str | None = None
+        self.resolution: str | None = None
+        self.status: str | None = None
+        self.reason: str | None = None
+        self.phases: dict[str, float] = {}
+        self.bytes = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.slow_restarts = 0
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        """Add the wall time spent in the block to the phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def finish(self, status: str, reason: str | None = None) -> None:
+        self.status = status
+        self.reason = reason
+
+    @property
+    def throughput(self) -> float | None:
+        """Stream throughput in bytes per second."""
+        elapsed = self.phases.get("stream")
+        if not elapsed or not self.bytes:
+            return None
+        return self.bytes / elapsed
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "url": self.url,
+            "title": self.title,
+            "resolution": self.resolution,
+            "status": self.status,
+            "reason": self.reason,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "slow_restarts": self.slow_restarts,
+            "throughput": self.throughput,
+            "phases": self.phases,
+        }
+
+
+def record_retry(*_: Any) -> None:
+    """tenacity 'before_sleep' hook counting retries of the current Video."""
+    metrics = CURRENT_METRICS.get()
+    if metrics is not None:
+        metrics.retries += 1
+
+
+def quantile(values: list[float], q: float) -> float:
+    """Nearest-rank quantile of the values."""
+    ordered = sorted(values)
+    rank = max(math.ceil(q * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"count": 0, "sum": 0.0}
+    summary = {"count": len(values), "sum": sum(values), "max": max(values)}
+    for q in QUANTILES:
+        summary[f"p{round(q * 100)}"] = quantile(values, q)
+    return summary
+
+
+def build_report(download_state: DownloadState) -> dict[str, Any]:
+    """Aggregate the per-Video metrics of the run into a report."""
+    videos = download_state.videos
+    finished = download_state.finished or time.time()
+    phases = {
+        phase: summarize(
+            [v.phases[phase] for v in videos if phase in v.phases]
+        )
+        for phase in PHASES
+    }
+    throughputs = [t for v in videos if (t := v.throughput) is not None]
+    return {
+        "started": download_state.started,
+        "finished": finished,
+        "duration": finished - download_state.started,
+        "completed": download_state.completed,
+        "skipped": download_state.skipped,
+        "linked": download_state.linked,
+        "failed": download_state.failed,
+        "bytes": sum(v.bytes for v in videos),
+        "retries": sum(v.retries for v in videos),
+        "rate_limited": sum(v.rate_limited for v in videos),
+        "slow_restarts": sum(v.slow_restarts for v in videos),
+        "phases": phases,
+        "throughput": summarize(throughputs),
+        "videos": [v.to_dict() for v in videos],
+    }
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Write the file via rename, so readers never see a partial file."""
+    tmp_path = path.parent / f".{path.name}.tmp"
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+class DelayedWriter:
+    """Write JSON files at most every 'interval' seconds, in a thread,
+    instead of on every change; close() writes what is left. 'snapshot'
+    is called on the event loop and returns copies of the changed files
+    by path, which are serialized and written off the loop; a file
+    whose copy is None is deleted."""
+
+    def __init__(
+        self,
+        snapshot: Callable[[], dict[Path, Any]],
+        indent: int | None = None,
+        interval: float = 5.0,
+    ) -> None:
+        self.snapshot = snapshot
+        self.indent = indent
+        self.interval = interval
+        self.waiting: asyncio.Task[None] | None = None
+        # One write at a time, so a later snapshot is written last.
+        self.lock = asyncio.Lock()
+
+    def touch(self) -> None:
+        """Note a change. Without a running event loop nothing is written
+        until flush()."""
+        if self.waiting is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.waiting = loop.create_task(self.write_later())
+
+    async def write_later(self) -> None:
+        await asyncio.sleep(self.interval)
+        self.waiting = None
+        await self.write()
+
+    async def write(self) -> None:
+        async with self.lock:
+            files = self.snapshot()
+            if files:
+                await asyncio.to_thread(self.write_files, files)
+
+    def write_files(self, files: dict[Path, Any]) -> None:
+        for path, data in files.items():
+            try:
+                if data is None:
+                    path.unlink(missing_ok=True)
+                    continue
+                path.parent.mkdir(parents=True, exist_ok=True)
+                write_atomic(
+                    path,
+                    json.dumps(data, ensure_ascii=False, indent=self.indent),
+                )
+            except OSError as e:
+                LOGGER.warning(f"Nie udało się zapisać {path}: {e}")
+
+    async def close(self) -> None:
+        if self.waiting is not None:
+            self.waiting.cancel()
+            self.waiting = None
+        await self.write()
+
+    def flush(self) -> None:
+        """Write the changes now, outside of an event loop."""
+        self.write_files(self.snapshot())
+
+
+def write_json_report(report: dict[str, Any], path: Path) -> None:
+    write_atomic(path, json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def format_summary(
+    name: str, summary: dict[str, float], labels: str = ""
+) -> list[str]:
+    """Render the samples of a Prometheus summary."""
+    sep = "," if labels else ""
+    lines = []
+    for q in QUANTILES:
+        key = f"p{round(q * 100)}"
+        if key in summary:
+            lines.append(
+                f'{name}{{{labels}{sep}quantile="{q}"}} {summary[key]}'
+            )
+    wrapped = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{wrapped} {summary['sum']}")
+    lines.append(f"{name}_count{wrapped} {summary['count']}")
+    return lines
+
+
+def format_prometheus(report: dict[str, Any]) -> str:
+    """Render the report in the Prometheus text exposition format."""
+    lines = [
+        "# HELP cda_dl_videos Videos processed in the run by status.",
+        "# TYPE cda_dl_videos gauge",
+    ]
+    for status in ("completed", "skipped", "linked", "failed"):
+        lines.append(f'cda_dl_videos{{status="{status}"}} {report[status]}')
+    for key, help in (
+        ("bytes", "Bytes downloaded in the run."),
+        ("retries", "HTTP requests retried in the run."),
+        ("rate_limited", "HTTP 429 responses received in the run."),
+        ("slow_restarts", "Too slow streams restarted in the run."),
+        ("duration", "Wall time of the run in seconds."),
+    ):
+        name = f"cda_dl_run_{key}"
+        lines += [
+            f"# HELP {name} {help}",
+            f"# TYPE {name} gauge",
+            f"{name} {report[key]}",
+        ]
+    lines += [
+        "# HELP cda_dl_phase_seconds Wall time of a Video phase.",
+        "# TYPE cda_dl_phase_seconds summary",
+    ]
+    for phase, summary in report["phases"].items():
+        lines += format_summary(
+            "cda_dl_phase_seconds", summary, f'phase="{phase}"'
+        )
+    lines += [
+        "# HELP cda_dl_stream_throughput_bytes Stream throughput of a Video"
+        " in bytes per second.",
+        "# TYPE cda_dl_stream_throughput_bytes summary",
+    ]
+    lines += format_summary(
+        "cda_dl_stream_throughput_bytes", report["throughput"]
+    )
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(report: dict[str, Any], path: Path) -> None:
+    write_atomic(path, format_prometheus(report))
@@ -0,0 +1,33 @@
+from typing import Callable, Sequence, TypeVar
+
+T = TypeVar("T")
+
+ORDERS = ("input", "shortest", "longest", "interleave")
+
+
+def order_jobs(
+    jobs: Sequence[T], weight: Callable[[T], float | None], order: str
+) -> list[T]:
+    """Order the jobs by their weight, e.g. the duration of the videos.
+
+    'shortest' finishes the most videos early, 'longest' keeps a long
+    video from starting last and stretching the whole run, 'interleave'
+    alternates the longest and the shortest of the rest, so long videos
+    start early while short ones keep finishing. Jobs with an unknown
+    weight go last, in the input order; so do ties."""
+    if order == "input":
+        return list(jobs)
+    known = [job for job in jobs if weight(job) is not None]
+    unknown = [job for job in jobs if weight(job) is None]
+    known.sort(key=lambda job: weight(job) or 0, reverse=order != "shortest")
+    if order == "interleave":
+        interleaved = []
+        first, last = 0, len(known) - 1
+        while first <= last:
+            interleaved.append(known[first])
+            if first != last:
+                interleaved.append(known[last])
+            first += 1
+            last -= 1
+        known = interleaved
+    return known + unknown
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import functools
+import json
+import logging
+import pstats
+import time
+from pathlib import Path
+from typing import Any, Callable, Coroutine, ParamSpec, TypeVar
+
+LOGGER = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# Wall times of the coroutines decorated with @timed, by qualified name.
+# None while no Profiler is running, which keeps @timed almost free.
+WALL_TIMES: dict[str, list[float]] | None = None
+
+
+def timed(
+    func: Callable[P, Coroutine[Any, Any, T]],
+) -> Callable[P, Coroutine[Any, Any, T]]:
+    """Record the wall time of every call of the coroutine function,
+    including the time it spends awaiting, while a Profiler is running."""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        if WALL_TIMES is None:
+            return await func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            WALL_TIMES.setdefault(name, []).append(time.perf_counter() - start)
+
+    return wrapper
+
+
+class StallHandler(logging.Handler):
+    """Collect the slow callback warnings of asyncio debug mode. They name
+    the task and the coroutine that blocked the event loop."""
+
+    def __init__(self) -> None:
+        super().__init__(logging.WARNING)
+        self.messages: list[tuple[float, str]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.messages.append((record.created, message))
+
+
+class Profiler:
+    """Run a coroutine under cProfile, record the wall time of the @timed
+    coroutines and sample the event loop lag. Every lag above
+    'stall_threshold' seconds is logged with the coroutine that caused it.
+
+    Results are written to the directory:
+        profile.pstats   cProfile data, e.g. for 'python -m pstats'
+        profile.txt      the slowest functions by cumulative time
+        coroutines.json  wall time of the Video and Folder phases
+        stalls.jsonl     event loop stalls, one JSON object per line
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        stall_threshold: float = 0.1,
+        interval: float = 0.05,
+    ) -> None:
+        self.directory = directory
+        self.stall_threshold = stall_threshold
+        self.interval = interval
+        self.stalls: list[dict[str, Any]] = []
+        self.handler = StallHandler()
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        global WALL_TIMES
+        WALL_TIMES = {}
+        asyncio_logger = logging.getLogger("asyncio")
+        asyncio_logger.addHandler(self.handler)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return asyncio.run(self.main(coro), debug=True)
+        finally:
+            profile.disable()
+            asyncio_logger.removeHandler(self.handler)
+            self.write(profile, WALL_TIMES)
+            WALL_TIMES = None
+
+    async def main(self, coro: Coroutine[Any, Any, T]) -> T:
+        loop = asyncio.get_running_loop()
+        loop.slow_callback_duration = self.stall_threshold
+        sampler = asyncio.create_task(self.sample_lag())
+        try:
+            return await coro
+        finally:
+            sampler.cancel()
+
+    async def sample_lag(self) -> None:
+        """Measure how late the event loop wakes up a sleeping task."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            if lag > self.stall_threshold:
+                self.record_stall(lag)
+
+    def record_stall(self, lag: float) -> None:
+        now = time.time()
+        culprits = [
+            message
+            for created, message in self.handler.messages
+            if created >= now - lag - self.interval
+        ]
+        self.stalls.append(
+            {"ts": round(now, 3), "lag": lag, "culprits": culprits}
+        )
+        LOGGER.warning(
+            f"Pętla zdarzeń zablokowana na {lag * 1000:.0f} ms:"
+            f" {'; '.join(culprits) or 'nieznana przyczyna'}"
+        )
+
+    def write(
+        self, profile: cProfile.Profile, wall_times: dict[str, list[float]]
+    ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(self.directory / "profile.pstats")
+        with open(self.directory / "profile.txt", "w") as f:
+            stats = pstats.Stats(profile, stream=f)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+        coroutines = {
+            name: {
+                "calls": len(times),
+                "total": sum(times),
+                "mean": sum(times) / len(times),
+                "max": max(times),
+            }
+            for name, times in sorted(
+                wall_times.items(), key=lambda item: -sum(item[1])
+            )
+        }
+        with open(self.directory / "coroutines.json", "w") as f:
+            json.dump(coroutines, f, indent=2)
+        with open(self.directory / "stalls.jsonl", "w") as f:
+            for stall in self.stalls:
+                f.write(json.dumps(stall, ensure_ascii=False) + "\n")
@@ -0,0 +1,142 @@
+import logging
+import math
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# Bytes per second of a 1080p video, until downloads of the run tell
+# better; other qualities scale with the number of pixels.
+FULL_HD_BITRATE = 500 * 1024
+
+
+def get_height(resolution: str) -> int | None:
+    if resolution.endswith("p") and resolution[:-1].isdigit():
+        return int(resolution[:-1])
+    return None
+
+
+def get_default_bitrate(height: int) -> float:
+    return FULL_HD_BITRATE * (height / 1080) ** 2
+
+
+def get_ladder(resolutions: list[str], preferred: str) -> list[str]:
+    """Order the available resolutions from the preferred one down, then
+    up from above it; resolutions that are not numbers, like 'aut', come
+    last. 'najlepsza' prefers the highest resolution."""
+    numeric = sorted(
+        (r for r in resolutions if get_height(r) is not None),
+        key=lambda r: get_height(r) or 0,
+        reverse=True,
+    )
+    limit = get_height(preferred)
+    if limit is None:
+        lower, higher = numeric, []
+    else:
+        lower = [r for r in numeric if (get_height(r) or 0) <= limit]
+        higher = [r for r in reversed(numeric) if r not in lower]
+    rest = [r for r in resolutions if get_height(r) is None]
+    return lower + higher + rest
+
+
+class QualityPolicy:
+    """Choose the quality of every Video so that the batch fits into a
+    byte budget and/or finishes before a deadline.
+
+    The bytes left, by the budget or by the measured throughput until the
+    deadline, are shared equally by the Videos that did not start yet;
+    every Video gets the best quality on the ladder from the requested
+    resolution down whose estimated size fits its share. The size is the
+    duration times the bitrate of the quality, learned from the Videos
+    started so far. Without a measured throughput yet, the deadline
+    does not limit the quality."""
+
+    def __init__(
+        self, budget: int | None = None, deadline: float | None = None
+    ) -> None:
+        self.budget = budget
+        self.started = time.monotonic()
+        self.deadline = None if deadline is None else self.started + deadline
+        self.bitrates: dict[str, float] = {}
+        self.scale = 1.0
+        self.waiting = 0
+        self.committed = 0
+        self.downloaded = 0
+
+    def queue(self, count: int) -> None:
+        """Count Videos that are going to choose a quality."""
+        self.waiting += count
+
+    def unqueue(self) -> None:
+        """Forget a queued Video that started or finished."""
+        self.waiting = max(self.waiting - 1, 0)
+
+    def get_available(self) -> float:
+        """Get the bytes that the Videos which did not start yet may
+        take together."""
+        available = math.inf
+        if self.budget is not None:
+            available = self.budget - self.committed
+        now = time.monotonic()
+        elapsed = now - self.started
+        if self.deadline is not None and self.downloaded and elapsed > 0:
+            throughput = self.downloaded / elapsed
+            in_flight = self.committed - self.downloaded
+            available = min(
+                available, throughput * (self.deadline - now) - in_flight
+            )
+        return available
+
+    def estimate(self, resolution: str, duration: int) -> float | None:
+        bitrate = self.bitrates.get(resolution)
+        height = get_height(resolution)
+        if bitrate is None and height is not None:
+            bitrate = self.scale * get_default_bitrate(height)
+        return None if bitrate is None else bitrate * duration
+
+    def choose(
+        self, resolutions: list[str], duration: int | None, preferred: str
+    ) -> str:
+        """Choose the resolution for a Video that is about to start."""
+        ladder = get_ladder(resolutions, preferred)
+        share = self.get_available() / max(self.waiting, 1)
+        if duration is None or share == math.inf:
+            return ladder[0]
+        fitting = [
+            r
+            for r in ladder
+            if (size := self.estimate(r, duration)) is not None
+            and size <= share
+            and (get_height(r) or 0) <= (get_height(ladder[0]) or 0)
+        ]
+        if fitting:
+            choice = fitting[0]
+        else:
+            numeric = [r for r in ladder if get_height(r) is not None]
+            choice = ladder[0]
+            if numeric:
+                choice = min(numeric, key=lambda r: get_height(r) or 0)
+        if choice != ladder[0]:
+            LOGGER.info(
+                f"Wybieram {choice} zamiast {ladder[0]}; na film zostało"
+                f" {max(share, 0) / 1024**2:.1f} MiB."
+            )
+        return choice
+
+    def commit(
+        self,
+        resolution: str,
+        duration: int | None,
+        size: int,
+        remaining: int,
+    ) -> None:
+        """Account the remaining bytes of a Video that started streaming,
+        and learn the bitrate of its quality from the full size."""
+        self.unqueue()
+        self.committed += remaining
+        height = get_height(resolution)
+        if duration and height is not None:
+            self.bitrates[resolution] = size / duration
+            # The other qualities are likely off by the same factor.
+            self.scale = self.bitrates[resolution] / get_default_bitrate(
+                height
+            )
@@ -0,0 +1,146 @@
+import asyncio
+import itertools
+import logging
+from typing import Any
+
+import aiohttp
+
+from cda_dl.error import ParserError
+from cda_dl.utils import post_request
+
+LOGGER = logging.getLogger(__name__)
+
+# Page url, JSON-RPC call and the future waiting for the file link.
+PendingCall = tuple[str, dict[str, Any], "asyncio.Future[str]"]
+
+
+class LinkResolver:
+    """Resolve the direct file links of many Videos with few requests.
+
+    videoGetLink calls made within 'window' seconds of each other are sent
+    as one JSON-RPC batch array. If the endpoint turns out not to accept
+    batches, answering them with an error, an HTML page or a single
+    object, the calls are sent again, and every later call is sent, on
+    its own, concurrently, over the connections kept alive by the
+    session."""
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        window: float = 0.05,
+        max_batch: int = 50,
+    ) -> None:
+        self.session = session
+        self.window = window
+        self.max_batch = max_batch
+        self.batch_supported: bool | None = None
+        self.pending: list[PendingCall] = []
+        self.timer: asyncio.TimerHandle | None = None
+        self.ids = itertools.count(1)
+        self.tasks: set[asyncio.Task[None]] = set()
+        self.headers = {
+            "Content-Type": "application/json",
+            "X-Requested-With": "XMLHttpRequest",
+        }
+
+    async def resolve(self, url: str, params: list[Any]) -> str:
+        """Call videoGetLink with the params on the Video page url."""
+        call = {
+            "id": next(self.ids),
+            "jsonrpc": "2.0",
+            "method": "videoGetLink",
+            "params": params,
+        }
+        if self.batch_supported is False:
+            return await self.call_single(url, call)
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[str] = loop.create_future()
+        self.pending.append((url, call, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        """Send all pending calls in the background."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.create_task(self.send(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def send(self, batch: list[PendingCall]) -> None:
+        results: list[str | BaseException]
+        try:
+            if len(batch) == 1 or self.batch_supported is False:
+                results = await self.call_each(batch)
+            else:
+                try:
+                    results = await self.call_batch(batch)
+                except Exception as e:
+                    LOGGER.debug(
+                        f"videoGetLink nie obsługuje zapytań wsadowych ({e}),"
+                        " wysyłam pojedynczo."
+                    )
+                    self.batch_supported = False
+                    results = await self.call_each(batch)
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def call_single(self, url: str, call: dict[str, Any]) -> str:
+        response = await post_request(url, self.session, call, self.headers)
+        try:
+            data = await response.json()
+        except (aiohttp.ContentTypeError, ValueError):
+            # An HTML page instead of JSON fails the Video, not the run.
+            data = None
+        return get_link(url, data)
+
+    async def call_each(
+        self, batch: list[PendingCall]
+    ) -> list[str | BaseException]:
+        """Send the calls of the batch on their own, concurrently."""
+        return await asyncio.gather(
+            *(self.call_single(url, call) for url, call, _ in batch),
+            return_exceptions=True,
+        )
+
+    async def call_batch(
+        self, batch: list[PendingCall]
+    ) -> list[str | BaseException]:
+        url = batch[0][0]
+        calls = [call for _, call, _ in batch]
+        response = await post_request(url, self.session, calls, self.headers)
+        data = await response.json()
+        if not isinstance(data, list):
+            raise ParserError("Odpowiedź na zapytanie wsadowe nie jest listą.")
+        self.batch_supported = True
+        by_id = {item.get("id"): item for item in data}
+        results: list[str | BaseException] = []
+        for url, call, _ in batch:
+            try:
+                results.append(get_link(url, by_id.get(call["id"])))
+            except ParserError as e:
+                results.append(e)
+        return results
+
+
+def get_link(url: str, data: Any) -> str:
+    """Get the file link from a videoGetLink response."""
+    try:
+        return str(data["result"]["resp"])
+    except (KeyError, TypeError):
+        raise ParserError(
+            f"Error podczas parsowania 'videoGetLink' dla {url} Pomijam ..."
+        )
@@ -0,0 +1,274 @@
+import hashlib
+import hmac
+import os
+import re
+import time
+import urllib.parse
+from xml.etree import ElementTree
+
+import aiohttp
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_after_delay,
+    wait_fixed,
+)
+from yarl import URL
+
+from cda_dl.error import FlagError, HTTPError
+from cda_dl.metrics import record_retry
+from cda_dl.utils import is_transient
+
+# Every part but the last one must have at least 5 MiB.
+MIN_PART_SIZE = 5 * 1024**2
+PART_SIZE = 8 * 1024**2
+
+
+def quote(text: str, safe: str = "~") -> str:
+    return urllib.parse.quote(text, safe=safe)
+
+
+def hmac_sha256(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def get_signature(
+    method: str,
+    path: str,
+    query: dict[str, str],
+    headers: dict[str, str],
+    secret_key: str,
+    region: str,
+) -> tuple[str, str]:
+    """Sign a request with AWS Signature Version 4. 'path' is already
+    quoted, 'headers' are the signed headers, with 'x-amz-date' and
+    'x-amz-content-sha256' among them. Return the signature and the
+    names of the signed headers."""
+    canonical_query = "&".join(
+        f"{quote(key)}={quote(value)}" for key, value in sorted(query.items())
+    )
+    names = sorted(name.lower() for name in headers)
+    values = {name.lower(): value for name, value in headers.items()}
+    canonical_headers = "".join(
+        f"{name}:{' '.join(values[name].split())}\n" for name in names
+    )
+    signed_headers = ";".join(names)
+    canonical_request = "\n".join(
+        (
+            method,
+            path,
+            canonical_query,
+            canonical_headers,
+            signed_headers,
+            values["x-amz-content-sha256"],
+        )
+    )
+    amz_date = values["x-amz-date"]
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join(
+        (
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        )
+    )
+    key = f"AWS4{secret_key}".encode()
+    for part in (amz_date[:8], region, "s3", "aws4_request"):
+        key = hmac_sha256(key, part)
+    return hmac_sha256(key, string_to_sign).hex(), signed_headers
+
+
+class S3Bucket:
+    """A bucket of an S3-compatible object store, like AWS S3 or MinIO,
+    with the credentials to write to it."""
+
+    def __init__(
+        self,
+        name: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        endpoint: str | None = None,
+        session_token: str | None = None,
+        part_size: int = PART_SIZE,
+    ) -> None:
+        self.name = name
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.session_token = session_token
+        self.part_size = part_size
+        if endpoint is None:
+            self.base_url = f"https://{name}.s3.{region}.amazonaws.com"
+            self.base_path = ""
+        else:
+            # Other stores, like MinIO, address buckets by the path.
+            self.base_url = endpoint.rstrip("/")
+            self.base_path = f"/{quote(name)}"
+
+    @classmethod
+    def from_env(cls, name: str) -> "S3Bucket":
+        """Get the bucket with the credentials and the endpoint from the
+        usual AWS_* environment variables."""
+        access_key = os.environ.get("AWS_ACCESS_KEY_ID")
+        secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
+        if not access_key or not secret_key:
+            raise FlagError(
+                "Zapis do S3 wymaga zmiennych AWS_ACCESS_KEY_ID i"
+                " AWS_SECRET_ACCESS_KEY."
+            )
+        return cls(
+            name,
+            access_key,
+            secret_key,
+            os.environ.get("AWS_REGION")
+            or os.environ.get("AWS_DEFAULT_REGION")
+            or "us-east-1",
+            os.environ.get("AWS_ENDPOINT_URL"),
+            os.environ.get("AWS_SESSION_TOKEN"),
+        )
+
+    def get_headers(
+        self, method: str, path: str, query: dict[str, str], body: bytes
+    ) -> dict[str, str]:
+        """Get the headers that sign the request."""
+        url = urllib.parse.urlsplit(self.base_url)
+        headers = {
+            "Host": url.netloc,
+            "x-amz-content-sha256": hashlib.sha256(body).hexdigest(),
+            "x-amz-date": time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()),
+        }
+        if self.session_token is not None:
+            headers["x-amz-security-token"] = self.session_token
+        signature, signed_headers = get_signature(
+            method, path, query, headers, self.secret_key, self.region
+        )
+        scope = f"{headers['x-amz-date'][:8]}/{self.region}/s3/aws4_request"
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope},"
+            f" SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return headers
+
+    @retry(
+        retry=retry_if_exception(is_transient),
+        wait=wait_fixed(1),
+        stop=(stop_after_attempt(3) | stop_after_delay(30)),
+        before_sleep=record_retry,
+        reraise=True,
+    )
+    async def request(
+        self,
+        session: aiohttp.ClientSession,
+        method: str,
+        key: str,
+        query: dict[str, str],
+        body: bytes = b"",
+    ) -> aiohttp.ClientResponse:
+        """Send a signed request about the object 'key' of the bucket."""
+        path = f"{self.base_path}/{quote(key, safe='/~')}"
+        headers = self.get_headers(method, path, query, body)
+        url = self.base_url + path
+        if query:
+            url += "?" + "&".join(
+                f"{quote(k)}={quote(v)}" if v else quote(k)
+                for k, v in sorted(query.items())
+            )
+        try:
+            response = await session.request(
+                method, URL(url, encoded=True), headers=headers, data=body
+            )
+            if response.status >= 400:
+                message = get_error(await response.text())
+                raise HTTPError(
+                    f"S3 error [{response.status}]: {message}.",
+                    response.status,
+                )
+        except aiohttp.ClientResponseError as e:
+            raise HTTPError(f"S3 error [{e.status}]: {e.message}.", e.status)
+        return response
+
+
+def get_error(text: str) -> str:
+    """Get the message of an S3 error response."""
+    match = re.search(r"<Message>(.*?)</Message>", text, re.DOTALL)
+    return match.group(1) if match else text[:200]
+
+
+def find_text(xml: str, tag: str) -> str:
+    """Find the text of the first 'tag' in an S3 response, with or
+    without the S3 namespace."""
+    root = ElementTree.fromstring(xml)
+    for element in root.iter():
+        if element.tag.rpartition("}")[2] == tag and element.text:
+            return element.text
+    raise HTTPError(f"Brak {tag} w odpowiedzi S3.", 0)
+
+
+class S3Upload:
+    """A multipart upload of one object."""
+
+    upload_id: str
+
+    def __init__(
+        self, bucket: S3Bucket, session: aiohttp.ClientSession, key: str
+    ) -> None:
+        self.bucket = bucket
+        self.session = session
+        self.key = key
+
+    async def create(self) -> None:
+        response = await self.bucket.request(
+            self.session, "POST", self.key, {"uploads": ""}
+        )
+        self.upload_id = find_text(await response.text(), "UploadId")
+
+    async def upload_part(self, number: int, data: bytes) -> str:
+        """Upload a part and get its ETag."""
+        response = await self.bucket.request(
+            self.session,
+            "PUT",
+            self.key,
+            {"partNumber": str(number), "uploadId": self.upload_id},
+            data,
+        )
+        response.release()
+        return response.headers["ETag"]
+
+    async def complete(self, etags: list[str]) -> None:
+        parts = "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag>"
+            "</Part>"
+            for number, etag in enumerate(etags, 1)
+        )
+        body = (
+            f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>"
+        ).encode()
+        response = await self.bucket.request(
+            self.session,
+            "POST",
+            self.key,
+            {"uploadId": self.upload_id},
+            body,
+        )
+        # S3 may report an error with status 200 once it started answering.
+        text = await response.text()
+        if "<Error>" in text:
+            raise HTTPError(f"S3 error: {get_error(text)}.", 500)
+
+    async def abort(self) -> None:
+        response = await self.bucket.request(
+            self.session, "DELETE", self.key, {"uploadId": self.upload_id}
+        )
+        response.release()
+
+
+def parse_url(url: str) -> tuple[str, str]:
+    """Split 's3://bucket/prefix' into the bucket and the key prefix."""
+    parsed = urllib.parse.urlsplit(url)
+    prefix = parsed.path.lstrip("/")
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+    return parsed.netloc, prefix
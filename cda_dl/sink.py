@@ -0,0 +1,278 @@
+import asyncio
+import contextlib
+import os
+import stat
+import sys
+from pathlib import Path
+from typing import Any
+
+import aiofiles
+import aiohttp
+
+from cda_dl.disk import preallocate
+from cda_dl.error import BrokenFileError
+from cda_dl.mp4 import check_mp4
+from cda_dl.s3 import S3Bucket, S3Upload, parse_url
+
+
+def get_backup_filepath(filepath: Path) -> Path:
+    """Get where a broken file is kept while it is downloaded again."""
+    return filepath.parent / f"{filepath.name}.old"
+
+
+class Sink:
+    """Where the bytes of one Video go, in order. A Video that streams
+    again, after a dropped connection or with a new link, continues from
+    'position', the number of bytes the sink holds."""
+
+    # The phase of VideoMetrics that the writes are measured in.
+    phase = "disk_write"
+
+    @property
+    def position(self) -> int:
+        raise NotImplementedError
+
+    async def open(self, size: int) -> bool:
+        """Get ready for a stream of the file of 'size' bytes. Return True
+        if the space for the whole file is allocated on the disk."""
+        return False
+
+    async def write(self, chunk: bytes) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """The stream ended, maybe early."""
+
+    async def commit(self) -> None:
+        """The whole file is written."""
+
+    async def abort(self) -> None:
+        """The Video failed; nothing more is written."""
+
+
+class FileSink(Sink):
+    """Write to the .part file, and rename it once the file is complete
+    and valid, over the file it replaces. The .part file of a failed
+    Video is kept to resume."""
+
+    file: Any
+
+    def __init__(self, filepath: Path, partial_filepath: Path) -> None:
+        self.filepath = filepath
+        self.partial_filepath = partial_filepath
+        self.file = None
+
+    @property
+    def position(self) -> int:
+        return (
+            self.partial_filepath.stat().st_size
+            if self.partial_filepath.exists()
+            else 0
+        )
+
+    async def open(self, size: int) -> bool:
+        self.file = await aiofiles.open(self.partial_filepath, "ab")
+        return preallocate(self.file.fileno(), size)
+
+    async def write(self, chunk: bytes) -> None:
+        await self.file.write(chunk)
+
+    async def close(self) -> None:
+        if self.file is not None:
+            await self.file.close()
+            self.file = None
+
+    async def commit(self) -> None:
+        try:
+            await asyncio.to_thread(check_mp4, self.partial_filepath)
+        except BrokenFileError:
+            self.partial_filepath.unlink()
+            raise
+        self.partial_filepath.rename(self.filepath)
+        get_backup_filepath(self.filepath).unlink(missing_ok=True)
+
+    async def abort(self) -> None:
+        await self.close()
+
+
+class Target:
+    """Where the files go instead of the target directory."""
+
+    def get_sink(self, name: str, session: aiohttp.ClientSession) -> Sink:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """The run is over."""
+
+
+class PipeTarget(Target):
+    """Write the files one after another to stdout, or to a named FIFO,
+    which is opened once for the run. A slow reader slows the download
+    down."""
+
+    file: Any
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = path
+        self.file = None
+        # The bytes of one file at a time.
+        self.lock = asyncio.Lock()
+
+    def get_sink(self, name: str, session: aiohttp.ClientSession) -> Sink:
+        return PipeSink(self)
+
+    async def open(self) -> Any:
+        if self.file is not None:
+            return self.file
+        if self.path is None:
+            self.file = await aiofiles.open(
+                sys.stdout.fileno(), "wb", closefd=False
+            )
+            return self.file
+        if not self.path.exists():
+            os.mkfifo(self.path)
+        elif not stat.S_ISFIFO(self.path.stat().st_mode):
+            raise OSError(f"{self.path} nie jest potokiem (FIFO).")
+        # Blocks until a reader opens the FIFO.
+        self.file = await aiofiles.open(self.path, "wb")
+        return self.file
+
+    async def close(self) -> None:
+        if self.file is not None:
+            # The reader may be gone already.
+            with contextlib.suppress(OSError):
+                await self.file.close()
+            self.file = None
+
+
+class PipeSink(Sink):
+    file: Any
+
+    def __init__(self, target: PipeTarget) -> None:
+        self.target = target
+        self.file = None
+        self.written = 0
+
+    @property
+    def position(self) -> int:
+        return self.written
+
+    async def open(self, size: int) -> bool:
+        if self.file is None:
+            # The pipe is taken until the Video is committed or aborted.
+            await self.target.lock.acquire()
+            try:
+                self.file = await self.target.open()
+            except BaseException:
+                self.target.lock.release()
+                raise
+        return False
+
+    async def write(self, chunk: bytes) -> None:
+        await self.file.write(chunk)
+        self.written += len(chunk)
+
+    async def commit(self) -> None:
+        try:
+            await self.file.flush()
+        finally:
+            self.file = None
+            self.target.lock.release()
+
+    async def abort(self) -> None:
+        if self.file is None:
+            return
+        try:
+            with contextlib.suppress(OSError):
+                await self.file.flush()
+        finally:
+            self.file = None
+            self.target.lock.release()
+
+
+class S3Target(Target):
+    """Upload the files to an S3-compatible object store, under a key
+    prefix."""
+
+    def __init__(self, bucket: S3Bucket, prefix: str = "") -> None:
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get_sink(self, name: str, session: aiohttp.ClientSession) -> Sink:
+        return S3Sink(S3Upload(self.bucket, session, self.prefix + name))
+
+
+class S3Sink(Sink):
+    """Upload the file in parts with a multipart upload. One part
+    uploads while the stream fills the next one, so at most two parts
+    are held in memory."""
+
+    phase = "upload"
+
+    def __init__(self, upload: S3Upload) -> None:
+        self.upload = upload
+        self.part_size = upload.bucket.part_size
+        self.buffer = bytearray()
+        self.etags: list[str] = []
+        self.uploading: asyncio.Task[str] | None = None
+        self.created = False
+        self.written = 0
+
+    @property
+    def position(self) -> int:
+        return self.written
+
+    async def open(self, size: int) -> bool:
+        if not self.created:
+            await self.upload.create()
+            self.created = True
+        return False
+
+    async def write(self, chunk: bytes) -> None:
+        self.buffer += chunk
+        self.written += len(chunk)
+        if len(self.buffer) >= self.part_size:
+            await self.flush()
+
+    async def wait(self) -> None:
+        if self.uploading is not None:
+            self.etags.append(await self.uploading)
+            self.uploading = None
+
+    async def flush(self) -> None:
+        """Start uploading the buffer as the next part, once the part
+        before it is uploaded."""
+        await self.wait()
+        part, self.buffer = bytes(self.buffer), bytearray()
+        self.uploading = asyncio.create_task(
+            self.upload.upload_part(len(self.etags) + 1, part)
+        )
+
+    async def commit(self) -> None:
+        if self.buffer or (not self.etags and self.uploading is None):
+            await self.flush()
+        await self.wait()
+        await self.upload.complete(self.etags)
+
+    async def abort(self) -> None:
+        if self.uploading is not None:
+            self.uploading.cancel()
+            with contextlib.suppress(BaseException):
+                await self.uploading
+            self.uploading = None
+        if self.created:
+            await self.upload.abort()
+            self.created = False
+
+
+def get_target(spec: str | None) -> Target | None:
+    """Get the target of '--sink': '-' for stdout, 'fifo:PATH' or
+    's3://BUCKET/PREFIX'. None writes files to the target directory."""
+    if spec is None:
+        return None
+    if spec == "-":
+        return PipeTarget()
+    if spec.startswith("fifo:"):
+        return PipeTarget(Path(spec.removeprefix("fifo:")).expanduser())
+    name, prefix = parse_url(spec)
+    return S3Target(S3Bucket.from_env(name), prefix)
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any
+
+from cda_dl.metrics import write_atomic
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_fingerprint(page: dict[str, Any]) -> str:
+    """Hash the listing extracted from a folder page. Only the listing is
+    hashed, not the HTML, so ads and tokens on the page do not count as a
+    change."""
+    listing = [page["videos"], page.get("title"), page.get("folders")]
+    data = json.dumps(listing, ensure_ascii=False).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+class FolderSnapshots:
+    """Snapshots of the folders synced with 'cda-dl --sync', kept in a file
+    in the directory the folders are created in.
+
+    A snapshot holds the listing of every page of the folder with its
+    fingerprint and ETag, and the urls of the videos that are already
+    downloaded:
+        {"pages": [{"etag", "hash",
+                    "videos": [[url, title, duration], ...],
+                    "title", "folders"}, ...],
+         "done": [url, ...]}
+    Only the first page has "title" and "folders". Snapshots of older
+    versions list videos without the duration."""
+
+    FILENAME = ".cda-dl-folders.json"
+
+    def __init__(self) -> None:
+        self.directories: dict[Path, dict[str, dict[str, Any]]] = {}
+
+    def load(self, directory: Path) -> dict[str, dict[str, Any]]:
+        if directory not in self.directories:
+            snapshots: dict[str, dict[str, Any]] = {}
+            path = directory / self.FILENAME
+            try:
+                snapshots = json.loads(path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                pass
+            except (ValueError, OSError) as e:
+                LOGGER.debug(f"Pomijam uszkodzony plik {path}: {e}")
+            self.directories[directory] = snapshots
+        return self.directories[directory]
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        write_atomic(
+            directory / self.FILENAME,
+            json.dumps(self.load(directory), ensure_ascii=False),
+        )
+
+    def get(self, directory: Path, url: str) -> dict[str, Any] | None:
+        return self.load(directory).get(url)
+
+    def put(self, directory: Path, url: str, snapshot: dict[str, Any]) -> None:
+        self.load(directory)[url] = snapshot
+        self.save(directory)
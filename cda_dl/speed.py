@@ -0,0 +1,41 @@
+import time
+
+from cda_dl.error import SlowStreamError
+
+
+class SpeedMonitor:
+    """Watch the speed of one stream. The stream is too slow when it
+    receives less than 'min_speed' bytes per second for 'grace' seconds
+    in a row, which also covers a stream that receives nothing at all."""
+
+    def __init__(self, min_speed: float, grace: float) -> None:
+        self.min_speed = min_speed
+        self.grace = grace
+        self.window_start = time.perf_counter()
+        self.window_bytes = 0
+
+    def add(self, nbytes: int) -> None:
+        """Count the received bytes; raise SlowStreamError when the grace
+        period ends below the floor."""
+        self.window_bytes += nbytes
+        elapsed = time.perf_counter() - self.window_start
+        if elapsed < self.grace:
+            return
+        speed = self.window_bytes / elapsed
+        if speed < self.min_speed:
+            raise SlowStreamError(
+                f"Strumień zwolnił do {speed / 1024:.1f} KiB/s przez"
+                f" {elapsed:.0f} s."
+            )
+        self.window_start += elapsed
+        self.window_bytes = 0
+
+    def timeout(self) -> float:
+        """Get how long the next read may wait before the stream counts
+        as too slow."""
+        deadline = self.window_start + self.grace
+        if self.window_bytes >= self.min_speed * self.grace:
+            # The current window is fast enough already; a stall has to
+            # last through the next one.
+            deadline += self.grace
+        return max(deadline - time.perf_counter(), 0)
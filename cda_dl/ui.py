@@ -1,18 +1,74 @@
-from rich.panel import Panel
-from rich.progress import (
-    BarColumn,
-    DownloadColumn,
-    Progress,
-    SpinnerColumn,
-    TaskID,
-    TextColumn,
-    TimeRemainingColumn,
-    TransferSpeedColumn,
-)
-from rich.table import Table
-
-
-class RichUI:
+from __future__ import annotations
+
+import json
+import sys
+import time
+from contextlib import AbstractContextManager, nullcontext
+from typing import TYPE_CHECKING, Any, TextIO, cast
+
+from cda_dl.download_state import DownloadState
+from cda_dl.metrics import VideoMetrics
+from cda_dl.utils import clear
+
+if TYPE_CHECKING:
+    from rich.progress import Progress, TaskID
+    from rich.table import Table
+
+
+class UI:
+    """Interface used by Downloader, Folder and Video to report progress.
+    Every hook is a no-op, so a subclass overrides only what it shows."""
+
+    progbar_video: Any = None
+    progbar_folder: Any = None
+
+    def set_progress_bar_video(self, color: str) -> None:
+        pass
+
+    def set_progress_bar_folder(self, color: str) -> None:
+        pass
+
+    def add_row_video(self, border: str) -> None:
+        pass
+
+    def add_row_folder(self, border: str) -> None:
+        pass
+
+    def add_task_folder(self, filename: str, total: int) -> None:
+        pass
+
+    def update_task_folder(self, advance: int) -> None:
+        pass
+
+    def remove_task_folder(self) -> None:
+        pass
+
+    def add_task_video(self, filename: str, total: int, completed: int) -> int:
+        return 0
+
+    def update_task_video(self, task_id: int, advance: int) -> None:
+        pass
+
+    def remove_task_video(self, task_id: int) -> None:
+        pass
+
+    def video_queued(self, url: str) -> None:
+        pass
+
+    def video_started(self, url: str) -> None:
+        pass
+
+    def video_finished(self, metrics: VideoMetrics) -> None:
+        pass
+
+    def live(self) -> AbstractContextManager[Any]:
+        return nullcontext()
+
+    def print_summary(self, download_state: DownloadState) -> None:
+        pass
+
+
+class RichUI(UI):
     progbar_video: Progress | None
     progbar_folder: Progress | None
     task_id: TaskID
@@ -23,6 +79,16 @@ class RichUI:
         self.progbar_folder = None
 
     def set_progress_bar_video(self, color: str) -> None:
+        from rich.progress import (
+            BarColumn,
+            DownloadColumn,
+            Progress,
+            SpinnerColumn,
+            TextColumn,
+            TimeRemainingColumn,
+            TransferSpeedColumn,
+        )
+
         self.progbar_video = Progress(
             SpinnerColumn(),
             TextColumn(
@@ -41,6 +107,8 @@ class RichUI:
         )
 
     def set_progress_bar_folder(self, color: str) -> None:
+        from rich.progress import BarColumn, Progress, TextColumn
+
         self.progbar_folder = Progress(
             TextColumn(
                 f"[{color}]{{task.fields[filename]}}",
@@ -53,6 +121,8 @@ class RichUI:
         )
 
     def add_row_video(self, border: str) -> None:
+        from rich.panel import Panel
+
         assert self.table and self.progbar_video
         self.table.add_row(
             Panel.fit(
@@ -64,6 +134,8 @@ class RichUI:
         )
 
     def add_row_folder(self, border: str) -> None:
+        from rich.panel import Panel
+
         assert self.table and self.progbar_folder
         self.table.add_row(
             Panel.fit(
@@ -89,3 +161,116 @@ class RichUI:
     def remove_task_folder(self) -> None:
         assert self.progbar_folder
         self.progbar_folder.remove_task(self.task_id)
+
+    def add_task_video(self, filename: str, total: int, completed: int) -> int:
+        assert self.progbar_video
+        return self.progbar_video.add_task(
+            "download",
+            filename=filename,
+            total=total,
+            completed=completed,
+        )
+
+    def update_task_video(self, task_id: int, advance: int) -> None:
+        assert self.progbar_video
+        self.progbar_video.update(cast("TaskID", task_id), advance=advance)
+
+    def remove_task_video(self, task_id: int) -> None:
+        assert self.progbar_video
+        self.progbar_video.remove_task(cast("TaskID", task_id))
+
+    def live(self) -> AbstractContextManager[Any]:
+        from rich.live import Live
+
+        return Live(self.table, refresh_per_second=10)
+
+    def print_summary(self, download_state: DownloadState) -> None:
+        from rich.console import Console
+
+        clear()
+        console = Console()
+        console.print(
+            "| [green bold]Pobrane Pliki:"
+            f" {download_state.completed}[/] - [yellow"
+            f" bold]Pominięte Pliki: {download_state.skipped}[/]"
+            f" - [cyan bold]Połączone Pliki: {download_state.linked}[/]"
+            " - [red bold]Nieudane Pliki:"
+            f" {download_state.failed}[/] |\n"
+        )
+        console.print("Skończono pobieranie. Enjoy :)")
+
+
+class JsonlUI(UI):
+    """Write progress as newline-delimited JSON events instead of drawing
+    a terminal UI. Progress of a file is reported at most once per
+    'interval' seconds."""
+
+    def __init__(self, stream: TextIO = sys.stdout, interval: float = 5.0):
+        self.stream = stream
+        self.interval = interval
+        self.tasks: dict[int, dict[str, Any]] = {}
+        self.next_task_id = 0
+        self.folders: list[str] = []
+
+    def emit(self, event: str, **fields: Any) -> None:
+        record = {"ts": round(time.time(), 3), "event": event, **fields}
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def add_task_folder(self, filename: str, total: int) -> None:
+        self.folders.append(filename)
+        self.emit("folder_started", folder=filename, total=total)
+
+    def remove_task_folder(self) -> None:
+        self.emit("folder_finished", folder=self.folders.pop())
+
+    def add_task_video(self, filename: str, total: int, completed: int) -> int:
+        self.next_task_id += 1
+        self.tasks[self.next_task_id] = {
+            "file": filename,
+            "total": total,
+            "completed": completed,
+            "emitted": time.monotonic(),
+        }
+        return self.next_task_id
+
+    def update_task_video(self, task_id: int, advance: int) -> None:
+        task = self.tasks[task_id]
+        task["completed"] += advance
+        now = time.monotonic()
+        if now - task["emitted"] >= self.interval:
+            task["emitted"] = now
+            self.emit(
+                "progress",
+                file=task["file"],
+                completed=task["completed"],
+                total=task["total"],
+            )
+
+    def remove_task_video(self, task_id: int) -> None:
+        del self.tasks[task_id]
+
+    def video_queued(self, url: str) -> None:
+        self.emit("queued", url=url)
+
+    def video_started(self, url: str) -> None:
+        self.emit("started", url=url)
+
+    def video_finished(self, metrics: VideoMetrics) -> None:
+        self.emit(
+            metrics.status or "failed",
+            url=metrics.url,
+            title=metrics.title,
+            resolution=metrics.resolution,
+            bytes=metrics.bytes,
+            reason=metrics.reason,
+        )
+
+    def print_summary(self, download_state: DownloadState) -> None:
+        self.emit(
+            "summary",
+            completed=download_state.completed,
+            skipped=download_state.skipped,
+            linked=download_state.linked,
+            failed=download_state.failed,
+        )
@@ -7,22 +7,39 @@ from typing import Any
 import aiohttp
 from tenacity import (
     retry,
-    retry_if_exception_type,
+    retry_if_exception,
     stop_after_attempt,
     stop_after_delay,
     wait_fixed,
 )
 
 from cda_dl.error import HTTPError
+from cda_dl.metrics import record_retry
+
+VIDEO_PATTERN = r"""https?://(?:(?:www|ebd)\.)?cda\.pl/
+    (?:video|[0-9]+x[0-9]+)/(?P<video_id>[0-9a-z]+)"""
+FOLDER_PATTERNS = (
+    r"""(https?://(?:www\.)?cda\.pl/(?!video)[a-z0-9_-]+/
+    (?!folder/)[a-z0-9_-]+)/?(\d*)""",
+    r"""(https?://(?:www\.)?cda\.pl/(?!video)[a-z0-9_-]+/
+    folder/\d+)/?(\d*)""",
+)
+# Compiled once; the matchers run for every url of the input, the
+# folder listings and the Videos.
+VIDEO_REGEX = re.compile(VIDEO_PATTERN, re.VERBOSE | re.IGNORECASE)
+FOLDER_REGEXES = tuple(
+    re.compile(pattern, re.VERBOSE | re.IGNORECASE)
+    for pattern in FOLDER_PATTERNS
+)
+# A video url is tried first, as with is_video() before is_folder().
+URL_REGEX = re.compile(
+    f"(?P<video>{VIDEO_PATTERN})|(?P<folder>{'|'.join(FOLDER_PATTERNS)})",
+    re.VERBOSE | re.IGNORECASE,
+)
 
 
 def get_video_match(url: str) -> re.Match[str] | None:
-    video_regex = re.compile(
-        r"""https?://(?:(?:www|ebd)\.)?cda\.pl/
-        (?:video|[0-9]+x[0-9]+)/([0-9a-z]+)""",
-        re.VERBOSE | re.IGNORECASE,
-    )
-    return video_regex.match(url)
+    return VIDEO_REGEX.match(url)
 
 
 def is_video(url: str) -> bool:
@@ -32,17 +49,7 @@ def is_video(url: str) -> bool:
 
 
 def get_folder_match(url: str) -> re.Match[str] | None:
-    folder_regex1 = re.compile(
-        r"""(https?://(?:www\.)?cda\.pl/(?!video)[a-z0-9_-]+/
-        (?!folder/)[a-z0-9_-]+)/?(\d*)""",
-        re.VERBOSE | re.IGNORECASE,
-    )
-    folder_regex2 = re.compile(
-        r"""(https?://(?:www\.)?cda\.pl/(?!video)[a-z0-9_-]+/
-        folder/\d+)/?(\d*)""",
-        re.VERBOSE | re.IGNORECASE,
-    )
-    return folder_regex1.match(url) or folder_regex2.match(url)
+    return FOLDER_REGEXES[0].match(url) or FOLDER_REGEXES[1].match(url)
 
 
 def is_folder(url: str) -> bool:
@@ -51,6 +58,20 @@ def is_folder(url: str) -> bool:
     return match is not None
 
 
+def classify_url(url: str) -> tuple[str, str] | None:
+    """Classify the url with a single match. Return ('video', url) with
+    the url in its canonical form, so the 'www', 'ebd' and 'NxN' forms
+    of a Video are the same, or ('folder', url); None if the url is not
+    a cda video or folder."""
+    match = URL_REGEX.match(url)
+    if match is None:
+        return None
+    if match.group("video") is None:
+        return "folder", url
+    scheme = url.partition(":")[0].lower()
+    return "video", f"{scheme}://www.cda.pl/video/{match.group('video_id')}"
+
+
 def get_safe_title(title: str) -> str:
     """Remove characters that are not allowed in the filename
     and convert spaces to underscores."""
@@ -59,6 +80,17 @@ def get_safe_title(title: str) -> str:
     return title
 
 
+def parse_duration(text: str) -> int | None:
+    """Parse a duration like '1:02:03' or '12:34' into seconds."""
+    parts = text.strip().split(":")
+    if not all(part.isdigit() for part in parts):
+        return None
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
 # source: // https://www.cda.pl/js/player.js?t=1676342296
 def decrypt_url(url: str) -> str:
     for p in ("_XDDD", "_CDA", "_ADC", "_CXD", "_QWE", "_Q5", "_IKSDE"):
@@ -116,10 +148,17 @@ def get_random_agent() -> str:
     return random.choice(USER_AGENTS)
 
 
+def is_transient(e: BaseException) -> bool:
+    """Check if a failed request is worth retrying. A missing page, e.g.
+    the page after the last one of a folder, stays missing."""
+    return isinstance(e, HTTPError) and e.status_code != 404
+
+
 @retry(
-    retry=retry_if_exception_type(HTTPError),
+    retry=retry_if_exception(is_transient),
     wait=wait_fixed(1),
     stop=(stop_after_attempt(3) | stop_after_delay(5)),
+    before_sleep=record_retry,
     reraise=True,
 )
 async def get_request(
@@ -139,15 +178,16 @@ async def get_request(
 
 
 @retry(
-    retry=retry_if_exception_type(HTTPError),
+    retry=retry_if_exception(is_transient),
     wait=wait_fixed(1),
     stop=(stop_after_attempt(3) | stop_after_delay(5)),
+    before_sleep=record_retry,
     reraise=True,
 )
 async def post_request(
     url: str,
     session: aiohttp.ClientSession,
-    json: dict[str, Any],
+    json: Any,
     headers: dict[str, str],
 ) -> aiohttp.ClientResponse:
     """Get request with random user agent."""
@@ -2,6 +2,7 @@ import asyncio
 import json
 import logging
 import re
+import time
 from pathlib import Path
 from typing import Any
 
@@ -9,19 +10,29 @@ import aiofiles
 import aiohttp
 from bs4 import BeautifulSoup
 from bs4.element import Tag
-from rich.console import Console
-from rich.logging import RichHandler
 
+from cda_dl.dedupe import DedupeIndex
+from cda_dl.disk import FreeSpaceGate
 from cda_dl.download_options import DownloadOptions
 from cda_dl.download_state import DownloadState
 from cda_dl.error import (
+    BrokenFileError,
+    DiskSpaceError,
     GeoBlockedError,
     HTTPError,
     LoginRequiredError,
     ParserError,
     ResolutionError,
+    SlowStreamError,
 )
-from cda_dl.ui import RichUI
+from cda_dl.manifest import BLOCK_SIZE, Hasher, new_hasher
+from cda_dl.metrics import CURRENT_METRICS, VideoMetrics
+from cda_dl.mp4 import check_mp4
+from cda_dl.profiling import timed
+from cda_dl.resolver import LinkResolver, get_link
+from cda_dl.sink import FileSink, Sink, get_backup_filepath
+from cda_dl.speed import SpeedMonitor
+from cda_dl.ui import UI
 from cda_dl.utils import (
     decrypt_url,
     get_request,
@@ -30,13 +41,13 @@ from cda_dl.utils import (
     post_request,
 )
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(message)s",
-    handlers=[RichHandler(show_time=False)],
-)
 LOGGER = logging.getLogger(__name__)
 
+# How many times a download that comes out broken is streamed.
+MAX_STREAM_ATTEMPTS = 3
+# How many times a too slow stream is restarted with a new link.
+MAX_SLOW_RESTARTS = 3
+
 
 class Video:
     video_id: str
@@ -51,33 +62,105 @@ class Video:
     filepath: Path
     partial_filepath: Path
     resume_point: int
+    stream_requested: float
+    sink: Sink
 
     def __init__(
-        self, url: str, session: aiohttp.ClientSession, ui: RichUI
+        self,
+        url: str,
+        session: aiohttp.ClientSession,
+        ui: UI,
+        listed_title: str | None = None,
+        duration: int | None = None,
     ) -> None:
         self.url = url
         self.session = session
         self.ui = ui
+        self.listed_title = listed_title
+        self.duration = duration
+        self.probed = False
+        # The quality of an earlier run of a resumed job, which its .part
+        # file continues in.
+        self.journaled_resolution: str | None = None
+        # Where a broken file is kept until its new copy is valid.
+        self.backup: Path | None = None
+        self.charged = False
         self.headers = {
             "Content-Type": "application/json",
             "X-Requested-With": "XMLHttpRequest",
         }
+        self.metrics = VideoMetrics(url)
 
+    @timed
     async def download_video(
         self, download_options: DownloadOptions, download_state: DownloadState
     ) -> None:
         LOGGER.level = (
             logging.WARNING if download_options.quiet else logging.INFO
         )
+        CURRENT_METRICS.set(self.metrics)
+        dedupe = download_options.dedupe
+        if dedupe is None:
+            await self.download_in_slot(download_options, download_state)
+            return
+        # A copy that is in flight is waited for without a download slot,
+        # so duplicates do not keep other Videos waiting.
+        key = f"{self.get_videoid()}:{download_options.resolution}"
+        source = await dedupe.claim(key)
+        if source is not None:
+            self.ui.video_started(self.url)
+            self.link_copy(source, dedupe, download_options, download_state)
+            return
+        path = None
         try:
-            await self.pre_initialize(download_options)
-            if self.filepath.exists() and not download_options.overwrite:
-                LOGGER.info(
-                    f"Plik '{self.title}.mp4' już istnieje. Pomijam ..."
-                )
-                download_state.skipped += 1
-                return
-            await self.initialize(download_options)
+            await self.download_in_slot(download_options, download_state)
+            if self.metrics.status in ("completed", "skipped"):
+                path = self.filepath
+        finally:
+            dedupe.release(key, path)
+
+    async def download_in_slot(
+        self, download_options: DownloadOptions, download_state: DownloadState
+    ) -> None:
+        """Download the Video in one of the -t download slots."""
+        async with download_options.semaphore:
+            self.ui.video_started(self.url)
+            await self.download(download_options, download_state)
+
+    async def download(
+        self, download_options: DownloadOptions, download_state: DownloadState
+    ) -> None:
+        try:
+            await self.download_file(download_options, download_state)
+        finally:
+            self.restore_backup()
+
+    async def download_file(
+        self, download_options: DownloadOptions, download_state: DownloadState
+    ) -> None:
+        try:
+            cached = await self.initialize_from_cache(download_options)
+            listed = not cached and self.exists_from_listing(download_options)
+            if not cached and not listed:
+                await self.pre_initialize(download_options)
+            if self.exists(download_options):
+                if await self.is_complete():
+                    LOGGER.info(
+                        f"Plik '{self.title}.mp4' już istnieje. Pomijam ..."
+                    )
+                    download_state.skipped += 1
+                    self.finish(download_options, download_state, "skipped")
+                    return
+                if cached:
+                    # The file is out of the way now, so the cached link
+                    # gets its sink and stream; an expired link needs the
+                    # page like a listed Video.
+                    cached = await self.initialize_from_cache(download_options)
+                    listed = not cached
+                if listed:
+                    await self.pre_initialize(download_options)
+            if not cached:
+                await self.initialize(download_options)
         except (
             LoginRequiredError,
             GeoBlockedError,
@@ -86,33 +169,245 @@ class Video:
             HTTPError,
         ) as e:
             if isinstance(e, HTTPError) and e.status_code == 429:
+                self.metrics.rate_limited += 1
+                if download_options.tuner is not None:
+                    download_options.tuner.rate_limited += 1
                 LOGGER.warning("Zbyt dużo zapytań. Usypiam wątek na 10 min.")
                 await asyncio.sleep(60 * 10)
-                await self.download_video(download_options, download_state)
+                await self.download_file(download_options, download_state)
             else:
                 LOGGER.warning(e)
                 download_state.failed += 1
+                self.finish(download_options, download_state, "failed", str(e))
         else:
             self.make_directory(download_options)
-            await self.stream_file(download_state)
+            try:
+                await self.stream_until_valid(download_options)
+            except (
+                BrokenFileError,
+                DiskSpaceError,
+                HTTPError,
+                OSError,
+                ParserError,
+            ) as e:
+                self.video_stream.release()
+                LOGGER.warning(e)
+                download_state.failed += 1
+                self.finish(download_options, download_state, "failed", str(e))
+                return
+            download_state.completed += 1
+            self.finish(download_options, download_state, "completed")
+            if download_options.link_cache is not None:
+                download_options.link_cache.remove(
+                    download_options.directory,
+                    self.video_id,
+                    download_options.resolution,
+                )
 
+    async def is_complete(self) -> bool:
+        """Check the structure of the existing file. A broken file is
+        moved back to its .part file if it is only cut short, so the
+        download resumes, and moved aside otherwise; the new copy
+        replaces it once it is valid."""
+        try:
+            await asyncio.to_thread(check_mp4, self.filepath)
+        except BrokenFileError as e:
+            LOGGER.warning(f"{e} Pobieram ponownie ...")
+            if e.truncated:
+                self.filepath.rename(self.get_partial_filepath())
+            else:
+                self.backup = get_backup_filepath(self.filepath)
+                self.filepath.rename(self.backup)
+            return False
+        return True
+
+    def restore_backup(self) -> None:
+        """Put the file moved aside by is_complete() back if no valid copy
+        replaced it."""
+        if (
+            self.backup is not None
+            and self.backup.exists()
+            and not self.filepath.exists()
+        ):
+            self.backup.rename(self.filepath)
+        self.backup = None
+
+    def link_copy(
+        self,
+        source: Path,
+        dedupe: DedupeIndex,
+        download_options: DownloadOptions,
+        download_state: DownloadState,
+    ) -> None:
+        """Link to a copy of the same Video downloaded to another place."""
+        self.title = self.metrics.title = source.stem
+        self.filepath = self.get_filepath(download_options)
+        if self.filepath.exists() and (
+            not download_options.overwrite or self.filepath.samefile(source)
+        ):
+            LOGGER.info(f"Plik '{self.title}.mp4' już istnieje. Pomijam ...")
+            download_state.skipped += 1
+            self.finish(download_options, download_state, "skipped")
+            return
+        self.make_directory(download_options)
+        try:
+            dedupe.link(source, self.filepath)
+        except OSError as e:
+            LOGGER.warning(f"Nie udało się połączyć {self.filepath}: {e}")
+            download_state.failed += 1
+            self.finish(download_options, download_state, "failed", str(e))
+            return
+        manifests = download_options.manifests
+        entry = None if manifests is None else manifests.get(source)
+        if manifests is not None and entry is not None:
+            manifests.put(self.filepath, entry["algorithm"], entry["hash"])
+        LOGGER.info(f"Plik '{self.title}.mp4' połączony z {source}.")
+        download_state.linked += 1
+        self.finish(download_options, download_state, "linked")
+
+    def finish(
+        self,
+        download_options: DownloadOptions,
+        download_state: DownloadState,
+        status: str,
+        reason: str | None = None,
+    ) -> None:
+        """Record the outcome of the Video in the metrics, the job journal
+        and the UI."""
+        self.metrics.finish(status, reason)
+        if download_options.tuner is not None and status == "failed":
+            download_options.tuner.errors += 1
+        if download_options.quality is not None and not self.charged:
+            download_options.quality.unqueue()
+        download_state.videos.append(self.metrics)
+        if download_options.journal is not None:
+            download_options.journal.state(self.url, status)
+        self.ui.video_finished(self.metrics)
+
+    @timed
+    async def initialize_from_cache(
+        self, download_options: DownloadOptions
+    ) -> bool:
+        """Initialize members from a cached file link, without fetching
+        the Video page or calling videoGetLink. Return False if there is
+        no usable link in the cache."""
+        link_cache = download_options.link_cache
+        if link_cache is None:
+            return False
+        self.video_id = self.get_videoid()
+        entry = link_cache.get(
+            download_options.directory,
+            self.video_id,
+            download_options.resolution,
+        )
+        if entry is None:
+            return False
+        self.title = self.metrics.title = entry["title"]
+        self.resolution = self.metrics.resolution = entry["resolution"]
+        self.file = entry["url"]
+        self.filepath = self.get_filepath(download_options)
+        self.partial_filepath = self.get_partial_filepath()
+        if self.exists(download_options):
+            return True
+        self.sink = self.get_sink(download_options)
+        self.resume_point = self.get_resume_point()
+        try:
+            self.video_stream = await self.get_video_stream()
+        except HTTPError:
+            link_cache.remove(
+                download_options.directory,
+                self.video_id,
+                download_options.resolution,
+            )
+            return False
+        self.remaining_size = self.get_remaining_size()
+        self.charge(download_options)
+        return True
+
+    def exists_from_listing(self, download_options: DownloadOptions) -> bool:
+        """Check with the title from the folder listing if the Video is
+        already downloaded, without fetching the Video page."""
+        if (
+            self.listed_title is None
+            or download_options.overwrite
+            or download_options.target is not None
+        ):
+            return False
+        self.title = get_safe_title(self.listed_title)
+        if not self.title:
+            return False
+        self.filepath = self.get_filepath(download_options)
+        if not self.filepath.exists():
+            return False
+        self.metrics.title = self.title
+        return True
+
+    @timed
     async def pre_initialize(self, download_options: DownloadOptions) -> None:
         """Initialize members required to get Video info."""
-        self.video_soup = await self.get_video_soup()
-        self.title = self.get_video_title()
+        if not self.probed:
+            self.video_soup = await self.get_video_soup()
+            self.title = self.metrics.title = self.get_video_title()
         self.filepath = self.get_filepath(download_options)
 
+    @timed
     async def initialize(self, download_options: DownloadOptions) -> None:
         """Initialize members required to download the Video."""
         self.video_id = self.get_videoid()
         self.check_geolocation()
         self.partial_filepath = self.get_partial_filepath()
         self.check_premium()
-        self.video_info = await self.get_video_info()
+        if not self.probed:
+            self.video_info = await self.get_video_info()
         self.resolutions = self.get_resolutions()
+        self.duration = self.get_duration()
         self.resolution = self.get_adjusted_resolution(download_options)
         self.raise_invalid_res()
+        self.metrics.resolution = self.resolution
         cda_res = self.resolutions[self.resolution]
+        with self.metrics.measure("rpc"):
+            self.file = await self.get_file_link(
+                cda_res, download_options.link_resolver
+            )
+        if download_options.journal is not None:
+            download_options.journal.resolved(
+                self.url, self.title, self.resolution
+            )
+        self.cache_link(download_options)
+        # The page is not needed once the file link is resolved; a big
+        # folder keeps several Videos streaming at once.
+        del self.video_soup, self.video_info
+        self.sink = self.get_sink(download_options)
+        self.resume_point = self.get_resume_point()
+        self.video_stream = await self.get_video_stream()
+        self.remaining_size = self.get_remaining_size()
+        self.charge(download_options)
+
+    def cache_link(self, download_options: DownloadOptions) -> None:
+        if download_options.link_cache is not None:
+            download_options.link_cache.put(
+                download_options.directory,
+                self.video_id,
+                download_options.resolution,
+                self.file,
+                self.title,
+                self.resolution,
+            )
+
+    @timed
+    async def get_file_link(
+        self, cda_res: str, link_resolver: LinkResolver | None = None
+    ) -> str:
+        """Resolve the direct link to the file with videoGetLink."""
+        params = [
+            self.video_id,
+            cda_res,
+            self.video_info["ts"],
+            self.video_info["hash2"],
+            {},
+        ]
+        if link_resolver is not None:
+            return await link_resolver.resolve(self.url, params)
         resp = await post_request(
             self.url,
             self.session,
@@ -120,21 +415,11 @@ class Video:
                 "id": 3,
                 "jsonrpc": "2.0",
                 "method": "videoGetLink",
-                "params": [
-                    self.video_id,
-                    cda_res,
-                    self.video_info["ts"],
-                    self.video_info["hash2"],
-                    {},
-                ],
+                "params": params,
             },
             self.headers,
         )
-        data = await resp.json()
-        self.file = data["result"]["resp"]
-        self.resume_point = self.get_resume_point()
-        self.video_stream = await self.get_video_stream()
-        self.remaining_size = self.get_remaining_size()
+        return get_link(self.url, await resp.json())
 
     def get_videoid(self) -> str:
         """Get videoid from Video url."""
@@ -142,10 +427,13 @@ class Video:
         assert match
         return match.group(1)
 
+    @timed
     async def get_video_soup(self) -> BeautifulSoup:
-        response = await get_request(self.url, self.session, self.headers)
-        text = await response.text()
-        return BeautifulSoup(text, "html.parser")
+        with self.metrics.measure("page_fetch"):
+            response = await get_request(self.url, self.session, self.headers)
+            text = await response.text()
+        with self.metrics.measure("parse"):
+            return BeautifulSoup(text, "html.parser")
 
     def get_video_title(self) -> str:
         title_tag = self.video_soup.find("h1")
@@ -192,45 +480,66 @@ class Video:
                 f"Error podczas parsowania 'media player' dla {self.title}."
                 " Pomijam ..."
             )
-        player_data = json.loads(media_player.attrs["player_data"])
+        with self.metrics.measure("parse"):
+            player_data = json.loads(media_player.attrs["player_data"])
         return player_data["video"]
 
+    def get_duration(self) -> int | None:
+        """Get the duration in seconds, from the folder listing or the
+        Video info."""
+        if self.duration is not None:
+            return self.duration
+        duration = self.video_info.get("duration")
+        return int(duration) if str(duration).isdigit() else None
+
+    def charge(self, download_options: DownloadOptions) -> None:
+        """Account the bytes of the stream in the quality policy."""
+        if download_options.quality is None or self.charged:
+            return
+        download_options.quality.commit(
+            self.resolution,
+            self.duration,
+            self.resume_point + self.remaining_size,
+            self.remaining_size,
+        )
+        self.charged = True
+
     def get_resolutions(self) -> dict[str, str]:
         """Get available Video resolutions at the url."""
         return self.video_info["qualities"]  # type: ignore
 
-    async def list_resolutions(self) -> None:
+    @timed
+    async def probe(self) -> None:
+        """Fetch the Video page and read the title and the available
+        resolutions."""
         self.video_id = self.get_videoid()
         self.video_soup = await self.get_video_soup()
+        self.title = self.metrics.title = self.get_video_title()
         self.video_info = await self.get_video_info()
-        resolutions = self.get_resolutions()
-        console = Console()
-        console.print(f"Dostępne rozdzielczości dla {self.url}")
-        for res in resolutions:
-            console.print(res)
+        self.resolutions = self.get_resolutions()
+        self.duration = self.get_duration()
+        self.probed = True
 
-    async def check_resolution(
-        self, download_options: DownloadOptions
+    def check_resolution(
+        self, download_options: DownloadOptions, url: str | None = None
     ) -> None:
-        self.video_id = self.get_videoid()
-        self.video_soup = await self.get_video_soup()
-        self.video_info = await self.get_video_info()
-        self.resolutions = self.get_resolutions()
+        """Check the resolution requested for the probed Video. The error
+        names 'url', the url as the user gave it, if there is one."""
         self.resolution = download_options.resolution
-        self.raise_invalid_res()
+        self.raise_invalid_res(url)
 
     def get_best_resolution(self) -> str:
         """Get best Video resolution available at the url."""
         numeric_resolutions = []
         for k in self.resolutions.keys():
             # Skip non-numeric resolution keys like 'aut'
-            if k.endswith('p') and k[:-1].isdigit():
+            if k.endswith("p") and k[:-1].isdigit():
                 numeric_resolutions.append(int(k[:-1]))
-        
+
         if not numeric_resolutions:
             # If no numeric resolutions found, return the first available resolution
             return list(self.resolutions.keys())[0]
-            
+
         return f"{max(numeric_resolutions)}p"
 
     def is_valid_resolution(self) -> bool:
@@ -239,35 +548,59 @@ class Video:
     def get_adjusted_resolution(
         self, download_options: DownloadOptions
     ) -> str:
+        if (
+            self.journaled_resolution in self.resolutions
+            and self.partial_filepath.exists()
+        ):
+            return self.journaled_resolution
+        if download_options.quality is not None:
+            return download_options.quality.choose(
+                list(self.resolutions),
+                self.duration,
+                download_options.resolution,
+            )
         return (
             self.get_best_resolution()
             if download_options.resolution == "najlepsza"
             else download_options.resolution
         )
 
-    def raise_invalid_res(self) -> None:
+    def raise_invalid_res(self, url: str | None = None) -> None:
         """Raise ResolutionError if resolution is invalid."""
         if not self.is_valid_resolution():
             raise ResolutionError(
                 f"{self.resolution} rozdzielczość nie jest dostępna dla"
-                f" {self.url}"
+                f" {url or self.url}"
             )
 
     def get_file(self) -> str:
         """Get decrypted link to the file download."""
         return decrypt_url(self.video_info["file"])
 
-    def get_resume_point(self) -> int:
+    def exists(self, download_options: DownloadOptions) -> bool:
+        """Check if the file is to be kept instead of downloaded."""
         return (
-            self.partial_filepath.stat().st_size
-            if self.partial_filepath.exists()
-            else 0
+            download_options.target is None
+            and not download_options.overwrite
+            and self.filepath.exists()
         )
 
+    def get_sink(self, download_options: DownloadOptions) -> Sink:
+        target = download_options.target
+        if target is None:
+            return FileSink(self.filepath, self.partial_filepath)
+        return target.get_sink(f"{self.title}.mp4", self.session)
+
+    def get_resume_point(self) -> int:
+        return self.sink.position
+
+    @timed
     async def get_video_stream(self) -> aiohttp.ClientResponse:
-        range_num = f"bytes={self.resume_point}-"
-        self.headers["Range"] = range_num
-        video_stream = await get_request(self.file, self.session, self.headers)
+        # Only the media request is ranged, not the Video page requests
+        # that share self.headers.
+        headers = dict(self.headers, Range=f"bytes={self.resume_point}-")
+        self.stream_requested = time.perf_counter()
+        video_stream = await get_request(self.file, self.session, headers)
         return video_stream
 
     def get_remaining_size(self) -> int:
@@ -277,23 +610,195 @@ class Video:
     def make_directory(self, download_options: DownloadOptions) -> None:
         download_options.directory.mkdir(parents=True, exist_ok=True)
 
-    async def stream_file(self, download_state: DownloadState) -> None:
+    async def admit(self, disk: FreeSpaceGate) -> int:
+        """Wait until the remaining size of the Video fits on the disk."""
+        directory = self.partial_filepath.parent
+        device = disk.try_reserve(directory, self.remaining_size)
+        if device is None:
+            LOGGER.info(
+                f"Za mało miejsca na dysku dla '{self.title}.mp4'. Czekam ..."
+            )
+            # Do not hold the connection open while waiting.
+            self.video_stream.release()
+            device = await disk.reserve(directory, self.remaining_size)
+            try:
+                self.video_stream = await self.get_video_stream()
+            except BaseException:
+                await disk.release(device, self.remaining_size)
+                raise
+        return device
+
+    async def restart_stream(self) -> None:
+        """Request the file again from where the .part file ends."""
+        self.resume_point = self.get_resume_point()
+        self.video_stream = await self.get_video_stream()
+        self.remaining_size = self.get_remaining_size()
+
+    async def refresh_link(self, download_options: DownloadOptions) -> None:
+        """Resolve a new file link from a fresh Video page, which may
+        point to another CDN node, and stream from it."""
+        self.video_stream.release()
+        self.video_soup = await self.get_video_soup()
+        self.video_info = await self.get_video_info()
+        self.resolutions = self.get_resolutions()
+        with self.metrics.measure("rpc"):
+            self.file = await self.get_file_link(
+                self.resolutions[self.resolution],
+                download_options.link_resolver,
+            )
+        del self.video_soup, self.video_info
+        self.cache_link(download_options)
+        await self.restart_stream()
+
+    async def stream_until_valid(
+        self, download_options: DownloadOptions
+    ) -> None:
+        """Stream the file, and stream it again while it comes out
+        broken, at most MAX_STREAM_ATTEMPTS times. A stream that is too
+        slow is restarted with a new link at most MAX_SLOW_RESTARTS
+        times; after that it is left to finish at any speed."""
+        attempt = 1
+        slow_restarts = 0
+        try:
+            while True:
+                try:
+                    await self.stream_file(
+                        download_options,
+                        watch_speed=slow_restarts < MAX_SLOW_RESTARTS,
+                    )
+                    return
+                except BrokenFileError as e:
+                    if attempt == MAX_STREAM_ATTEMPTS:
+                        raise
+                    attempt += 1
+                    LOGGER.warning(f"{e} Pobieram ponownie ...")
+                    await self.restart_stream()
+                except SlowStreamError as e:
+                    slow_restarts += 1
+                    self.metrics.slow_restarts += 1
+                    LOGGER.warning(
+                        f"{e} Wznawiam '{self.title}.mp4' z nowego linku ..."
+                    )
+                    await self.refresh_link(download_options)
+        except BaseException:
+            await self.sink.abort()
+            raise
+
+    async def get_hasher(self, algorithm: str) -> Hasher:
+        """Get a hasher fed with the part of the file downloaded before,
+        so the hash covers the whole file after resuming."""
+        hasher = new_hasher(algorithm)
+        if self.resume_point > 0:
+            with self.metrics.measure("hash"):
+                async with aiofiles.open(self.partial_filepath, "rb") as f:
+                    remaining = self.resume_point
+                    while remaining > 0:
+                        block = await f.read(min(BLOCK_SIZE, remaining))
+                        if not block:
+                            break
+                        hasher.update(block)
+                        remaining -= len(block)
+        return hasher
+
+    async def read_chunk(
+        self, size: int, monitor: SpeedMonitor | None
+    ) -> bytes:
+        """Read the next chunk of the stream, at most 'size' bytes. With a
+        monitor, raise SlowStreamError if the stream is too slow. A
+        dropped connection raises BrokenFileError, so the download
+        resumes from the .part file."""
+        read = self.video_stream.content.read(size)
+        try:
+            if monitor is None:
+                return await read
+            try:
+                chunk = await asyncio.wait_for(read, monitor.timeout())
+            except asyncio.TimeoutError:
+                raise SlowStreamError(
+                    f"Strumień nie przysłał danych przez {monitor.grace:g} s."
+                )
+        except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError):
+            raise BrokenFileError(
+                "Przerwano połączenie podczas pobierania"
+                f" '{self.title}.mp4'.",
+                truncated=True,
+            )
+        monitor.add(len(chunk))
+        return chunk
+
+    @timed
+    async def stream_file(
+        self, download_options: DownloadOptions, watch_speed: bool = True
+    ) -> None:
+        sink = self.sink
+        local = isinstance(sink, FileSink)
+        disk = download_options.disk if local else None
+        manifests = download_options.manifests if local else None
+        tuner = download_options.tuner
+        quality = download_options.quality
         block_size = 1024
+        device = None
+        if disk is not None:
+            device = await self.admit(disk)
+        hasher = None
+        if manifests is not None:
+            hasher = await self.get_hasher(manifests.algorithm)
         desc = f"{self.title}.mp4 [{self.resolution}]"
-        self.filepath.unlink(missing_ok=True)
-        assert self.ui.progbar_video
-        task_id = self.ui.progbar_video.add_task(
-            "download",
-            filename=desc,
-            total=self.resume_point + self.remaining_size,
-            completed=self.resume_point,
+        task_id = self.ui.add_task_video(
+            desc, self.resume_point + self.remaining_size, self.resume_point
         )
-        async with aiofiles.open(self.partial_filepath, "ab") as f:
-            async for chunk in self.video_stream.content.iter_chunked(
-                block_size * block_size
+        stream_start = time.perf_counter()
+        received = 0
+        monitor = None
+        if watch_speed and download_options.min_speed > 0:
+            monitor = SpeedMonitor(
+                download_options.min_speed, download_options.slow_grace
+            )
+        try:
+            size = self.resume_point + self.remaining_size
+            # The preallocated blocks are taken from the free space right
+            # away, so the reservation is not needed any more.
+            if await sink.open(size) and device is not None:
+                assert disk is not None
+                await disk.release(device, self.remaining_size)
+                device = None
+            # The next chunk is read only once the sink took this one, so
+            # a slow sink slows the stream down.
+            while chunk := await self.read_chunk(
+                block_size * block_size, monitor
             ):
-                await f.write(chunk)
-                self.ui.progbar_video.update(task_id, advance=len(chunk))
-        self.partial_filepath.rename(self.filepath)
-        self.ui.progbar_video.remove_task(task_id)
-        download_state.completed += 1
+                if not self.metrics.bytes:
+                    self.metrics.add(
+                        "ttfb", time.perf_counter() - self.stream_requested
+                    )
+                if hasher is not None:
+                    with self.metrics.measure("hash"):
+                        hasher.update(chunk)
+                with self.metrics.measure(sink.phase):
+                    await sink.write(chunk)
+                self.metrics.bytes += len(chunk)
+                received += len(chunk)
+                if tuner is not None:
+                    tuner.bytes += len(chunk)
+                if quality is not None:
+                    quality.downloaded += len(chunk)
+                self.ui.update_task_video(task_id, len(chunk))
+        finally:
+            await sink.close()
+            if device is not None:
+                assert disk is not None
+                await disk.release(device, self.remaining_size)
+            self.ui.remove_task_video(task_id)
+        self.metrics.add("stream", time.perf_counter() - stream_start)
+        if self.remaining_size and received != self.remaining_size:
+            # The sink keeps what it got, the next attempt resumes it.
+            raise BrokenFileError(
+                f"Pobrano {received} B z {self.remaining_size} B pliku"
+                f" '{self.title}.mp4'.",
+                truncated=True,
+            )
+        await sink.commit()
+        if manifests is not None and hasher is not None:
+            manifests.put(
+                self.filepath, manifests.algorithm, hasher.hexdigest()
+            )
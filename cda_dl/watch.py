@@ -0,0 +1,199 @@
+import asyncio
+import heapq
+import logging
+import random
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.error import HTTPError, ParserError
+from cda_dl.folder import Folder
+from cda_dl.journal import DONE_STATES
+from cda_dl.snapshot import FolderSnapshots
+from cda_dl.ui import UI
+from cda_dl.video import Video
+
+LOGGER = logging.getLogger(__name__)
+
+
+class WatchedFolder:
+    """A folder polled by the Watcher, with the videos seen in it so far."""
+
+    def __init__(
+        self,
+        url: str,
+        parent: Path,
+        first_page: dict[str, Any],
+        seen: set[str],
+        interval: float,
+    ) -> None:
+        self.url = url
+        self.parent = parent
+        self.directory = Path(parent, first_page["title"])
+        self.first_page = first_page
+        self.seen = seen
+        self.interval = interval
+
+
+class Watcher:
+    """Poll synced folders for new uploads and download only them.
+
+    New videos show up on the first page of a folder, so every poll reads
+    the first page, conditionally if the server sent an ETag, and the
+    following pages only while they hold nothing but new videos. A folder
+    that did not change is polled less and less often, up to 'max_backoff'
+    times the base interval; a change brings it back to the base
+    interval. Every interval is randomly spread by 'jitter', so folders do
+    not end up polled in bursts."""
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        ui: UI,
+        download_options: DownloadOptions,
+        download_state: DownloadState,
+        interval: float,
+        max_backoff: float = 16,
+        jitter: float = 0.1,
+    ) -> None:
+        assert download_options.snapshots is not None
+        self.session = session
+        self.ui = ui
+        self.download_options = download_options
+        self.download_state = download_state
+        self.snapshots: FolderSnapshots = download_options.snapshots
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.folders: dict[str, WatchedFolder] = {}
+        self.crawling: set[str] = set()
+        self.queue: list[tuple[float, str]] = []
+        self.tasks: set[asyncio.Task[None]] = set()
+
+    def add_tree(self, url: str, parent: Path) -> None:
+        """Watch the synced folder and all its subfolders."""
+        snapshot = self.snapshots.get(parent, url)
+        if snapshot is None or url in self.folders:
+            return
+        seen = {
+            video_url
+            for page in snapshot["pages"]
+            for video_url, *_ in page["videos"]
+        }
+        folder = WatchedFolder(
+            url, parent, snapshot["pages"][0], seen, self.interval
+        )
+        self.folders[url] = folder
+        self.schedule(folder)
+        for folder_url in folder.first_page["folders"]:
+            self.add_tree(folder_url, folder.directory)
+
+    def schedule(self, folder: WatchedFolder) -> None:
+        spread = random.uniform(1 - self.jitter, 1 + self.jitter)
+        due = asyncio.get_running_loop().time() + folder.interval * spread
+        heapq.heappush(self.queue, (due, folder.url))
+
+    async def run(self) -> None:
+        """Poll the folders until cancelled."""
+        LOGGER.info(
+            f"Obserwuję {len(self.folders)} folderów co {self.interval:g} s."
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            while self.queue:
+                due, url = heapq.heappop(self.queue)
+                await asyncio.sleep(max(0, due - loop.time()))
+                folder = self.folders[url]
+                try:
+                    changed = await self.poll(folder)
+                except (HTTPError, ParserError) as e:
+                    LOGGER.warning(e)
+                    changed = False
+                if changed:
+                    folder.interval = self.interval
+                else:
+                    folder.interval = min(
+                        folder.interval * 1.5, self.interval * self.max_backoff
+                    )
+                self.schedule(folder)
+        finally:
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def poll(self, folder: WatchedFolder) -> bool:
+        """Queue the videos and subfolders that are new in the folder."""
+        f = Folder(folder.url, self.session, self.ui)
+        first = await f.get_page(1, folder.first_page)
+        assert first is not None
+        if first["hash"] == folder.first_page["hash"]:
+            return False
+        folder.first_page = first
+        new_videos: list[str] = []
+        page: dict[str, Any] | None = first
+        number = 1
+        while page is not None:
+            fresh = [
+                video_url
+                for video_url, *_ in page["videos"]
+                if video_url not in folder.seen
+            ]
+            new_videos += fresh
+            if not fresh or len(fresh) < len(page["videos"]):
+                break
+            number += 1
+            page = await f.get_page(number, None)
+        new_folders = [
+            folder_url
+            for folder_url in first["folders"]
+            if folder_url not in self.folders
+            and folder_url not in self.crawling
+        ]
+        if new_videos or new_folders:
+            LOGGER.info(
+                f"Nowe w folderze {first['title']}: {len(new_videos)} filmów,"
+                f" {len(new_folders)} folderów."
+            )
+        for video_url in new_videos:
+            folder.seen.add(video_url)
+            self.start(self.download_video(folder, video_url))
+        for folder_url in new_folders:
+            self.crawling.add(folder_url)
+            self.start(self.download_folder(folder, folder_url))
+        return True
+
+    def start(self, coro: Any) -> None:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def download_video(self, folder: WatchedFolder, url: str) -> None:
+        if self.ui.progbar_video is None:
+            self.ui.set_progress_bar_video("bold blue")
+            self.ui.add_row_video("green")
+        video = Video(url, self.session, self.ui)
+        self.ui.video_queued(url)
+        await video.download_video(
+            self.download_options.with_directory(folder.directory),
+            self.download_state,
+        )
+        snapshot = self.snapshots.get(folder.parent, folder.url)
+        if snapshot is not None and video.metrics.status in DONE_STATES:
+            snapshot["done"].append(url)
+            self.snapshots.put(folder.parent, folder.url, snapshot)
+
+    async def download_folder(self, folder: WatchedFolder, url: str) -> None:
+        try:
+            await Folder(url, self.session, self.ui).download_folder(
+                self.download_options.with_directory(folder.directory),
+                self.download_state,
+            )
+        except (ParserError, HTTPError) as e:
+            LOGGER.warning(e)
+        else:
+            self.add_tree(url, folder.directory)
+        finally:
+            self.crawling.discard(url)
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from pathlib import Path, PurePosixPath
+from typing import AsyncIterator
+
+import aiohttp
+
+from cda_dl.batch import run_bounded
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.error import HTTPError, ParserError
+from cda_dl.folder import Folder
+from cda_dl.jobqueue import Job, JobQueue, JobRow
+from cda_dl.ui import UI
+from cda_dl.utils import classify_url, get_folder_match
+from cda_dl.video import Video
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_folder_key(url: str) -> str:
+    """Key a folder url by the folder and the page its listing starts
+    from, as Folder reads it, so '.../folder/1' given as an argument and
+    '.../folder/1/1/' found as a subfolder are the same job."""
+    match = get_folder_match(url)
+    if match is None:
+        return url.rstrip("/")
+    path = match.group(1).split("cda.pl/", 1)[-1]
+    return f"cda.pl/{path}/{match.group(2) or 1}"
+
+
+def get_queue_job(
+    url: str,
+    directory: str = "",
+    title: str | None = None,
+    duration: int | None = None,
+) -> JobRow | None:
+    """Get the queue job of a video or folder url, keyed by the video id
+    or the folder, or None for an unknown url."""
+    classified = classify_url(url)
+    if classified is None:
+        return None
+    kind, url = classified
+    key = url if kind == "video" else get_folder_key(url)
+    return (key, kind, url, directory, title, duration)
+
+
+class QueueWorker:
+    """Download the jobs of a JobQueue shared with other workers, at most
+    -t at a time, until no job is pending or leased by anyone.
+
+    A folder job lists the folder and queues its videos and subfolders as
+    jobs of their own, so the videos of one folder are spread over all
+    the workers. The directories of the jobs are relative to the target
+    directory of every worker, which may be mounted elsewhere on each
+    host. The leases of the running jobs are renewed every third of the
+    lease; a job whose lease was taken over by another worker is
+    cancelled."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        session: aiohttp.ClientSession,
+        ui: UI,
+        download_options: DownloadOptions,
+        download_state: DownloadState,
+        poll: float = 1.0,
+    ) -> None:
+        self.queue = queue
+        self.session = session
+        self.ui = ui
+        self.download_options = download_options
+        self.download_state = download_state
+        self.poll = poll
+        self.running: dict[int, asyncio.Task[None]] = {}
+        self.lost: set[int] = set()
+
+    async def run(self) -> None:
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            await run_bounded(
+                self.claim_jobs(),
+                self.run_job,
+                self.download_options.nthreads,
+            )
+        finally:
+            heartbeat.cancel()
+        counts = await asyncio.to_thread(self.queue.counts)
+        LOGGER.info(
+            f"Kolejka {self.queue.path}: ukończono {counts.get('done', 0)}"
+            f" zadań, nieudanych: {counts.get('failed', 0)}."
+        )
+
+    async def claim_jobs(self) -> AsyncIterator[Job]:
+        """Lease jobs as long as there are any; wait for the jobs of other
+        workers, which may queue more videos, until all are finished."""
+        while True:
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is not None:
+                yield job
+                continue
+            if not self.running and await asyncio.to_thread(
+                self.queue.is_finished
+            ):
+                return
+            await asyncio.sleep(self.poll)
+
+    async def heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.queue.lease / 3)
+            lost = await asyncio.to_thread(
+                self.queue.heartbeat, list(self.running)
+            )
+            for job_id in lost:
+                task = self.running.get(job_id)
+                if task is not None:
+                    self.lost.add(job_id)
+                    LOGGER.warning("Utracono dzierżawę zadania. Przerywam ...")
+                    task.cancel()
+
+    async def run_job(self, job: Job) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self.running[job.id] = task
+        try:
+            if job.kind == "folder":
+                await self.run_folder(job)
+            else:
+                await self.run_video(job)
+        except asyncio.CancelledError:
+            # The worker that took the lost lease over finishes the job.
+            if job.id not in self.lost:
+                raise
+        finally:
+            self.running.pop(job.id, None)
+            self.lost.discard(job.id)
+
+    def get_directory(self, job: Job) -> Path:
+        return Path(self.download_options.directory, job.directory)
+
+    async def run_folder(self, job: Job) -> None:
+        """List every page of the folder and queue its subfolders and
+        videos."""
+        folder = Folder(job.url, self.session, self.ui)
+        try:
+            async with self.download_options.semaphore:
+                folder.soup = await folder.get_soup()
+                title = await folder.get_folder_title()
+                subfolders = await folder.get_subfolders()
+                del folder.soup
+                entries = await folder.get_videos_from_folder()
+        except (ParserError, HTTPError) as e:
+            LOGGER.warning(e)
+            await asyncio.to_thread(self.queue.retry, job, str(e))
+            return
+        directory = str(PurePosixPath(job.directory, title))
+        jobs = [
+            get_queue_job(subfolder.url, directory) for subfolder in subfolders
+        ]
+        jobs += [
+            get_queue_job(entry.url, directory, entry.title, entry.duration)
+            for entry in entries
+        ]
+        added = await asyncio.to_thread(self.queue.add, filter(None, jobs))
+        await asyncio.to_thread(self.queue.finish, job, "done")
+        LOGGER.info(f"Folder '{title}': dodano {added} zadań do kolejki.")
+
+    async def run_video(self, job: Job) -> None:
+        """Download the video; a failed video goes back to the queue, to
+        be tried again by any worker."""
+        directory = self.get_directory(job)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.ui.video_queued(job.url)
+        video = Video(job.url, self.session, self.ui, job.title, job.duration)
+        await video.download_video(
+            self.download_options.with_directory(directory),
+            self.download_state,
+        )
+        if video.metrics.status == "failed":
+            await asyncio.to_thread(
+                self.queue.retry, job, video.metrics.reason or "failed"
+            )
+        else:
+            await asyncio.to_thread(self.queue.finish, job, "done")
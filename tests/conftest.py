@@ -0,0 +1,23 @@
+import os
+import sys
+from typing import AsyncIterator
+
+import pytest_asyncio
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from fake_cda import FakeCda, FakeFolder, make_videos
+
+
+@pytest_asyncio.fixture
+async def fake_cda() -> AsyncIterator[FakeCda]:
+    """Fake cda.pl with a few videos and a two-level folder tree."""
+    folder = FakeFolder(
+        "user",
+        1,
+        "Folder",
+        make_videos(5, prefix="f"),
+        [FakeFolder("user", 2, "Podfolder", make_videos(3, prefix="s"))],
+        per_page=2,
+    )
+    async with FakeCda(make_videos(3), [folder]) as cda:
+        yield cda
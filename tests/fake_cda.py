@@ -0,0 +1,428 @@
+"""Local stand-in for cda.pl used by the offline tests and the benchmarks.
+
+It serves video pages with 'player_data', paginated folder pages, the
+'videoGetLink' JSON-RPC endpoint and range-capable MP4 bodies, with
+configurable latency, bandwidth, 429 injection and connection drops.
+
+Every host name resolves to the fake server, so URLs look like the real
+ones, only with plain http:
+
+    async with FakeCda(videos=make_videos(10)) as cda:
+        async with cda.session() as session:
+            await Video(cda.video_url("v1"), session, UI()).download_video(...)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import html
+import json
+import socket
+import struct
+import time
+from collections import Counter
+from typing import Any, AsyncIterator
+
+import aiohttp
+from aiohttp import web
+from aiohttp.abc import AbstractResolver, ResolveResult
+
+BASE_URL = "http://www.cda.pl"
+MEDIA_URL = "http://vwaw001.cda.pl"
+
+# Fraction of the best quality size served for each quality.
+QUALITIES = {"360p": "vl", "480p": "lq", "720p": "sd", "1080p": "hd"}
+QUALITY_SCALE = {"360p": 0.25, "480p": 0.4, "720p": 0.6, "1080p": 1.0}
+
+# ftyp + moov boxes in front of the mdat box of every served file.
+MP4_HEADER = struct.pack(">I4s4sI8s", 24, b"ftyp", b"isom", 512, b"isomiso2")
+MP4_HEADER += struct.pack(">I4s", 64, b"moov") + bytes(56)
+MP4_OVERHEAD = len(MP4_HEADER) + 8
+CHUNK_SIZE = 64 * 1024
+
+
+class FakeVideo:
+    def __init__(
+        self,
+        video_id: str,
+        title: str,
+        size: int = 256 * 1024,
+        qualities: tuple[str, ...] = ("360p", "480p", "720p"),
+        duration: int = 600,
+    ) -> None:
+        self.video_id = video_id
+        self.title = title
+        self.qualities = {q: QUALITIES[q] for q in qualities}
+        self.duration = duration
+        best = max(QUALITY_SCALE[q] for q in qualities)
+        self.sizes = {
+            q: max(int(size * QUALITY_SCALE[q] / best), MP4_OVERHEAD + 1)
+            for q in qualities
+        }
+        self.pattern = hashlib.sha256(video_id.encode()).digest() * (
+            CHUNK_SIZE // 32
+        )
+
+    def size(self, cda_quality: str) -> int:
+        for q, code in self.qualities.items():
+            if code == cda_quality:
+                return self.sizes[q]
+        raise KeyError(cda_quality)
+
+    def body(self, size: int, start: int, end: int) -> AsyncIterator[bytes]:
+        """Bytes [start, end) of a valid MP4 file of the given size."""
+        header = MP4_HEADER + struct.pack(
+            ">I4s", size - len(MP4_HEADER), b"mdat"
+        )
+
+        async def chunks() -> AsyncIterator[bytes]:
+            pos = start
+            while pos < end:
+                if pos < len(header):
+                    chunk = header[pos:end][: len(header) - pos]
+                else:
+                    offset = (pos - len(header)) % CHUNK_SIZE
+                    chunk = self.pattern[offset:][: end - pos]
+                pos += len(chunk)
+                yield chunk
+
+        return chunks()
+
+
+class FakeFolder:
+    def __init__(
+        self,
+        user: str,
+        folder_id: int,
+        title: str,
+        videos: list[FakeVideo] | None = None,
+        folders: list[FakeFolder] | None = None,
+        per_page: int = 36,
+    ) -> None:
+        self.user = user
+        self.folder_id = folder_id
+        self.title = title
+        self.videos = videos or []
+        self.folders = folders or []
+        self.per_page = per_page
+
+    @property
+    def url(self) -> str:
+        return f"{BASE_URL}/{self.user}/folder/{self.folder_id}"
+
+    def page(self, number: int) -> list[FakeVideo]:
+        start = (number - 1) * self.per_page
+        return self.videos[start:][: self.per_page]
+
+    def walk(self) -> list[FakeFolder]:
+        folders = [self]
+        for folder in self.folders:
+            folders += folder.walk()
+        return folders
+
+
+def make_videos(
+    count: int, size: int = 256 * 1024, prefix: str = "v"
+) -> list[FakeVideo]:
+    return [
+        FakeVideo(f"{prefix}{i}", f"Film {prefix} {i}", size)
+        for i in range(1, count + 1)
+    ]
+
+
+class FakeResolver(AbstractResolver):
+    """Resolve every host name to the fake server."""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+
+    async def resolve(
+        self,
+        host: str,
+        port: int = 0,
+        family: socket.AddressFamily = socket.AF_INET,
+    ) -> list[ResolveResult]:
+        return [
+            {
+                "hostname": host,
+                "host": "127.0.0.1",
+                "port": self.port,
+                "family": socket.AF_INET,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST,
+            }
+        ]
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeCda:
+    def __init__(
+        self,
+        videos: list[FakeVideo] | None = None,
+        folders: list[FakeFolder] | None = None,
+        latency: float = 0.0,
+        bandwidth: float | None = None,
+        rate_limit_every: int = 0,
+        drop_after: int | None = None,
+        drops: int = 1,
+        batch_rpc: bool = True,
+        batch_html: int | None = None,
+        link_ttl: int = 3600,
+        etags: bool = False,
+        slow_links: int = 0,
+        slow_bandwidth: float = 16 * 1024,
+    ) -> None:
+        """
+        latency: delay in seconds before every response
+        bandwidth: bytes per second of every media stream
+        rate_limit_every: answer every n-th page or RPC request with 429
+        drop_after: close media connections after that many bytes...
+        drops: ...at most that many times per file
+        batch_rpc: accept JSON-RPC batch arrays
+        batch_html: answer batch arrays with an HTML page of that status
+        link_ttl: lifetime of the signed media links in seconds
+        etags: send ETags with folder pages and answer If-None-Match
+        slow_links: the first n links resolved for every video point to a
+            slow CDN node...
+        slow_bandwidth: ...serving that many bytes per second
+        """
+        self.videos = {v.video_id: v for v in videos or []}
+        self.folders = {}
+        for root in folders or []:
+            for folder in root.walk():
+                self.folders[folder.folder_id] = folder
+                for video in folder.videos:
+                    self.videos[video.video_id] = video
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.rate_limit_every = rate_limit_every
+        self.drop_after = drop_after
+        self.drops: Counter[str] = Counter()
+        self.max_drops = drops
+        self.batch_rpc = batch_rpc
+        self.batch_html = batch_html
+        self.link_ttl = link_ttl
+        self.etags = etags
+        self.slow_links = slow_links
+        self.slow_bandwidth = slow_bandwidth
+        self.resolved: Counter[str] = Counter()
+        self.requests: Counter[str] = Counter()
+        self.counted_requests = 0
+        self.limited_requests = 0
+        self.port = 0
+        self.runner: web.AppRunner | None = None
+
+    async def __aenter__(self) -> FakeCda:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/video/{video_id}", self.video_page)
+        app.router.add_post("/video/{video_id}", self.rpc)
+        app.router.add_get(
+            "/{user}/folder/{folder_id:\\d+}/{page:\\d+}/", self.folder_page
+        )
+        app.router.add_get("/media/{video_id}/{quality}.mp4", self.media)
+        self.runner = web.AppRunner(app, handle_signals=False)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        assert self.runner
+        await self.runner.cleanup()
+
+    def session(self, **kwargs: Any) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(resolver=FakeResolver(self.port))
+        return aiohttp.ClientSession(connector=connector, **kwargs)
+
+    def upload(self, folder: FakeFolder, video: FakeVideo) -> None:
+        """Add a new video on top of the folder, like a fresh upload."""
+        folder.videos.insert(0, video)
+        self.videos[video.video_id] = video
+
+    def video_url(self, video_id: str) -> str:
+        return f"{BASE_URL}/video/{video_id}"
+
+    def media_url(self, video: FakeVideo, cda_quality: str) -> str:
+        expires = int(time.time()) + self.link_ttl
+        self.resolved[video.video_id] += 1
+        node = (
+            "slow" if self.resolved[video.video_id] <= self.slow_links else ""
+        )
+        return (
+            f"{MEDIA_URL}/media/{video.video_id}/{cda_quality}.mp4"
+            f"?st=token&e={expires}&node={node}"
+        )
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler: Any) -> Any:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit_every and not request.path.startswith("/media"):
+            self.counted_requests += 1
+            if self.counted_requests % self.rate_limit_every == 0:
+                self.limited_requests += 1
+                raise web.HTTPTooManyRequests()
+        return await handler(request)
+
+    def get_video(self, request: web.Request) -> FakeVideo:
+        video = self.videos.get(request.match_info["video_id"])
+        if video is None:
+            raise web.HTTPNotFound()
+        return video
+
+    async def video_page(self, request: web.Request) -> web.Response:
+        self.requests["video_page"] += 1
+        if "Range" in request.headers:
+            self.requests["ranged_page"] += 1
+        video = self.get_video(request)
+        player_data = {
+            "id": video.video_id,
+            "video": {
+                "id": video.video_id,
+                "file": "",
+                "qualities": video.qualities,
+                "quality": next(iter(video.qualities.values())),
+                "ts": 1700000000,
+                "hash2": hashlib.md5(video.video_id.encode()).hexdigest(),
+                "duration": video.duration,
+            },
+        }
+        body = (
+            "<html><body>"
+            f"<h1>{html.escape(video.title)}</h1>"
+            f'<div id="mediaplayer{video.video_id}"'
+            f' player_data="{html.escape(json.dumps(player_data))}"></div>'
+            "</body></html>"
+        )
+        return web.Response(text=body, content_type="text/html")
+
+    async def rpc(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if isinstance(payload, list):
+            self.requests["rpc_batch"] += 1
+            if self.batch_html is not None:
+                return web.Response(
+                    status=self.batch_html,
+                    text="<html><body>Bad Request</body></html>",
+                    content_type="text/html",
+                )
+            if not self.batch_rpc:
+                return web.json_response(
+                    {"jsonrpc": "2.0", "error": {"code": -32600}, "id": None}
+                )
+            return web.json_response([self.rpc_call(c) for c in payload])
+        self.requests["rpc"] += 1
+        return web.json_response(self.rpc_call(payload))
+
+    def rpc_call(self, call: dict[str, Any]) -> dict[str, Any]:
+        video_id, cda_quality = call["params"][0], call["params"][1]
+        video = self.videos.get(video_id)
+        if video is None or cda_quality not in video.qualities.values():
+            return {"jsonrpc": "2.0", "id": call["id"], "error": {}}
+        return {
+            "jsonrpc": "2.0",
+            "id": call["id"],
+            "result": {
+                "status": "ok",
+                "resp": self.media_url(video, cda_quality),
+            },
+        }
+
+    async def folder_page(self, request: web.Request) -> web.Response:
+        self.requests["folder_page"] += 1
+        folder = self.folders.get(int(request.match_info["folder_id"]))
+        page = int(request.match_info["page"])
+        if folder is None or request.match_info["user"] != folder.user:
+            raise web.HTTPNotFound()
+        videos = folder.page(page)
+        if page > 1 and not videos:
+            raise web.HTTPNotFound()
+        parts = [
+            "<html><body>",
+            '<span class="folder-one-line">'
+            f'<a href="{BASE_URL}/{folder.user}">{folder.user}</a></span>',
+            '<span class="folder-one-line">'
+            f'<a href="{folder.url}">{html.escape(folder.title)}</a></span>',
+        ]
+        for sub in folder.folders:
+            parts.append(
+                f'<a href="{sub.url}" class="object-folder"'
+                f' data-foldery_id="{sub.folder_id}">'
+                f"{html.escape(sub.title)}</a>"
+            )
+        for video in videos:
+            title = html.escape(video.title)
+            minutes, seconds = divmod(video.duration, 60)
+            parts.append(
+                '<div class="list-when-small tip">'
+                '<span class="wrapper-thumb-link">'
+                f'<a href="/video/{video.video_id}" class="thumbnail-link">'
+                f'<img alt="{title}" title="{title}">'
+                f'<span class="time-thumb-fold">{minutes}:{seconds:02}</span>'
+                "</a></span>"
+                f'<a href="/video/{video.video_id}" class="link-title-visit">'
+                f"{title}</a></div>"
+            )
+        parts.append("</body></html>")
+        text = "".join(parts)
+        if not self.etags:
+            return web.Response(text=text, content_type="text/html")
+        etag = hashlib.sha1(text.encode()).hexdigest()
+        if request.headers.get("If-None-Match") == f'"{etag}"':
+            self.requests["not_modified"] += 1
+            return web.Response(status=304, headers={"ETag": f'"{etag}"'})
+        response = web.Response(text=text, content_type="text/html")
+        response.etag = etag
+        return response
+
+    async def media(self, request: web.Request) -> web.StreamResponse:
+        self.requests["media"] += 1
+        video = self.get_video(request)
+        try:
+            size = video.size(request.match_info["quality"])
+        except KeyError:
+            raise web.HTTPNotFound()
+        start, end = 0, size
+        status = 200
+        if "Range" in request.headers:
+            first, _, last = request.headers["Range"][6:].partition("-")
+            start = int(first)
+            end = int(last) + 1 if last else size
+            if start >= size:
+                raise web.HTTPRequestRangeNotSatisfiable()
+            status = 206
+        response = web.StreamResponse(status=status)
+        response.content_length = end - start
+        response.content_type = "video/mp4"
+        response.headers["Accept-Ranges"] = "bytes"
+        if status == 206:
+            response.headers["Content-Range"] = (
+                f"bytes {start}-{end - 1}/{size}"
+            )
+        await response.prepare(request)
+        if request.method == "HEAD":
+            return response
+        drop = (
+            self.drop_after is not None
+            and self.drops[request.path] < self.max_drops
+        )
+        bandwidth = self.bandwidth
+        if request.query.get("node") == "slow":
+            bandwidth = self.slow_bandwidth
+        sent = 0
+        async for chunk in video.body(size, start, end):
+            if drop and sent + len(chunk) > self.drop_after:  # type: ignore
+                self.drops[request.path] += 1
+                assert request.transport
+                request.transport.close()
+                return response
+            await response.write(chunk)
+            sent += len(chunk)
+            if bandwidth:
+                await asyncio.sleep(len(chunk) / bandwidth)
+        await response.write_eof()
+        return response
@@ -0,0 +1,184 @@
+"""Local stand-in for an S3-compatible object store, like MinIO, used by
+the sink tests.
+
+It checks the Signature Version 4 of every request against what it
+received, and serves the multipart upload calls:
+
+    async with FakeS3() as s3:
+        target = S3Target(s3.bucket(), "films/")
+        ...
+        assert s3.objects["films/Film.mp4"] == ...
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import re
+import uuid
+from typing import Any
+from xml.etree import ElementTree
+
+from aiohttp import web
+
+from cda_dl.s3 import S3Bucket, get_signature
+
+ACCESS_KEY = "AKIAFAKE"
+SECRET_KEY = "fake/secret"
+REGION = "eu-central-1"
+BUCKET = "videos"
+
+
+def error(status: int, code: str) -> web.Response:
+    return web.Response(
+        status=status,
+        content_type="application/xml",
+        text=f"<Error><Code>{code}</Code><Message>{code}</Message></Error>",
+    )
+
+
+class FakeS3:
+    def __init__(
+        self,
+        min_part_size: int = 0,
+        latency: float = 0.0,
+        fail_parts: int | None = None,
+    ) -> None:
+        """
+        min_part_size: the least size of every part but the last one
+        latency: delay in seconds before answering an uploaded part
+        fail_parts: answer uploaded parts with that status
+        """
+        self.min_part_size = min_part_size
+        self.latency = latency
+        self.fail_parts = fail_parts
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.aborted = 0
+        self.uploading = 0
+        self.max_uploading = 0
+        self.port = 0
+        self.runner: web.AppRunner | None = None
+
+    async def __aenter__(self) -> FakeS3:
+        app = web.Application()
+        app.router.add_route("*", "/{bucket}/{key:.+}", self.handle)
+        self.runner = web.AppRunner(app, handle_signals=False)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        assert self.runner
+        await self.runner.cleanup()
+
+    def bucket(self, part_size: int = 64 * 1024) -> S3Bucket:
+        return S3Bucket(
+            BUCKET,
+            ACCESS_KEY,
+            SECRET_KEY,
+            REGION,
+            f"http://127.0.0.1:{self.port}",
+            part_size=part_size,
+        )
+
+    def is_signed(self, request: web.Request, body: bytes) -> bool:
+        match = re.fullmatch(
+            r"AWS4-HMAC-SHA256 Credential=([^/]+)/(\d{8})/([^/]+)/s3/"
+            r"aws4_request, SignedHeaders=([^,]+), Signature=([0-9a-f]+)",
+            request.headers.get("Authorization", ""),
+        )
+        if match is None or match.group(1) != ACCESS_KEY:
+            return False
+        names = match.group(4).split(";")
+        if "host" not in names or any(n not in request.headers for n in names):
+            return False
+        headers = {name: request.headers[name] for name in names}
+        if headers["x-amz-content-sha256"] != hashlib.sha256(body).hexdigest():
+            return False
+        signature, _ = get_signature(
+            request.method,
+            request.raw_path.partition("?")[0],
+            dict(request.query),
+            headers,
+            SECRET_KEY,
+            match.group(3),
+        )
+        return signature == match.group(5)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if not self.is_signed(request, body):
+            return error(403, "SignatureDoesNotMatch")
+        if request.match_info["bucket"] != BUCKET:
+            return error(404, "NoSuchBucket")
+        key = request.match_info["key"]
+        query = request.query
+        if request.method == "POST" and "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            return web.Response(
+                content_type="application/xml",
+                text=(
+                    "<InitiateMultipartUploadResult"
+                    ' xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                    f"<Bucket>{BUCKET}</Bucket><Key>{key}</Key>"
+                    f"<UploadId>{upload_id}</UploadId>"
+                    "</InitiateMultipartUploadResult>"
+                ),
+            )
+        parts = self.uploads.get(query.get("uploadId", ""))
+        if parts is None:
+            return error(404, "NoSuchUpload")
+        if request.method == "PUT":
+            return await self.upload_part(
+                parts, int(query["partNumber"]), body
+            )
+        if request.method == "POST":
+            return self.complete(key, query["uploadId"], body)
+        if request.method == "DELETE":
+            del self.uploads[query["uploadId"]]
+            self.aborted += 1
+            return web.Response(status=204)
+        return error(405, "MethodNotAllowed")
+
+    async def upload_part(
+        self, parts: dict[int, bytes], number: int, body: bytes
+    ) -> web.Response:
+        self.uploading += 1
+        self.max_uploading = max(self.max_uploading, self.uploading)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.uploading -= 1
+        if self.fail_parts is not None:
+            return error(self.fail_parts, "InternalError")
+        parts[number] = body
+        etag = hashlib.md5(body).hexdigest()
+        return web.Response(headers={"ETag": f'"{etag}"'})
+
+    def complete(self, key: str, upload_id: str, body: bytes) -> web.Response:
+        parts = self.uploads[upload_id]
+        listed = [
+            (int(part.findtext("PartNumber", "")), part.findtext("ETag"))
+            for part in ElementTree.fromstring(body).iter("Part")
+        ]
+        if [number for number, _ in listed] != sorted(parts):
+            return error(400, "InvalidPartOrder")
+        for i, (number, etag) in enumerate(listed):
+            data = parts[number]
+            if etag != f'"{hashlib.md5(data).hexdigest()}"':
+                return error(400, "InvalidPart")
+            if i < len(listed) - 1 and len(data) < self.min_part_size:
+                return error(400, "EntityTooSmall")
+        self.objects[key] = b"".join(parts[number] for number, _ in listed)
+        del self.uploads[upload_id]
+        return web.Response(
+            content_type="application/xml",
+            text=(
+                "<CompleteMultipartUploadResult>"
+                f"<Key>{key}</Key></CompleteMultipartUploadResult>"
+            ),
+        )
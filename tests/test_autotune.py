@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeFolder, make_videos
+
+from cda_dl.autotune import AdaptiveSemaphore, ConcurrencyTuner
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.folder import Folder
+from cda_dl.ui import UI
+
+
+def test_decide() -> None:
+    tuner = ConcurrencyTuner(AdaptiveSemaphore(3), minimum=1, maximum=5)
+    tuner.saturated = True
+    steps = [
+        # (throughput, errors, 429 responses, next limit)
+        (100, 0, 0, 4),
+        (200, 0, 0, 5),
+        (300, 0, 0, 5),
+        # No gain at the upper bound, so go down...
+        (300, 0, 0, 4),
+        # ...and back up when that is worse.
+        (250, 0, 0, 5),
+        (250, 0, 2, 2),
+        (250, 1, 0, 1),
+    ]
+    for throughput, errors, rate_limited, limit in steps:
+        assert tuner.decide(throughput, errors, rate_limited) == limit
+        tuner.semaphore.limit = limit
+    # Nothing waits for the semaphore, so there is no point in growing.
+    tuner.saturated = False
+    assert tuner.direction == -1
+    assert tuner.decide(100, 0, 0) == 1
+    assert tuner.direction == 1
+
+
+@pytest.mark.asyncio
+async def test_adaptive_semaphore() -> None:
+    semaphore = AdaptiveSemaphore(1)
+    running = 0
+    peak = 0
+
+    async def hold() -> None:
+        nonlocal running, peak
+        async with semaphore:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+
+    tasks = [asyncio.create_task(hold()) for _ in range(6)]
+    await asyncio.sleep(0.01)
+    assert peak == 1 and semaphore.waiting == 5
+    await semaphore.set_limit(3)
+    await asyncio.gather(*tasks)
+    assert peak == 3
+    assert semaphore.active == 0
+
+
+@pytest.mark.asyncio
+async def test_autotune_folder(tmp_path: Path) -> None:
+    folder = FakeFolder("user", 1, "A", make_videos(24, size=256 * 1024))
+    download_options = DownloadOptions(directory=tmp_path, nthreads=8)
+    semaphore = AdaptiveSemaphore(1)
+    download_options.semaphore = semaphore
+    tuner = ConcurrencyTuner(semaphore, 1, 8, interval=0.2)
+    download_options.tuner = tuner
+    download_state = DownloadState()
+    # Every stream is slow on its own, so more streams download faster.
+    async with FakeCda(folders=[folder], bandwidth=1024**2) as cda:
+        tuning = asyncio.create_task(tuner.run())
+        async with cda.session() as session:
+            await Folder(folder.url, session, UI()).download_folder(
+                download_options, download_state
+            )
+        tuning.cancel()
+    assert download_state.completed == 24
+    assert semaphore.limit > 1
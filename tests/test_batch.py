@@ -0,0 +1,154 @@
+import asyncio
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import AsyncIterator
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, make_videos
+
+from cda_dl.batch import UrlFilter, read_urls, run_bounded
+from cda_dl.download_options import DownloadOptions
+from cda_dl.downloader import Downloader
+from cda_dl.error import ResolutionError
+from cda_dl.ui import UI
+from cda_dl.utils import classify_url
+
+
+def test_classify_url() -> None:
+    forms = [
+        "https://www.cda.pl/video/7779552a9",
+        "https://www.cda.pl/video/7779552a9/vfilm",
+        "https://ebd.cda.pl/620x368/7779552a9",
+        "https://cda.pl/1280x720/7779552a9",
+    ]
+    assert {classify_url(url) for url in forms} == {
+        ("video", "https://www.cda.pl/video/7779552a9")
+    }
+    folder = "https://www.cda.pl/user/folder/123/2"
+    assert classify_url(folder) == ("folder", folder)
+    assert classify_url("https://www.cda.pl/user/folder-glowny") == (
+        "folder",
+        "https://www.cda.pl/user/folder-glowny",
+    )
+    assert classify_url("https://example.com/video/1") is None
+
+
+def test_url_filter() -> None:
+    url_filter = UrlFilter()
+    assert url_filter.add("https://www.cda.pl/user/folder/1")
+    assert not url_filter.add("https://www.cda.pl/user/folder/1/")
+    assert url_filter.add("https://www.cda.pl/user/folder/2")
+    assert url_filter.repeated == 1
+
+
+@pytest.mark.asyncio
+async def test_read_urls(tmp_path: Path) -> None:
+    path = tmp_path / "urls.txt"
+    path.write_bytes(b"# lista\r\nhttps://a\n\n  https://b  \r\nhttps://c")
+    assert [url async for url in read_urls(str(path))] == [
+        "https://a",
+        "https://b",
+        "https://c",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_read_urls_from_pipe(tmp_path: Path) -> None:
+    fifo = tmp_path / "urls"
+    os.mkfifo(fifo)
+    more = threading.Event()
+
+    def write() -> None:
+        with open(fifo, "wb", buffering=0) as f:
+            f.write(b"https://a\nhttps://")
+            more.wait(5)
+            f.write(b"b\n")
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    urls = read_urls(str(fifo))
+    # The first url comes before the writer is done.
+    assert await asyncio.wait_for(urls.__anext__(), 5) == "https://a"
+    more.set()
+    assert [url async for url in urls] == ["https://b"]
+    await asyncio.to_thread(writer.join)
+
+
+@pytest.mark.asyncio
+async def test_run_bounded() -> None:
+    taken = 0
+    running = 0
+    most_running = 0
+    most_ahead = 0
+    done = 0
+
+    async def items() -> AsyncIterator[int]:
+        nonlocal taken
+        for i in range(50):
+            taken += 1
+            yield i
+
+    async def worker(item: int) -> None:
+        nonlocal running, most_running, most_ahead, done
+        running += 1
+        most_running = max(most_running, running)
+        most_ahead = max(most_ahead, taken - done)
+        await asyncio.sleep(0.001 * (item % 3))
+        running -= 1
+        done += 1
+
+    await run_bounded(items(), worker, 4)
+    assert done == 50
+    assert most_running == 4
+    # The items are read only as fast as the workers take them.
+    assert most_ahead <= 4
+
+
+@pytest.mark.asyncio
+async def test_run_bounded_error() -> None:
+    async def items() -> AsyncIterator[int]:
+        for i in range(10):
+            yield i
+
+    async def worker(item: int) -> None:
+        if item == 3:
+            raise ValueError(item)
+
+    with pytest.raises(ValueError):
+        await run_bounded(items(), worker, 2)
+
+
+@pytest.mark.asyncio
+async def test_probed_videos_use_normalized_urls() -> None:
+    downloader = Downloader.__new__(Downloader)
+    downloader.urls = ["http://www.cda.pl/video/v1/tytul-filmu"]
+    downloader.download_options = DownloadOptions(resolution="480p")
+    downloader.probed = {}
+    downloader.crawl_threads = 1
+    downloader.ui = UI()
+    async with FakeCda(make_videos(1)) as cda:
+        async with cda.session() as session:
+            await downloader.check_valid_resolution(session)
+    url = "http://www.cda.pl/video/v1"
+    assert list(downloader.probed) == [url]
+    assert downloader.probed[url].url == url
+
+
+@pytest.mark.asyncio
+async def test_invalid_resolution_names_given_url() -> None:
+    url = "http://www.cda.pl/video/v1/tytul-filmu"
+    downloader = Downloader.__new__(Downloader)
+    downloader.urls = [url]
+    downloader.download_options = DownloadOptions(resolution="1080p")
+    downloader.probed = {}
+    downloader.crawl_threads = 1
+    downloader.ui = UI()
+    async with FakeCda(make_videos(1)) as cda:
+        async with cda.session() as session:
+            with pytest.raises(ResolutionError) as e:
+                await downloader.check_valid_resolution(session)
+    assert str(e.value) == f"1080p rozdzielczość nie jest dostępna dla {url}"
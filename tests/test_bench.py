@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+from bench_download import run_scenario
+
+
+def get_args(**kwargs: object) -> argparse.Namespace:
+    args = argparse.Namespace(
+        size=1024**2,
+        threads=3,
+        latency=0.0,
+        bandwidth=None,
+        rate_limit_every=0,
+        drop_after=None,
+        drops=1,
+        memory=False,
+    )
+    vars(args).update(kwargs)
+    return args
+
+
+@pytest.mark.asyncio
+async def test_dropped_connections_resume() -> None:
+    result = await run_scenario(get_args(drop_after=200 * 1024), 3)
+    assert "error" not in result
+    assert (result["completed"], result["failed"]) == (3, 0)
+    assert result["dropped"] == 3
+    # Every video is streamed once more, from where it was cut.
+    assert result["requests"]["media"] == 6
+
+
+@pytest.mark.asyncio
+async def test_videos_dropped_too_often_fail() -> None:
+    result = await run_scenario(get_args(drop_after=200 * 1024, drops=5), 2)
+    assert "error" not in result
+    assert (result["completed"], result["failed"]) == (0, 2)
@@ -0,0 +1,39 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda
+
+from cda_dl.crawler import Crawler
+
+
+@pytest.mark.asyncio
+async def test_crawl_folder(fake_cda: FakeCda) -> None:
+    stream = io.StringIO()
+    async with fake_cda.session() as session:
+        crawler = Crawler(session, stream, concurrency=2)
+        await crawler.crawl_folder(fake_cda.folders[1].url)
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(records) == crawler.count == 8
+    assert fake_cda.requests["video_page"] == 0
+    by_id = {record["id"]: record for record in records}
+    assert by_id["f1"]["title"] == "Film f 1"
+    assert by_id["f1"]["folder"] == "Folder"
+    assert by_id["s3"]["folder"] == "Folder/Podfolder"
+    assert by_id["s3"]["duration"] == fake_cda.videos["s3"].duration
+
+
+@pytest.mark.asyncio
+async def test_crawl_qualities(fake_cda: FakeCda) -> None:
+    stream = io.StringIO()
+    async with fake_cda.session() as session:
+        crawler = Crawler(session, stream, qualities=True)
+        await crawler.crawl_video(fake_cda.video_url("v1"))
+    record = json.loads(stream.getvalue())
+    assert record["title"] == "Film_v_1"
+    assert record["folder"] == ""
+    assert set(record["qualities"]) == set(fake_cda.videos["v1"].qualities)
@@ -0,0 +1,96 @@
+import os
+import sys
+from asyncio import Semaphore
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeFolder, make_videos
+
+from cda_dl.dedupe import DedupeIndex
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.downloader import Downloader
+from cda_dl.folder import Folder
+from cda_dl.metrics import VideoMetrics
+from cda_dl.ui import UI
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["hardlink", "reflink", "symlink"])
+async def test_dedupe_folders(mode: str, tmp_path: Path) -> None:
+    shared = make_videos(2, size=4096, prefix="x")
+    # The same videos twice in one folder, downloaded concurrently, and
+    # once more in a second folder.
+    first = FakeFolder("user", 1, "A", shared + shared)
+    second = FakeFolder("user", 2, "B", shared + make_videos(1, size=4096))
+    index = tmp_path / "index.json"
+    download_options = DownloadOptions(directory=tmp_path, nthreads=4)
+    download_options.semaphore = Semaphore(download_options.nthreads)
+    download_options.dedupe = DedupeIndex(mode, index)
+    download_state = DownloadState()
+    async with FakeCda(folders=[first, second]) as cda:
+        async with cda.session() as session:
+            for folder in (first, second):
+                await Folder(folder.url, session, UI()).download_folder(
+                    download_options, download_state
+                )
+    await download_options.dedupe.close()
+    assert cda.requests["media"] == 3
+    assert download_state.completed == 3
+    assert download_state.skipped == 2
+    assert download_state.linked == 2
+    copy = tmp_path / "B" / "Film_x_1.mp4"
+    original = tmp_path / "A" / "Film_x_1.mp4"
+    assert copy.read_bytes() == original.read_bytes()
+    if mode == "hardlink":
+        assert copy.samefile(original) and not copy.is_symlink()
+    if mode == "symlink":
+        assert copy.is_symlink()
+
+    # The index outlives the run.
+    dedupe = DedupeIndex(mode, index)
+    assert dedupe.get("x1:najlepsza") == original
+    original.unlink()
+    assert dedupe.get("x1:najlepsza") is None
+
+
+class EventsUI(UI):
+    def __init__(self) -> None:
+        super().__init__()
+        self.events: list[tuple[str, str]] = []
+
+    def video_started(self, url: str) -> None:
+        self.events.append(("started", url.rsplit("/", 1)[-1]))
+
+    def video_finished(self, metrics: VideoMetrics) -> None:
+        self.events.append(("finished", metrics.url.rsplit("/", 1)[-1]))
+
+
+@pytest.mark.asyncio
+async def test_duplicate_waits_without_a_slot(tmp_path: Path) -> None:
+    videos = make_videos(1, size=512 * 1024) + make_videos(1, prefix="y")
+    downloader = Downloader.__new__(Downloader)
+    downloader.download_options = DownloadOptions(tmp_path, nthreads=2)
+    downloader.download_options.semaphore = Semaphore(2)
+    downloader.download_options.dedupe = DedupeIndex()
+    downloader.download_state = DownloadState()
+    downloader.probed = {}
+    downloader.plan = None
+    downloader.ui = ui = EventsUI()
+    async with FakeCda(videos, bandwidth=1024 * 1024) as cda:
+        async with cda.session() as session:
+            await downloader.download_videos(
+                session,
+                [
+                    (cda.video_url(video_id), tmp_path / str(i))
+                    for i, video_id in enumerate(("v1", "v1", "y1"))
+                ],
+            )
+    download_state = downloader.download_state
+    assert (download_state.completed, download_state.linked) == (2, 1)
+    # y1 takes the second slot while the copy of v1 waits for the first.
+    assert ui.events.index(("started", "y1")) < ui.events.index(
+        ("finished", "v1")
+    )
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import shutil
+import sys
+from asyncio import Semaphore
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeFolder, make_videos
+
+from cda_dl.disk import FreeSpaceGate, preallocate
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.error import DiskSpaceError
+from cda_dl.folder import Folder
+from cda_dl.ui import UI
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux")
+def test_preallocate_keeps_size(tmp_path: Path) -> None:
+    path = tmp_path / "film.mp4.part"
+    with open(path, "ab") as f:
+        f.write(b"x" * 10)
+        f.flush()
+        allocated = preallocate(f.fileno(), 1 << 20)
+    # The size still tells where to resume from.
+    assert path.stat().st_size == 10
+    if allocated:
+        assert path.stat().st_blocks * 512 >= 1 << 20
+
+
+@pytest.mark.asyncio
+async def test_gate_waits(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    usage = shutil.disk_usage(tmp_path)
+    free = 100
+
+    def disk_usage(path: Any) -> Any:
+        return usage._replace(free=free)
+
+    monkeypatch.setattr(shutil, "disk_usage", disk_usage)
+    gate = FreeSpaceGate(margin=10)
+    device = gate.try_reserve(tmp_path, 60)
+    assert device is not None
+    assert gate.try_reserve(tmp_path, 60) is None
+    # Waits for the first download instead of failing.
+    waiting = asyncio.create_task(gate.reserve(tmp_path, 60))
+    await asyncio.sleep(0)
+    assert not waiting.done()
+    await gate.release(device, 60)
+    assert await waiting == device
+    await gate.release(device, 60)
+    # Never fits, even with nothing else running.
+    with pytest.raises(DiskSpaceError):
+        await gate.reserve(tmp_path, 91)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("margin", [0, 1 << 50])
+async def test_folder_with_gate(margin: int, tmp_path: Path) -> None:
+    folder = FakeFolder("user", 1, "A", make_videos(3, size=4096))
+    download_options = DownloadOptions(directory=tmp_path, nthreads=3)
+    download_options.semaphore = Semaphore(download_options.nthreads)
+    download_options.disk = FreeSpaceGate(margin)
+    download_state = DownloadState()
+    async with FakeCda(folders=[folder]) as cda:
+        async with cda.session() as session:
+            await Folder(folder.url, session, UI()).download_folder(
+                download_options, download_state
+            )
+    assert not any(download_options.disk.reserved.values())
+    if margin:
+        assert download_state.failed == 3
+        assert not list((tmp_path / "A").glob("*.mp4"))
+    else:
+        assert download_state.completed == 3
+        for path in (tmp_path / "A").glob("*.mp4"):
+            assert path.stat().st_size == 4096
@@ -2,6 +2,7 @@ import json
 import os
 import sys
 from asyncio import Semaphore
+from pathlib import Path
 from typing import cast
 
 import pytest
@@ -9,10 +10,12 @@ from aiohttp import ClientSession
 from rich.table import Table
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda
+
 from cda_dl.download_options import DownloadOptions
 from cda_dl.download_state import DownloadState
 from cda_dl.folder import Folder
-from cda_dl.ui import RichUI
+from cda_dl.ui import UI, RichUI
 
 directory = os.path.abspath(os.path.dirname(__file__))
 FOLDER_DATA = json.load(open(os.path.join(directory, "folder_data.json")))[
@@ -91,6 +94,40 @@ async def test_download_folder() -> None:
     async with ClientSession() as session:
         f = Folder(url, session, ui)
         await f.download_folder(download_options, download_state)
-        for v in f.videos:
-            s = os.stat(v.filepath)
-            assert s.st_size == v.remaining_size
+    for video in download_state.videos:
+        s = os.stat(Path(f.title, f"{video.title}.mp4"))
+        assert s.st_size == video.bytes
+
+
+@pytest.mark.asyncio
+async def test_download_folder_offline(
+    fake_cda: FakeCda, tmp_path: Path
+) -> None:
+    download_options = DownloadOptions(directory=tmp_path, resolution="480p")
+    download_options.semaphore = Semaphore(download_options.nthreads)
+    download_state = DownloadState()
+    async with fake_cda.session() as session:
+        f = Folder(fake_cda.folders[1].url, session, UI())
+        await f.download_folder(download_options, download_state)
+    assert download_state.completed == 8
+    assert len(list((tmp_path / "Folder").glob("*.mp4"))) == 5
+    assert len(list((tmp_path / "Folder" / "Podfolder").glob("*.mp4"))) == 3
+
+
+@pytest.mark.asyncio
+async def test_skip_from_listing_offline(
+    fake_cda: FakeCda, tmp_path: Path
+) -> None:
+    download_options = DownloadOptions(directory=tmp_path)
+    download_options.semaphore = Semaphore(download_options.nthreads)
+    async with fake_cda.session() as session:
+        f = Folder(fake_cda.folders[1].url, session, UI())
+        await f.download_folder(download_options, DownloadState())
+        assert f.videos[0].duration == fake_cda.videos["f1"].duration
+
+        fake_cda.requests.clear()
+        download_state = DownloadState()
+        f = Folder(fake_cda.folders[1].url, session, UI())
+        await f.download_folder(download_options, download_state)
+    assert download_state.skipped == 8
+    assert fake_cda.requests["video_page"] == 0
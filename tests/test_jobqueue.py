@@ -0,0 +1,220 @@
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeFolder, FakeResolver, make_videos
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.jobqueue import JobQueue, JobRow
+from cda_dl.main import parse_args
+from cda_dl.ui import UI
+from cda_dl.worker import QueueWorker, get_queue_job
+
+
+def video_job(video_id: str, directory: str = "") -> JobRow:
+    job = get_queue_job(f"https://www.cda.pl/video/{video_id}", directory)
+    assert job is not None
+    return job
+
+
+async def run_worker(
+    queue: JobQueue, session: aiohttp.ClientSession, directory: Path
+) -> DownloadState:
+    download_options = DownloadOptions(directory=directory, nthreads=2)
+    download_options.semaphore = asyncio.Semaphore(2)
+    download_state = DownloadState()
+    await QueueWorker(
+        queue, session, UI(), download_options, download_state, poll=0.05
+    ).run()
+    return download_state
+
+
+def work(queue_path: Path, directory: Path, port: int) -> None:
+    """Run a worker in a process of its own, against the fake server."""
+
+    async def main() -> None:
+        connector = aiohttp.TCPConnector(resolver=FakeResolver(port))
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await run_worker(JobQueue(queue_path, 2), session, directory)
+
+    asyncio.run(main())
+
+
+def test_add_drops_repeated_videos(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / "queue.db")
+    assert queue.add([video_job("v1"), video_job("v2")]) == 2
+    forms = ["https://ebd.cda.pl/620x368/v1", "https://www.cda.pl/video/v2/x"]
+    assert queue.add(filter(None, map(get_queue_job, forms))) == 0
+    assert queue.counts() == {"pending": 2}
+
+
+def test_folder_forms_are_one_job(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / "queue.db")
+    forms = [
+        "https://www.cda.pl/user/folder/1",
+        "https://www.cda.pl/user/folder/1/1/",
+        "http://cda.pl/user/folder/1/",
+        "https://www.cda.pl/user/folder/1/2",
+    ]
+    assert queue.add(filter(None, map(get_queue_job, forms))) == 2
+
+
+def test_claim_folders_first(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / "queue.db")
+    folder = get_queue_job("https://www.cda.pl/user/folder/1")
+    assert folder is not None
+    queue.add([video_job("v1"), folder])
+    job = queue.claim()
+    assert job is not None and job.kind == "folder"
+    job = queue.claim()
+    assert job is not None and job.kind == "video" and job.attempts == 1
+    assert queue.claim() is None
+    assert not queue.is_finished()
+
+
+def test_expired_lease_is_taken_over(tmp_path: Path) -> None:
+    dead = JobQueue(tmp_path / "queue.db", lease=0.1)
+    alive = JobQueue(tmp_path / "queue.db", lease=0.1)
+    dead.add([video_job("v1")])
+    lost = dead.claim()
+    assert lost is not None
+    assert alive.claim() is None
+    time.sleep(0.15)
+    job = alive.claim()
+    assert job is not None and job.id == lost.id and job.attempts == 2
+    # The old owner can neither renew nor finish the job any more.
+    assert dead.heartbeat([lost.id]) == {lost.id}
+    assert not dead.finish(lost, "done")
+    assert alive.heartbeat([job.id]) == set()
+    assert alive.finish(job, "done")
+    assert alive.is_finished()
+
+
+def test_retry_until_max_attempts(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / "queue.db", max_attempts=2)
+    queue.add([video_job("v1")])
+    job = queue.claim()
+    assert job is not None and queue.retry(job, "błąd")
+    job = queue.claim()
+    assert job is not None and queue.retry(job, "błąd")
+    assert queue.claim() is None
+    assert queue.counts() == {"failed": 1}
+
+
+def test_dead_worker_fails_after_max_attempts(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / "queue.db", lease=0.05, max_attempts=1)
+    queue.add([video_job("v1")])
+    assert queue.claim() is not None
+    time.sleep(0.1)
+    assert queue.claim() is None
+    assert queue.is_finished() and queue.counts() == {"failed": 1}
+
+
+def test_queue_args() -> None:
+    args = parse_args(["--queue", "jobs.db", "--lease", "2m"])
+    assert args.queue == "jobs.db" and args.lease == 120
+    with pytest.raises(SystemExit):
+        parse_args(["--queue", "jobs.db", "--resume-job", "job.jsonl"])
+
+
+@pytest.mark.asyncio
+async def test_folders_split_into_videos(tmp_path: Path) -> None:
+    sub = FakeFolder("user", 2, "Podfolder", make_videos(2, prefix="s"))
+    root = FakeFolder("user", 1, "Folder", make_videos(5), [sub], per_page=2)
+    queue = JobQueue(tmp_path / "queue.db")
+    async with FakeCda(folders=[root]) as cda:
+        queue.add(
+            filter(
+                None,
+                [get_queue_job(root.url), get_queue_job(cda.video_url("v1"))],
+            )
+        )
+        async with cda.session() as session:
+            download_state = await run_worker(queue, session, tmp_path)
+    assert download_state.completed == 7
+    assert queue.counts() == {"done": 9}
+    # v1 was queued on its own before the folder listed it.
+    assert (tmp_path / "Film_v_1.mp4").exists()
+    assert len(list((tmp_path / "Folder").glob("*.mp4"))) == 4
+    assert len(list((tmp_path / "Folder" / "Podfolder").glob("*.mp4"))) == 2
+
+
+@pytest.mark.asyncio
+async def test_subfolder_given_as_argument(tmp_path: Path) -> None:
+    sub = FakeFolder("user", 2, "Podfolder", make_videos(2, prefix="s"))
+    root = FakeFolder("user", 1, "Folder", make_videos(2), [sub])
+    queue = JobQueue(tmp_path / "queue.db")
+    queue.add(filter(None, map(get_queue_job, [root.url, sub.url])))
+    async with FakeCda(folders=[root]) as cda:
+        async with cda.session() as session:
+            download_state = await run_worker(queue, session, tmp_path)
+    assert download_state.completed == 4
+    # The subfolder found in the listing is the job given as argument.
+    assert queue.counts() == {"done": 6}
+
+
+@pytest.mark.asyncio
+async def test_dead_worker_job_is_downloaded(tmp_path: Path) -> None:
+    dead = JobQueue(tmp_path / "queue.db", lease=0.2)
+    queue = JobQueue(tmp_path / "queue.db", lease=0.2)
+    async with FakeCda(videos=make_videos(3)) as cda:
+        dead.add(
+            filter(
+                None,
+                (get_queue_job(cda.video_url(f"v{i}")) for i in (1, 2, 3)),
+            )
+        )
+        assert dead.claim() is not None
+        async with cda.session() as session:
+            download_state = await run_worker(queue, session, tmp_path)
+    assert download_state.completed == 3
+    assert queue.counts() == {"done": 3}
+
+
+@pytest.mark.asyncio
+async def test_workers_in_processes(tmp_path: Path) -> None:
+    folders = [
+        FakeFolder("user", i, f"Folder {i}", make_videos(6, prefix=f"f{i}v"))
+        for i in (1, 2)
+    ]
+    queue_path = tmp_path / "queue.db"
+    queue = JobQueue(queue_path)
+    queue.add(filter(None, (get_queue_job(f.url) for f in folders)))
+    # The same videos again, given directly.
+    queue.add(
+        filter(
+            None,
+            (get_queue_job(f"http://www.cda.pl/video/f1v{i}") for i in (1, 2)),
+        )
+    )
+    context = multiprocessing.get_context("spawn")
+    async with FakeCda(folders=folders, latency=0.01) as cda:
+        processes = [
+            context.Process(
+                target=work, args=(queue_path, tmp_path / "videos", cda.port)
+            )
+            for _ in range(3)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            await asyncio.to_thread(process.join)
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+    assert queue.counts() == {"done": 14}
+    # Every video was streamed once, by one of the workers.
+    assert cda.requests["media"] == 12
+    connection = sqlite3.connect(queue_path)
+    workers = connection.execute(
+        "SELECT COUNT(DISTINCT worker) FROM jobs"
+    ).fetchone()[0]
+    assert workers >= 2
+    assert len(list((tmp_path / "videos").rglob("*.mp4"))) == 12
@@ -0,0 +1,123 @@
+import json
+import os
+import sys
+from asyncio import Semaphore
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeVideo
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.downloader import Downloader
+from cda_dl.folder import Folder
+from cda_dl.journal import JobPlan, Journal
+from cda_dl.ui import UI
+
+
+def get_downloader(
+    plan: JobPlan, download_options: DownloadOptions
+) -> Downloader:
+    """A Downloader that resumes the plan, without parsing arguments."""
+    downloader = Downloader.__new__(Downloader)
+    downloader.plan = plan
+    downloader.download_options = download_options
+    downloader.download_state = DownloadState()
+    downloader.probed = {}
+    downloader.ui = UI()
+    return downloader
+
+
+def test_journal_replay(tmp_path: Path) -> None:
+    path = tmp_path / "job.jsonl"
+    journal = Journal(path)
+    journal.job(["https://www.cda.pl/user/folder/1"], tmp_path)
+    journal.root_folder("https://www.cda.pl/user/folder/1", tmp_path)
+    journal.folder(
+        "https://www.cda.pl/user/folder/1",
+        tmp_path / "A",
+        ["https://www.cda.pl/video/1", "https://www.cda.pl/video/2"],
+        ["https://www.cda.pl/user/folder/2"],
+    )
+    journal.resolved("https://www.cda.pl/video/1", "Film", "720p")
+    journal.state("https://www.cda.pl/video/1", "completed")
+    journal.close()
+    # A crash in the middle of a write leaves a torn last line.
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op": "state", "url": "https://www.cda.pl/vid')
+
+    plan = Journal.load(path)
+    assert plan.urls == ["https://www.cda.pl/user/folder/1"]
+    assert plan.directory == tmp_path
+    assert plan.pending_videos == [
+        ("https://www.cda.pl/video/2", tmp_path / "A")
+    ]
+    assert plan.pending_folders == [
+        ("https://www.cda.pl/user/folder/2", tmp_path / "A")
+    ]
+    assert plan.resolved["https://www.cda.pl/video/1"]["resolution"] == "720p"
+
+
+@pytest.mark.asyncio
+async def test_resume_job(fake_cda: FakeCda, tmp_path: Path) -> None:
+    path = tmp_path / "job.jsonl"
+    download_options = DownloadOptions(directory=tmp_path)
+    download_options.semaphore = Semaphore(download_options.nthreads)
+    download_options.journal = Journal(path)
+    url = fake_cda.folders[1].url
+    download_options.journal.job([url], tmp_path)
+    async with fake_cda.session() as session:
+        folder = Folder(url, session, UI())
+        download_options.journal.root_folder(folder.url, tmp_path)
+        await folder.download_folder(download_options, DownloadState())
+    download_options.journal.close()
+
+    # Drop the last state change, as if the job was killed before it.
+    lines = path.read_text(encoding="utf-8").splitlines()
+    last = json.loads(lines[-1])
+    assert last["op"] == "state"
+    path.write_text("\n".join(lines[:-1]) + "\n", encoding="utf-8")
+    plan = Journal.load(path)
+    assert plan.pending_videos == [(last["url"], plan.videos[last["url"]])]
+    assert plan.pending_folders == []
+
+    fake_cda.requests.clear()
+    download_options.journal = Journal(path)
+    downloader = get_downloader(plan, download_options)
+    async with fake_cda.session() as session:
+        await downloader.download_videos(session, plan.pending_videos)
+    download_options.journal.close()
+    assert downloader.download_state.skipped == 1
+    assert fake_cda.requests["folder_page"] == 0
+    # The journaled title finds the file without the Video page.
+    assert fake_cda.requests["video_page"] == 0
+    assert Journal.load(path).pending_videos == []
+
+
+@pytest.mark.asyncio
+async def test_resume_in_journaled_quality(tmp_path: Path) -> None:
+    video = FakeVideo("v1", "Film v 1")
+    path = tmp_path / "job.jsonl"
+    journal = Journal(path)
+    async with FakeCda([video]) as cda:
+        url = cda.video_url("v1")
+        journal.video(url, tmp_path)
+        journal.resolved(url, "Film_v_1", "480p")
+        journal.close()
+        # The killed run got half of the 480p file.
+        size = video.sizes["480p"]
+        part = tmp_path / "Film_v_1.mp4.part"
+        part.write_bytes(
+            b"".join([chunk async for chunk in video.body(size, 0, size // 2)])
+        )
+        download_options = DownloadOptions(directory=tmp_path)
+        download_options.journal = Journal(path)
+        downloader = get_downloader(Journal.load(path), download_options)
+        async with cda.session() as session:
+            await downloader.download_videos(session, [(url, tmp_path)])
+        download_options.journal.close()
+    assert downloader.download_state.completed == 1
+    assert [m.resolution for m in downloader.download_state.videos] == ["480p"]
+    assert (tmp_path / "Film_v_1.mp4").stat().st_size == size
@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.link_cache import LinkCache, get_expiry
+from cda_dl.ui import UI
+from cda_dl.video import Video
+
+
+def test_get_expiry() -> None:
+    now = time.time()
+    url = f"https://vwaw1.cda.pl/x.mp4?st=abc&e={int(now) + 100}"
+    assert get_expiry(url, 3600, now) == int(now) + 100
+    assert get_expiry("https://vwaw1.cda.pl/x.mp4", 3600, now) == now + 3600
+    # Already expired or nonsensical values fall back to the TTL.
+    assert get_expiry(f"https://x/?e={int(now) - 1}", 10, now) == now + 10
+    assert get_expiry("https://x/?e=abc", 10, now) == now + 10
+
+
+def test_link_cache_persistence(tmp_path: Path) -> None:
+    cache = LinkCache()
+    cache.put(tmp_path, "abc", "najlepsza", "https://x/a.mp4", "A", "720p")
+    cache.writer.flush()
+    entry = LinkCache().get(tmp_path, "abc", "najlepsza")
+    assert entry is not None
+    assert (entry["url"], entry["resolution"]) == ("https://x/a.mp4", "720p")
+    assert LinkCache().get(tmp_path, "abc", "480p") is None
+
+    cache.remove(tmp_path, "abc", "najlepsza")
+    cache.writer.flush()
+    assert not (tmp_path / LinkCache.FILENAME).exists()
+
+
+@pytest.mark.asyncio
+async def test_link_cache_writes_are_batched(tmp_path: Path) -> None:
+    cache = LinkCache()
+    for i in range(100):
+        cache.put(tmp_path / "A", f"v{i}", "najlepsza", "https://x/", "A", "")
+    cache.remove(tmp_path / "A", "v0", "najlepsza")
+    # Nothing is written on the event loop, the file comes on close().
+    assert not (tmp_path / "A").exists()
+    await cache.close()
+    entries = LinkCache().load(tmp_path / "A")
+    assert len(entries) == 99 and "v0:najlepsza" not in entries
+
+
+def test_link_cache_expired(tmp_path: Path) -> None:
+    cache = LinkCache(ttl=30)
+    cache.put(tmp_path, "abc", "najlepsza", "https://x/a.mp4", "A", "720p")
+    assert cache.get(tmp_path, "abc", "najlepsza") is None
+
+
+@pytest.mark.asyncio
+async def test_download_from_cached_link(
+    fake_cda: FakeCda, tmp_path: Path
+) -> None:
+    download_options = DownloadOptions(directory=tmp_path)
+    download_options.link_cache = LinkCache()
+    video = fake_cda.videos["v1"]
+    download_options.link_cache.put(
+        tmp_path,
+        "v1",
+        "najlepsza",
+        fake_cda.media_url(video, "sd"),
+        "Film_v_1",
+        "720p",
+    )
+    size = video.sizes["720p"]
+    prefix = [chunk async for chunk in video.body(size, 0, 1000)]
+    (tmp_path / "Film_v_1.mp4.part").write_bytes(b"".join(prefix))
+    download_state = DownloadState()
+    async with fake_cda.session() as session:
+        v = Video(fake_cda.video_url("v1"), session, UI())
+        await v.download_video(download_options, download_state)
+    assert download_state.completed == 1
+    assert fake_cda.requests["video_page"] == 0
+    assert fake_cda.requests["rpc"] == 0
+    assert v.resume_point == 1000
+    assert (tmp_path / "Film_v_1.mp4").stat().st_size == size
+    await download_options.link_cache.close()
+    assert not (tmp_path / LinkCache.FILENAME).exists()
+
+
+@pytest.mark.asyncio
+async def test_download_with_stale_cached_link(
+    fake_cda: FakeCda, tmp_path: Path
+) -> None:
+    download_options = DownloadOptions(directory=tmp_path)
+    download_options.link_cache = LinkCache()
+    download_options.link_cache.put(
+        tmp_path,
+        "v1",
+        "najlepsza",
+        "http://vwaw001.cda.pl/media/v1/gone.mp4",
+        "Film_v_1",
+        "720p",
+    )
+    download_state = DownloadState()
+    async with fake_cda.session() as session:
+        v = Video(fake_cda.video_url("v1"), session, UI())
+        await v.download_video(download_options, download_state)
+    assert download_state.completed == 1
+    assert fake_cda.requests["video_page"] == 1
+    await download_options.link_cache.close()
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import sys
+from asyncio import Semaphore
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeFolder, make_videos
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.folder import Folder
+from cda_dl.manifest import Manifests, hash_file, verify_tree
+from cda_dl.ui import UI
+
+
+async def download(cda: FakeCda, url: str, directory: Path) -> None:
+    download_options = DownloadOptions(directory=directory)
+    download_options.semaphore = Semaphore(download_options.nthreads)
+    download_options.manifests = Manifests("blake2b")
+    async with cda.session() as session:
+        await Folder(url, session, UI()).download_folder(
+            download_options, DownloadState()
+        )
+    # The manifests are written once at the end, not after every file.
+    assert not list(directory.rglob(Manifests.FILENAME))
+    await download_options.manifests.close()
+
+
+@pytest.mark.asyncio
+async def test_manifest_resume_and_verify(tmp_path: Path) -> None:
+    folder = FakeFolder("user", 1, "A", make_videos(3, size=300 * 1024))
+    async with FakeCda(folders=[folder]) as cda:
+        await download(cda, folder.url, tmp_path / "first")
+        # Resume a download from a .part file with half of the video.
+        first = tmp_path / "first" / "A"
+        name = "Film_v_1.mp4"
+        data = (first / name).read_bytes()
+        second = tmp_path / "second" / "A"
+        second.mkdir(parents=True)
+        (second / f"{name}.part").write_bytes(data[: len(data) // 2])
+        await download(cda, folder.url, tmp_path / "second")
+    assert (second / name).read_bytes() == data
+
+    for directory in (first, second):
+        manifest = Manifests().load(directory)
+        assert len(manifest) == 3
+        for filename, entry in manifest.items():
+            content = (directory / filename).read_bytes()
+            assert entry["hash"] == hashlib.blake2b(content).hexdigest()
+            assert entry["size"] == len(content)
+
+    result = verify_tree(tmp_path)
+    assert (result.ok, result.unchanged, result.bad) == (0, 6, [])
+
+    # A touched file is read again, then trusted until it changes.
+    os.utime(first / name, ns=(0, 0))
+    result = verify_tree(tmp_path)
+    assert (result.ok, result.unchanged) == (1, 5)
+    assert verify_tree(tmp_path).unchanged == 6
+
+    with open(second / name, "r+b") as f:
+        f.write(b"corrupted")
+    (second / "Film_v_2.mp4").unlink()
+    result = verify_tree(tmp_path, nthreads=2)
+    assert sorted(reason for _, reason in result.bad) == [
+        "brak pliku",
+        "niezgodna suma kontrolna",
+    ]
+
+
+def test_hash_file_crc32(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_bytes(b"123456789")
+    assert hash_file(path, "crc32") == "cbf43926"
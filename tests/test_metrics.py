@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cda_dl.download_state import DownloadState
+from cda_dl.metrics import (
+    CURRENT_METRICS,
+    VideoMetrics,
+    build_report,
+    format_prometheus,
+    quantile,
+    record_retry,
+    write_json_report,
+)
+
+
+def make_state() -> DownloadState:
+    state = DownloadState()
+    for i in range(1, 11):
+        metrics = VideoMetrics(f"https://www.cda.pl/video/{i}")
+        metrics.add("rpc", i / 10)
+        metrics.add("stream", 2.0)
+        metrics.bytes = i * 1000
+        metrics.finish("completed")
+        state.videos.append(metrics)
+        state.completed += 1
+    failed = VideoMetrics("https://www.cda.pl/video/x")
+    failed.rate_limited = 2
+    failed.finish("failed", "HTTP error [404]")
+    state.videos.append(failed)
+    state.failed += 1
+    return state
+
+
+def test_quantile() -> None:
+    values = [float(i) for i in range(1, 101)]
+    assert quantile(values, 0.5) == 50
+    assert quantile(values, 0.99) == 99
+    assert quantile([3.0], 0.9) == 3
+
+
+def test_record_retry() -> None:
+    metrics = VideoMetrics("https://www.cda.pl/video/1")
+    token = CURRENT_METRICS.set(metrics)
+    record_retry()
+    record_retry()
+    CURRENT_METRICS.reset(token)
+    record_retry()
+    assert metrics.retries == 2
+
+
+def test_build_report() -> None:
+    report = build_report(make_state())
+    assert report["completed"] == 10
+    assert report["failed"] == 1
+    assert report["bytes"] == 55000
+    assert report["rate_limited"] == 2
+    assert report["phases"]["rpc"]["count"] == 10
+    assert report["phases"]["rpc"]["p90"] == 0.9
+    assert report["phases"]["ttfb"] == {"count": 0, "sum": 0.0}
+    assert report["throughput"]["max"] == 5000
+    assert report["videos"][-1]["reason"] == "HTTP error [404]"
+
+
+def test_write_json_report(tmp_path: Path) -> None:
+    path = tmp_path / "report.json"
+    write_json_report(build_report(make_state()), path)
+    assert json.loads(path.read_text())["completed"] == 10
+    assert os.listdir(tmp_path) == ["report.json"]
+
+
+def test_format_prometheus() -> None:
+    text = format_prometheus(build_report(make_state()))
+    assert 'cda_dl_videos{status="completed"} 10' in text
+    assert "cda_dl_run_rate_limited 2" in text
+    assert 'cda_dl_phase_seconds{phase="rpc",quantile="0.5"} 0.5' in text
+    assert 'cda_dl_phase_seconds_count{phase="ttfb"} 0' in text
+    assert "cda_dl_stream_throughput_bytes_count 10" in text
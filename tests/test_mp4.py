@@ -0,0 +1,153 @@
+import os
+import sys
+from asyncio import Semaphore
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import MP4_HEADER, FakeCda, FakeFolder, make_videos
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.downloader import Downloader
+from cda_dl.error import BrokenFileError
+from cda_dl.folder import Folder
+from cda_dl.link_cache import LinkCache
+from cda_dl.mp4 import check_mp4, check_tree
+from cda_dl.ui import UI
+from cda_dl.video import Video
+
+
+def test_check_mp4(tmp_path: Path) -> None:
+    path = tmp_path / "film.mp4"
+    mdat = (1000).to_bytes(4, "big") + b"mdat" + bytes(992)
+    path.write_bytes(MP4_HEADER + mdat)
+    check_mp4(path)
+    # A 64-bit box size and a last box that runs to the end of the file.
+    large = (1).to_bytes(4, "big") + b"free" + (24).to_bytes(8, "big")
+    path.write_bytes(MP4_HEADER + large + bytes(8) + bytes(4) + b"mdat")
+    check_mp4(path)
+
+    path.write_bytes(MP4_HEADER + mdat[:500])
+    with pytest.raises(BrokenFileError) as e:
+        check_mp4(path)
+    assert e.value.truncated
+    path.write_bytes(bytes(100) + MP4_HEADER + mdat)
+    with pytest.raises(BrokenFileError) as e:
+        check_mp4(path)
+    assert not e.value.truncated
+    path.write_bytes(MP4_HEADER[:24] + mdat)
+    with pytest.raises(BrokenFileError, match="moov"):
+        check_mp4(path)
+
+
+@pytest.mark.asyncio
+async def test_redownload_broken_files(tmp_path: Path) -> None:
+    folder = FakeFolder("user", 1, "A", make_videos(3, size=300 * 1024))
+    download_options = DownloadOptions(directory=tmp_path)
+    download_options.semaphore = Semaphore(download_options.nthreads)
+    async with FakeCda(folders=[folder]) as cda:
+        async with cda.session() as session:
+            await Folder(folder.url, session, UI()).download_folder(
+                download_options, DownloadState()
+            )
+        directory = tmp_path / "A"
+        good = {p.name: p.read_bytes() for p in directory.glob("*.mp4")}
+        with open(directory / "Film_v_1.mp4", "r+b") as f:
+            f.truncate(100 * 1024)
+        with open(directory / "Film_v_2.mp4", "r+b") as f:
+            f.write(b"garbage!")
+        assert len(check_tree(tmp_path)) == 2
+
+        cda.requests.clear()
+        download_state = DownloadState()
+        async with cda.session() as session:
+            await Folder(folder.url, session, UI()).download_folder(
+                download_options, download_state
+            )
+    assert download_state.completed == 2
+    assert download_state.skipped == 1
+    assert {p.name: p.read_bytes() for p in directory.glob("*.mp4")} == good
+    assert check_tree(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_redownload_broken_file_from_cached_link(
+    tmp_path: Path,
+) -> None:
+    video = make_videos(1)[0]
+    download_options = DownloadOptions(directory=tmp_path)
+    download_options.link_cache = LinkCache()
+    async with FakeCda([video]) as cda:
+        download_options.link_cache.put(
+            tmp_path,
+            "v1",
+            "najlepsza",
+            cda.media_url(video, "sd"),
+            "Film_v_1",
+            "720p",
+        )
+        (tmp_path / "Film_v_1.mp4").write_bytes(b"garbage!" * 100)
+        download_state = DownloadState()
+        async with cda.session() as session:
+            await Video(cda.video_url("v1"), session, UI()).download_video(
+                download_options, download_state
+            )
+    assert download_state.completed == 1
+    assert cda.requests["video_page"] == 0
+    assert check_tree(tmp_path) == []
+    assert not (tmp_path / "Film_v_1.mp4.old").exists()
+    await download_options.link_cache.close()
+
+
+@pytest.mark.asyncio
+async def test_broken_file_kept_when_redownload_fails(
+    tmp_path: Path,
+) -> None:
+    broken = tmp_path / "Film_v_9.mp4"
+    broken.write_bytes(b"garbage!" * 100)
+    download_options = DownloadOptions(directory=tmp_path)
+    download_state = DownloadState()
+    async with FakeCda(make_videos(1)) as cda:
+        async with cda.session() as session:
+            # The video is gone from the server.
+            await Video(
+                cda.video_url("v9"), session, UI(), "Film v 9"
+            ).download_video(download_options, download_state)
+    assert download_state.failed == 1
+    assert broken.read_bytes() == b"garbage!" * 100
+    assert [p.name for p in tmp_path.iterdir()] == ["Film_v_9.mp4"]
+
+
+@pytest.mark.asyncio
+async def test_resume_after_dropped_connection(tmp_path: Path) -> None:
+    videos = make_videos(2, size=1024**2)
+    download_options = DownloadOptions(directory=tmp_path)
+    download_state = DownloadState()
+    async with FakeCda(videos, drop_after=300 * 1024) as cda:
+        async with cda.session() as session:
+            for video in videos:
+                await Video(
+                    cda.video_url(video.video_id), session, UI()
+                ).download_video(download_options, download_state)
+    assert download_state.completed == 2
+    # Every file was cut once and resumed from its .part file.
+    assert cda.requests["media"] == 4
+    assert not list(tmp_path.glob("*.part"))
+    for path in tmp_path.glob("*.mp4"):
+        check_mp4(path)
+        assert path.stat().st_size == videos[0].sizes["720p"]
+
+
+def test_verify_names_broken_files(tmp_path: Path, caplog: Any) -> None:
+    path = tmp_path / "A" / "film.mp4"
+    path.parent.mkdir()
+    path.write_bytes(bytes(100))
+    downloader = Downloader.__new__(Downloader)
+    downloader.download_options = DownloadOptions(directory=tmp_path)
+    with pytest.raises(SystemExit) as e:
+        downloader.verify_and_exit()
+    assert e.value.code == 1
+    assert f"{path}: " in caplog.text
@@ -0,0 +1,63 @@
+import os
+import sys
+from asyncio import Semaphore
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeFolder, FakeVideo
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.folder import Folder
+from cda_dl.order import order_jobs
+from cda_dl.ui import UI
+from cda_dl.video import Video
+
+
+def test_order_jobs() -> None:
+    jobs = ["a", "b", "c", "d", "e", "f"]
+    weights = {"a": 30, "b": None, "c": 10, "d": 50, "e": 20, "f": 30}
+    assert order_jobs(jobs, weights.get, "input") == jobs
+    assert order_jobs(jobs, weights.get, "shortest") == list("ceafdb")
+    assert order_jobs(jobs, weights.get, "longest") == list("dafecb")
+    assert order_jobs(jobs, weights.get, "interleave") == list("dcaefb")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "order, expected",
+    [("input", [3, 1, 2]), ("shortest", [1, 2, 3]), ("longest", [3, 2, 1])],
+)
+async def test_folder_order(
+    order: str, expected: list[int], tmp_path: Path
+) -> None:
+    videos = [
+        FakeVideo(
+            f"v{minutes}", f"Film {minutes}", 1024, duration=minutes * 60
+        )
+        for minutes in (3, 1, 2)
+    ]
+    folder = FakeFolder("user", 1, "A", videos)
+    download_options = DownloadOptions(directory=tmp_path, nthreads=1)
+    download_options.semaphore = Semaphore(1)
+    download_options.order = order
+    download_state = DownloadState()
+    async with FakeCda(folders=[folder]) as cda:
+        async with cda.session() as session:
+            await Folder(folder.url, session, UI()).download_folder(
+                download_options, download_state
+            )
+    done = [metrics.title for metrics in download_state.videos]
+    assert done == [f"Film_{minutes}" for minutes in expected]
+
+
+@pytest.mark.asyncio
+async def test_probe_duration() -> None:
+    video = FakeVideo("v1", "Film", duration=754)
+    async with FakeCda([video]) as cda:
+        async with cda.session() as session:
+            v = Video(cda.video_url("v1"), session, UI())
+            await v.probe()
+    assert v.duration == 754
@@ -0,0 +1,51 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cda_dl import profiling
+from cda_dl.profiling import Profiler, timed
+
+
+@timed
+async def wait(seconds: float) -> None:
+    await asyncio.sleep(seconds)
+
+
+async def block_loop() -> None:
+    await asyncio.sleep(0.1)
+    time.sleep(0.3)
+    await asyncio.sleep(0.1)
+
+
+async def run() -> str:
+    await asyncio.gather(wait(0.05), wait(0.05), block_loop())
+    return "done"
+
+
+def test_profiler(tmp_path: Path) -> None:
+    assert Profiler(tmp_path, stall_threshold=0.1).run(run()) == "done"
+    assert profiling.WALL_TIMES is None
+    assert {p.name for p in tmp_path.iterdir()} == {
+        "profile.pstats",
+        "profile.txt",
+        "coroutines.json",
+        "stalls.jsonl",
+    }
+    coroutines = json.loads((tmp_path / "coroutines.json").read_text())
+    assert coroutines["wait"]["calls"] == 2
+    assert coroutines["wait"]["total"] >= 0.1
+    stalls = [
+        json.loads(line)
+        for line in (tmp_path / "stalls.jsonl").read_text().splitlines()
+    ]
+    assert any(stall["lag"] >= 0.2 for stall in stalls)
+    assert any("block_loop" in c for s in stalls for c in s["culprits"])
+
+
+def test_timed_without_profiler() -> None:
+    asyncio.run(wait(0))
+    assert profiling.WALL_TIMES is None
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+from asyncio import Semaphore
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeFolder, FakeVideo, make_videos
+
+from cda_dl.batch import UrlFilter
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.downloader import Downloader
+from cda_dl.folder import Folder
+from cda_dl.quality import QualityPolicy, get_ladder
+from cda_dl.ui import UI
+from cda_dl.video import Video
+
+
+def test_ladder() -> None:
+    resolutions = ["360p", "480p", "aut", "720p"]
+    assert get_ladder(resolutions, "najlepsza") == [
+        "720p",
+        "480p",
+        "360p",
+        "aut",
+    ]
+    assert get_ladder(resolutions, "480p") == ["480p", "360p", "720p", "aut"]
+    # A missing resolution falls back to the next one down.
+    assert get_ladder(resolutions, "1080p")[0] == "720p"
+    assert get_ladder(resolutions, "240p")[0] == "360p"
+
+
+def test_deadline() -> None:
+    policy = QualityPolicy(deadline=100)
+    policy.queue(2)
+    resolutions = ["360p", "720p", "1080p"]
+    # Nothing measured yet.
+    assert policy.choose(resolutions, 600, "najlepsza") == "1080p"
+    assert policy.deadline is not None
+    policy.started -= 10
+    policy.deadline -= 10
+    policy.downloaded = policy.committed = 10 * 1024**2
+    # 1 MiB/s for the remaining 90 s, shared by two videos.
+    assert policy.get_available() == pytest.approx(90 * 1024**2, rel=0.01)
+    policy.bitrates = {"1080p": 100 * 1024, "720p": 60 * 1024}
+    assert policy.choose(resolutions, 600, "najlepsza") == "720p"
+    policy.deadline = time.monotonic()
+    assert policy.choose(resolutions, 600, "najlepsza") == "360p"
+
+
+@pytest.mark.asyncio
+async def test_budget_folder(tmp_path: Path) -> None:
+    videos = make_videos(4, size=1024**2)
+    folder = FakeFolder("user", 1, "A", videos)
+    budget = 3 * 1024**2
+    download_options = DownloadOptions(directory=tmp_path, nthreads=1)
+    download_options.semaphore = Semaphore(1)
+    download_options.quality = QualityPolicy(budget=budget)
+    download_state = DownloadState()
+    async with FakeCda(folders=[folder]) as cda:
+        async with cda.session() as session:
+            await Folder(folder.url, session, UI()).download_folder(
+                download_options, download_state
+            )
+    assert download_state.completed == 4
+    assert sum(m.bytes for m in download_state.videos) <= budget
+    chosen = [m.resolution for m in download_state.videos]
+    # The defaults are far off for the first video; the rest learn.
+    assert chosen[0] == "360p"
+    assert "480p" in chosen[1:]
+
+
+@pytest.mark.asyncio
+async def test_missing_resolution_falls_back(tmp_path: Path) -> None:
+    video = FakeVideo("v1", "Film", qualities=("360p", "480p"))
+    download_options = DownloadOptions(directory=tmp_path, resolution="720p")
+    download_options.quality = QualityPolicy(budget=1024**3)
+    download_state = DownloadState()
+    async with FakeCda([video]) as cda:
+        async with cda.session() as session:
+            v = Video(cda.video_url("v1"), session, UI())
+            await v.download_video(download_options, download_state)
+    assert download_state.completed == 1
+    assert v.resolution == "480p"
+
+
+def test_videos_counted_before_folders(tmp_path: Path) -> None:
+    downloader = Downloader.__new__(Downloader)
+    downloader.urls = [
+        "https://www.cda.pl/video/v1",
+        "https://www.cda.pl/user/folder/1",
+        "https://www.cda.pl/video/v2",
+    ]
+    downloader.plan = None
+    downloader.url_filter = UrlFilter()
+    downloader.download_state = DownloadState()
+    downloader.download_options = DownloadOptions(tmp_path)
+    quality = downloader.download_options.quality = QualityPolicy(1024**3)
+    videos, folders = downloader.get_jobs()
+    assert (len(videos), len(folders)) == (2, 1)
+    # The folders go first; their videos must leave a share to these.
+    assert quality.waiting == 2
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, make_videos
+
+from cda_dl.error import ParserError
+from cda_dl.resolver import LinkResolver
+
+
+def params(video_id: str, quality: str = "sd") -> list[object]:
+    return [video_id, quality, 1700000000, "hash", {}]
+
+
+async def resolve_all(cda: FakeCda, calls: list[list[object]]) -> list[object]:
+    async with cda.session() as session:
+        resolver = LinkResolver(session)
+        return await asyncio.gather(
+            *(resolver.resolve(cda.video_url(str(p[0])), p) for p in calls),
+            return_exceptions=True,
+        )
+
+
+@pytest.mark.asyncio
+async def test_resolve_batch() -> None:
+    async with FakeCda(make_videos(5)) as cda:
+        links = await resolve_all(cda, [params(f"v{i}") for i in range(1, 6)])
+        assert cda.requests["rpc_batch"] == 1
+        assert cda.requests["rpc"] == 0
+    for i, link in enumerate(links, start=1):
+        assert isinstance(link, str)
+        assert f"/media/v{i}/sd.mp4" in link
+
+
+@pytest.mark.asyncio
+async def test_resolve_batch_error() -> None:
+    async with FakeCda(make_videos(2)) as cda:
+        links = await resolve_all(cda, [params("v1"), params("v2", "hd")])
+    assert isinstance(links[0], str)
+    assert isinstance(links[1], ParserError)
+
+
+@pytest.mark.asyncio
+async def test_resolve_batch_unsupported() -> None:
+    async with FakeCda(make_videos(4), batch_rpc=False) as cda:
+        async with cda.session() as session:
+            resolver = LinkResolver(session)
+            first = await asyncio.gather(
+                resolver.resolve(cda.video_url("v1"), params("v1")),
+                resolver.resolve(cda.video_url("v2"), params("v2")),
+            )
+            assert resolver.batch_supported is False
+            second = await asyncio.gather(
+                resolver.resolve(cda.video_url("v3"), params("v3")),
+                resolver.resolve(cda.video_url("v4"), params("v4")),
+            )
+        assert cda.requests["rpc_batch"] == 1
+        assert cda.requests["rpc"] == 4
+    assert all("/media/" in link for link in first + second)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status", [400, 200])
+async def test_resolve_batch_html(status: int) -> None:
+    async with FakeCda(make_videos(4), batch_html=status) as cda:
+        async with cda.session() as session:
+            resolver = LinkResolver(session)
+            first = await asyncio.gather(
+                resolver.resolve(cda.video_url("v1"), params("v1")),
+                resolver.resolve(cda.video_url("v2"), params("v2")),
+            )
+            assert resolver.batch_supported is False
+            # post_request retries the rejected batch like any request.
+            batches = cda.requests["rpc_batch"]
+            second = await asyncio.gather(
+                resolver.resolve(cda.video_url("v3"), params("v3")),
+                resolver.resolve(cda.video_url("v4"), params("v4")),
+            )
+        assert cda.requests["rpc_batch"] == batches
+        assert cda.requests["rpc"] == 4
+    assert all("/media/" in link for link in first + second)
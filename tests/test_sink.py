@@ -0,0 +1,148 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeVideo, make_videos
+from fake_s3 import FakeS3
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.s3 import get_signature
+from cda_dl.sink import PipeTarget, S3Target, Target
+from cda_dl.ui import UI
+from cda_dl.video import Video
+
+
+async def get_body(video: FakeVideo, quality: str = "720p") -> bytes:
+    size = video.sizes[quality]
+    return b"".join([chunk async for chunk in video.body(size, 0, size)])
+
+
+async def download(
+    cda: FakeCda,
+    target: Target,
+    tmp_path: Path,
+    *video_ids: str,
+    min_speed: int = 0,
+) -> DownloadState:
+    download_options = DownloadOptions(directory=tmp_path)
+    download_options.target = target
+    download_options.min_speed = min_speed
+    download_options.slow_grace = 0.2
+    download_state = DownloadState()
+    async with cda.session() as session:
+        for video_id in video_ids:
+            await Video(cda.video_url(video_id), session, UI()).download_video(
+                download_options, download_state
+            )
+    await target.close()
+    return download_state
+
+
+def test_signature() -> None:
+    # The GET Object example of the Signature Version 4 documentation.
+    headers = {
+        "Host": "examplebucket.s3.amazonaws.com",
+        "Range": "bytes=0-9",
+        "x-amz-content-sha256": (
+            "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+        ),
+        "x-amz-date": "20130524T000000Z",
+    }
+    signature, signed_headers = get_signature(
+        "GET",
+        "/test.txt",
+        {},
+        headers,
+        "wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY",
+        "us-east-1",
+    )
+    assert signed_headers == "host;range;x-amz-content-sha256;x-amz-date"
+    assert signature == (
+        "f0e8bdb87c964420e857bd35b5d6ed310bd44f0170aba48dd91039c6036bdb41"
+    )
+
+
+@pytest.mark.asyncio
+async def test_s3_upload(tmp_path: Path) -> None:
+    video = FakeVideo("v1", "Film żółw", 300 * 1024)
+    async with FakeCda([video]) as cda, FakeS3(
+        min_part_size=64 * 1024, latency=0.01
+    ) as s3:
+        download_state = await download(
+            cda, S3Target(s3.bucket(), "filmy/"), tmp_path, "v1"
+        )
+    assert download_state.completed == 1
+    assert s3.objects["filmy/Film_żółw.mp4"] == await get_body(video)
+    # One part uploads while the next one fills up.
+    assert s3.max_uploading == 1
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_s3_resume(tmp_path: Path) -> None:
+    videos = make_videos(1, size=512 * 1024)
+    async with FakeCda(
+        videos, slow_links=1, slow_bandwidth=128 * 1024
+    ) as cda, FakeS3() as s3:
+        download_state = await download(
+            cda, S3Target(s3.bucket()), tmp_path, "v1", min_speed=256 * 1024
+        )
+    assert download_state.completed == 1
+    # The upload goes on from where the slow stream stopped.
+    assert cda.requests["media"] == 2
+    assert s3.objects["Film_v_1.mp4"] == await get_body(videos[0])
+
+
+@pytest.mark.asyncio
+async def test_s3_abort(tmp_path: Path) -> None:
+    videos = make_videos(1, size=300 * 1024)
+    async with FakeCda(videos) as cda, FakeS3(fail_parts=404) as s3:
+        download_state = await download(
+            cda, S3Target(s3.bucket()), tmp_path, "v1"
+        )
+    assert download_state.failed == 1
+    assert s3.aborted == 1
+    assert not s3.objects and not s3.uploads
+
+
+@pytest.mark.asyncio
+async def test_fifo(tmp_path: Path) -> None:
+    videos = make_videos(2, size=300 * 1024)
+    fifo = tmp_path / "pipe"
+    received = bytearray()
+
+    def read() -> None:
+        while not fifo.exists():
+            time.sleep(0.01)
+        with open(fifo, "rb") as f:
+            while chunk := f.read(16 * 1024):
+                received.extend(chunk)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    async with FakeCda(videos) as cda:
+        download_state = await download(
+            cda, PipeTarget(fifo), tmp_path, "v1", "v2"
+        )
+    await asyncio.to_thread(reader.join)
+    assert download_state.completed == 2
+    assert received == await get_body(videos[0]) + await get_body(videos[1])
+    assert [p.name for p in tmp_path.iterdir()] == ["pipe"]
+
+
+@pytest.mark.asyncio
+async def test_stdout(
+    tmp_path: Path, capfdbinary: pytest.CaptureFixture[bytes]
+) -> None:
+    videos = make_videos(1)
+    async with FakeCda(videos) as cda:
+        download_state = await download(cda, PipeTarget(), tmp_path, "v1")
+    assert download_state.completed == 1
+    assert capfdbinary.readouterr().out == await get_body(videos[0])
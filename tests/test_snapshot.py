@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+from asyncio import Semaphore
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeFolder, FakeVideo, make_videos
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.folder import Folder, get_snapshot_video
+from cda_dl.snapshot import FolderSnapshots
+from cda_dl.ui import UI
+
+
+async def sync(cda: FakeCda, directory: Path) -> DownloadState:
+    download_options = DownloadOptions(directory=directory)
+    download_options.semaphore = Semaphore(download_options.nthreads)
+    download_options.snapshots = FolderSnapshots()
+    download_state = DownloadState()
+    cda.requests.clear()
+    async with cda.session() as session:
+        await Folder(
+            list(cda.folders.values())[0].url, session, UI()
+        ).download_folder(download_options, download_state)
+    return download_state
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("etags", [False, True])
+async def test_sync_folder(etags: bool, tmp_path: Path) -> None:
+    folder = FakeFolder(
+        "user",
+        1,
+        "Folder",
+        make_videos(7, size=1024),
+        [FakeFolder("user", 2, "Podfolder", make_videos(2, prefix="s"))],
+        per_page=3,
+    )
+    async with FakeCda(folders=[folder], etags=etags) as cda:
+        state = await sync(cda, tmp_path)
+        assert state.completed == 9
+        assert (tmp_path / FolderSnapshots.FILENAME).exists()
+
+        # Nothing changed: first page, last page and the page after it of
+        # the folder, first page and the page after it of the subfolder.
+        state = await sync(cda, tmp_path)
+        assert state.completed == state.skipped == 0
+        assert cda.requests["folder_page"] == 5
+        assert cda.requests["video_page"] == 0
+        if etags:
+            assert cda.requests["not_modified"] == 3
+
+        cda.upload(folder, FakeVideo("n1", "Nowy film", 1024))
+        state = await sync(cda, tmp_path)
+        assert state.completed == 1
+        assert cda.requests["video_page"] == 1
+        assert (tmp_path / "Folder" / "Nowy_film.mp4").exists()
+
+
+def test_snapshot_video() -> None:
+    url = "https://www.cda.pl/video/v1"
+    video = get_snapshot_video([url, "Film", 600])
+    assert (video.url, video.title, video.duration) == (url, "Film", 600)
+    # Snapshots of older versions have no durations.
+    assert get_snapshot_video([url, "Film"]).duration is None
+
+
+@pytest.mark.asyncio
+async def test_sync_keeps_durations(tmp_path: Path) -> None:
+    folder = FakeFolder("user", 1, "Folder", make_videos(4, size=1024))
+    path = tmp_path / FolderSnapshots.FILENAME
+    async with FakeCda(folders=[folder]) as cda:
+        await sync(cda, tmp_path)
+        snapshots = json.loads(path.read_text(encoding="utf-8"))
+        (snapshot,) = snapshots.values()
+        entries = [e for page in snapshot["pages"] for e in page["videos"]]
+        assert [e[2] for e in entries] == [600] * 4
+
+        # An older snapshot without durations is still read.
+        for page in snapshot["pages"]:
+            page["videos"] = [entry[:2] for entry in page["videos"]]
+        path.write_text(json.dumps(snapshots), encoding="utf-8")
+        cda.upload(folder, FakeVideo("n1", "Nowy film", 1024))
+        state = await sync(cda, tmp_path)
+        assert (state.completed, state.skipped) == (1, 0)
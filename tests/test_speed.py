@@ -0,0 +1,56 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, make_videos
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.mp4 import check_mp4
+from cda_dl.ui import UI
+from cda_dl.video import MAX_SLOW_RESTARTS, Video
+
+
+async def download(
+    cda: FakeCda, tmp_path: Path, min_speed: int, grace: float
+) -> Video:
+    download_options = DownloadOptions(directory=tmp_path)
+    download_options.min_speed = min_speed
+    download_options.slow_grace = grace
+    download_state = DownloadState()
+    async with cda.session() as session:
+        video = Video(cda.video_url("v1"), session, UI())
+        await video.download_video(download_options, download_state)
+    assert download_state.completed == 1
+    check_mp4(video.filepath)
+    return video
+
+
+@pytest.mark.asyncio
+async def test_restart_slow_stream(tmp_path: Path) -> None:
+    videos = make_videos(1, size=512 * 1024)
+    async with FakeCda(videos, slow_links=1, slow_bandwidth=128 * 1024) as cda:
+        video = await download(cda, tmp_path, 256 * 1024, 0.2)
+    assert video.metrics.slow_restarts == 1
+    # The second stream resumed where the slow one stopped.
+    assert cda.requests["media"] == 2
+    assert cda.requests["video_page"] == 2
+    # The page is fetched again without the Range of the stream.
+    assert cda.requests["ranged_page"] == 0
+    assert video.resume_point > 0
+    assert video.filepath.stat().st_size == videos[0].sizes["720p"]
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_finishes(tmp_path: Path) -> None:
+    videos = make_videos(1, size=256 * 1024)
+    async with FakeCda(
+        videos, slow_links=100, slow_bandwidth=512 * 1024
+    ) as cda:
+        video = await download(cda, tmp_path, 1024**2, 0.05)
+    # Out of new links to try, the last stream may be slow.
+    assert video.metrics.slow_restarts == MAX_SLOW_RESTARTS
+    assert cda.requests["media"] == MAX_SLOW_RESTARTS + 1
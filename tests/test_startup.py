@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative `python -X importtime` budget for cda_dl.main in microseconds.
+# The entry point alone is ~20ms; the heavy stack used to be ~350ms.
+IMPORT_BUDGET_US = 100_000
+
+HEAVY_MODULES = ("aiohttp", "bs4", "rich", "aiofiles", "tenacity")
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_entry_point_does_not_import_heavy_modules() -> None:
+    code = (
+        "import sys\n"
+        "from cda_dl.main import parse_args\n"
+        "parse_args(['https://www.cda.pl/video/9122600a'])\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = run_python("-c", code)
+    assert result.stdout.strip() == ""
+
+
+def test_version_does_not_import_heavy_modules() -> None:
+    result = run_python("-X", "importtime", "-m", "cda_dl.main", "--version")
+    imported = {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+    assert not imported & set(HEAVY_MODULES)
+
+
+def test_import_time_budget() -> None:
+    result = run_python("-X", "importtime", "-c", "import cda_dl.main")
+    for line in result.stderr.splitlines():
+        fields = [f.strip() for f in line.split("|")]
+        if fields[-1] == "cda_dl.main":
+            assert int(fields[1]) < IMPORT_BUDGET_US
+            break
+    else:
+        raise AssertionError("cda_dl.main missing from -X importtime output")
@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cda_dl.download_state import DownloadState
+from cda_dl.metrics import VideoMetrics
+from cda_dl.ui import JsonlUI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_events(stream: io.StringIO) -> list[dict[str, object]]:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_jsonl_video_events() -> None:
+    stream = io.StringIO()
+    ui = JsonlUI(stream)
+    url = "https://www.cda.pl/video/9122600a"
+    ui.video_queued(url)
+    ui.video_started(url)
+    metrics = VideoMetrics(url)
+    metrics.bytes = 10
+    metrics.finish("failed", "HTTP error [404]")
+    ui.video_finished(metrics)
+    events = read_events(stream)
+    assert [e["event"] for e in events] == ["queued", "started", "failed"]
+    assert events[2]["reason"] == "HTTP error [404]"
+    assert events[2]["bytes"] == 10
+
+
+def test_jsonl_progress_interval() -> None:
+    stream = io.StringIO()
+    ui = JsonlUI(stream, interval=0)
+    task_id = ui.add_task_video("film.mp4 [720p]", 100, 20)
+    ui.update_task_video(task_id, 30)
+    ui.remove_task_video(task_id)
+    assert read_events(stream)[0]["completed"] == 50
+
+    stream = io.StringIO()
+    ui = JsonlUI(stream, interval=3600)
+    task_id = ui.add_task_video("film.mp4 [720p]", 100, 0)
+    for _ in range(10):
+        ui.update_task_video(task_id, 10)
+    assert stream.getvalue() == ""
+
+
+def test_jsonl_summary() -> None:
+    stream = io.StringIO()
+    state = DownloadState()
+    state.completed, state.skipped, state.failed = 3, 2, 1
+    JsonlUI(stream).print_summary(state)
+    event = read_events(stream)[0]
+    assert event["event"] == "summary"
+    assert (event["completed"], event["skipped"], event["failed"]) == (3, 2, 1)
+
+
+def test_jsonl_does_not_load_rich() -> None:
+    code = (
+        "import io, sys\n"
+        "from cda_dl.ui import JsonlUI\n"
+        "ui = JsonlUI(io.StringIO())\n"
+        "with ui.live():\n"
+        "    ui.add_task_folder('folder', 1)\n"
+        "print('rich' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False"
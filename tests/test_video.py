@@ -1,6 +1,7 @@
 import logging
 import os
 import sys
+from pathlib import Path
 from typing import Any, cast
 
 import pytest
@@ -10,10 +11,12 @@ from rich.table import Table
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import json
 
+from fake_cda import FakeCda
+
 from cda_dl.download_options import DownloadOptions
 from cda_dl.download_state import DownloadState
 from cda_dl.error import GeoBlockedError, LoginRequiredError, ResolutionError
-from cda_dl.ui import RichUI
+from cda_dl.ui import UI, RichUI
 from cda_dl.video import Video
 
 directory = os.path.abspath(os.path.dirname(__file__))
@@ -152,3 +155,39 @@ async def test_download_video_no_overwrite(caplog: Any) -> None:
         with caplog.at_level(logging.INFO):
             await v.download_video(download_options, download_state)
         assert f"Plik '{v.title}.mp4' już istnieje. Pomijam ..." in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_download_video_offline(
+    fake_cda: FakeCda, tmp_path: Path
+) -> None:
+    download_options = DownloadOptions(directory=tmp_path)
+    download_state = DownloadState()
+    async with fake_cda.session() as session:
+        v = Video(fake_cda.video_url("v1"), session, UI())
+        await v.download_video(download_options, download_state)
+    assert download_state.completed == 1
+    assert v.resolution == "720p"
+    assert v.filepath == tmp_path / "Film_v_1.mp4"
+    assert v.filepath.stat().st_size == fake_cda.videos["v1"].sizes["720p"]
+    assert v.metrics.bytes == v.remaining_size
+    assert v.metrics.phases.keys() >= {"page_fetch", "rpc", "ttfb"}
+    # The parsed page is dropped once the file link is resolved.
+    assert not hasattr(v, "video_soup")
+
+
+@pytest.mark.asyncio
+async def test_download_probed_video_offline(
+    fake_cda: FakeCda, tmp_path: Path
+) -> None:
+    download_options = DownloadOptions(directory=tmp_path, resolution="480p")
+    download_state = DownloadState()
+    async with fake_cda.session() as session:
+        v = Video(fake_cda.video_url("v2"), session, UI())
+        await v.probe()
+        v.check_resolution(download_options)
+        await v.download_video(download_options, download_state)
+    assert download_state.completed == 1
+    assert v.resolution == "480p"
+    # The page fetched by the probe is reused by the download.
+    assert fake_cda.requests["video_page"] == 1
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sys
+from asyncio import Semaphore
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_cda import FakeCda, FakeFolder, FakeVideo, make_videos
+
+from cda_dl.download_options import DownloadOptions
+from cda_dl.download_state import DownloadState
+from cda_dl.folder import Folder
+from cda_dl.snapshot import FolderSnapshots
+from cda_dl.ui import UI
+from cda_dl.watch import Watcher
+
+
+async def wait_for(condition: Callable[[], bool], timeout: float = 5) -> None:
+    async def check() -> None:
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(check(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_watch_folder(tmp_path: Path) -> None:
+    folder = FakeFolder(
+        "user", 1, "Folder", make_videos(4, size=1024), per_page=2
+    )
+    download_options = DownloadOptions(directory=tmp_path)
+    download_options.semaphore = Semaphore(download_options.nthreads)
+    download_options.snapshots = FolderSnapshots()
+    download_state = DownloadState()
+    async with FakeCda(folders=[folder], etags=True) as cda:
+        async with cda.session() as session:
+            f = Folder(folder.url, session, UI())
+            await f.download_folder(download_options, download_state)
+            assert download_state.completed == 4
+
+            watcher = Watcher(
+                session, UI(), download_options, download_state, 0.05
+            )
+            watcher.add_tree(f.url, tmp_path)
+            task = asyncio.create_task(watcher.run())
+            await asyncio.sleep(0.3)
+            # An unchanged folder is polled less and less often, with only
+            # conditional requests for its first page.
+            assert cda.requests["video_page"] == 4
+            assert watcher.folders[f.url].interval > 0.05
+            cda.requests.clear()
+
+            for i in range(3):
+                cda.upload(folder, FakeVideo(f"n{i}", f"Nowy {i}", 1024))
+            await wait_for(lambda: download_state.completed == 7)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    assert cda.requests["video_page"] == 3
+    assert (tmp_path / "Folder" / "Nowy_2.mp4").exists()
+    snapshot = download_options.snapshots.get(tmp_path, f.url)
+    assert snapshot is not None and len(snapshot["done"]) == 7